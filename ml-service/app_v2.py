@@ -3,12 +3,14 @@ Ayurveda ML Service V2 - Production Ready
 Complete implementation with real ML models
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import json
 import logging
+import atexit
 import sys
 import os
 
@@ -17,14 +19,28 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from models.embeddings import get_embedding_service
 from models.recommender import ProductRecommender
+from models.user_profiles import UserProfileStore
+from models.exclusions import ExclusionStore
+from models.associations import AssociationMiner
+from models.batch_recommend import BulkRecommendationJob, PYARROW_AVAILABLE, INPUT_FORMATS, read_users, save_user_input
 from models.search import SemanticSearchEngine
 from models.forecasting import DemandForecaster, generate_mock_historical_data
+from models.jobs import JobQueue, QueueFullError
+from models.ingestion import SalesIngestor
+from models.inventory import plan_inventory
+from models.backtest import Backtester, generate_synthetic_catalog
 from models.anomaly import AnomalyDetector, generate_mock_metrics_data
+from models.anomaly_scan import AnomalyScanner
+from models.anomaly_stream import StreamingAnomalyDetector
+from models.cart_check import CartChecker
 from models.ayurveda import (
     get_dosha_recommendations,
     get_ingredient_compatibility,
     calculate_product_dosha_score,
-    HEALTH_GOALS
+    catalog_dosha_scores,
+    current_knowledge,
+    reload_knowledge,
+    watch_knowledge,
 )
 from config import settings
 
@@ -42,9 +58,16 @@ logger = logging.getLogger(__name__)
 # Global ML instances
 embedding_service = None
 recommender = None
+profile_store = None
+exclusion_store = None
+association_miner = None
 search_engine = None
 forecaster = None
+forecast_jobs = None
+sales_ingestor = None
 anomaly_detector = None
+anomaly_stream = None
+cart_checker = None
 
 # Mock product catalog (in production, load from database)
 MOCK_PRODUCTS = [
@@ -103,7 +126,9 @@ MOCK_PRODUCTS = [
 
 def initialize_ml_services():
     """Initialize all ML services"""
-    global embedding_service, recommender, search_engine, forecaster, anomaly_detector
+    global embedding_service, recommender, profile_store, exclusion_store, association_miner
+    global search_engine, forecaster, forecast_jobs, sales_ingestor, anomaly_detector, anomaly_stream
+    global cart_checker
 
     logger.info("Initializing ML services...")
 
@@ -112,24 +137,126 @@ def initialize_ml_services():
         logger.info("Loading embedding model...")
         embedding_service = get_embedding_service(settings.EMBEDDING_MODEL)
 
-        # Initialize recommender
-        logger.info("Initializing recommender...")
-        recommender = ProductRecommender(embedding_service)
-        recommender.load_products(MOCK_PRODUCTS)
+        # Initialize user profile store
+        logger.info("Initializing user profile store...")
+        profile_store = UserProfileStore(
+            embedding_dim=embedding_service.embedding_dim,
+            capacity=settings.USER_PROFILE_CAPACITY,
+            history_size=settings.USER_PROFILE_HISTORY_SIZE,
+            half_life_days=settings.USER_PROFILE_HALF_LIFE_DAYS,
+            snapshot_path=settings.USER_PROFILE_SNAPSHOT_PATH or None,
+        )
+        profile_store.load_snapshot()
+
+        # Initialize purchase/dismiss exclusion filters
+        exclusion_store = ExclusionStore(
+            bits_per_user=settings.EXCLUSION_BITS_PER_USER,
+            num_hashes=settings.EXCLUSION_NUM_HASHES,
+            target_false_positive_rate=settings.EXCLUSION_TARGET_FALSE_POSITIVE_RATE,
+            max_layers=settings.EXCLUSION_MAX_LAYERS,
+            max_memory_mb=settings.EXCLUSION_MAX_MEMORY_MB,
+            snapshot_path=settings.EXCLUSION_SNAPSHOT_PATH or None,
+        )
+        exclusion_store.load_snapshot()
 
         # Initialize search engine
         logger.info("Building search index...")
-        search_engine = SemanticSearchEngine(embedding_service, settings.EMBEDDING_DIM)
+        search_engine = SemanticSearchEngine(
+            embedding_service, settings.EMBEDDING_DIM, exclusion_store=exclusion_store
+        )
         product_embeddings = embedding_service.encode_products_batch(MOCK_PRODUCTS)
         search_engine.build_index(MOCK_PRODUCTS, product_embeddings)
 
+        # Initialize recommender
+        logger.info("Initializing recommender...")
+        recommender = ProductRecommender(
+            embedding_service,
+            profile_store=profile_store,
+            exclusion_store=exclusion_store,
+            strategy_workers=settings.RECOMMENDATION_STRATEGY_WORKERS,
+            deadline_ms=settings.RECOMMENDATION_DEADLINE_MS,
+            max_candidates=settings.RECOMMENDATION_MAX_CANDIDATES,
+        )
+        recommender.load_products(MOCK_PRODUCTS, index=search_engine.index)
+
+        # Initialize frequently-bought-together miner (filled from /api/ml/orders)
+        association_miner = AssociationMiner(
+            min_support=settings.ASSOCIATION_MIN_SUPPORT,
+            min_confidence=settings.ASSOCIATION_MIN_CONFIDENCE,
+            min_lift=settings.ASSOCIATION_MIN_LIFT,
+            max_per_item=settings.ASSOCIATION_MAX_PER_ITEM,
+            full_refresh_growth=settings.ASSOCIATION_FULL_REFRESH_GROWTH,
+        )
+
         # Initialize forecaster
         logger.info("Initializing forecaster...")
-        forecaster = DemandForecaster()
+        forecaster = DemandForecaster(
+            cache_size=settings.FORECAST_MODEL_CACHE_SIZE,
+            cache_dir=settings.FORECAST_MODEL_CACHE_DIR or None,
+            stateful=settings.FORECAST_STATEFUL,
+            refit_interval_days=settings.FORECAST_REFIT_INTERVAL_DAYS,
+            drift_threshold=settings.FORECAST_DRIFT_THRESHOLD
+        )
+
+        # Daily sales series from the order database; cached series are served if the refresh fails
+        logger.info("Ingesting sales history...")
+        sales_ingestor = SalesIngestor(
+            settings.DATABASE_URL,
+            settings.SALES_CACHE_DIR,
+            batch_size=settings.SALES_INGEST_BATCH_SIZE,
+            overlap_seconds=settings.SALES_INGEST_OVERLAP_SECONDS,
+        )
+        try:
+            sales_ingestor.refresh()
+        except Exception as e:
+            logger.warning(f"Sales ingestion unavailable, forecasts and anomalies use cached or mock data: {e}")
+
+        # Background forecast jobs, so long fits never run in a request thread
+        forecast_jobs = JobQueue(
+            settings.FORECAST_JOB_DB_PATH,
+            handlers={
+                'forecast': run_forecast_job,
+                'backtest': run_backtest_job,
+                'anomaly_scan': run_anomaly_scan,
+                'bulk_recommendations': run_bulk_recommendations,
+            },
+            max_workers=settings.FORECAST_JOB_WORKERS,
+            max_pending=settings.FORECAST_JOB_MAX_PENDING,
+            lease_seconds=settings.FORECAST_JOB_LEASE_SECONDS,
+        )
+
+        # Ayurveda knowledge base maintained by the content team, if present
+        if settings.AYURVEDA_KNOWLEDGE_PATH and os.path.exists(settings.AYURVEDA_KNOWLEDGE_PATH):
+            try:
+                reload_knowledge(settings.AYURVEDA_KNOWLEDGE_PATH)
+            except Exception as e:
+                logger.warning(f"Ayurveda knowledge base not loaded, using built-in tables: {e}")
+        if settings.AYURVEDA_KNOWLEDGE_PATH:
+            # Each gunicorn worker polls the file, so all of them serve the same version
+            watch_knowledge(settings.AYURVEDA_KNOWLEDGE_PATH, settings.AYURVEDA_KNOWLEDGE_POLL_SECONDS)
+
+        # Contraindication / dosha-conflict indexes over the catalog, checked on every cart update
+        cart_checker = CartChecker(MOCK_PRODUCTS)
 
         # Initialize anomaly detector
         logger.info("Initializing anomaly detector...")
-        anomaly_detector = AnomalyDetector(method='isolation_forest')
+        anomaly_detector = AnomalyDetector(
+            method='isolation_forest',
+            cache_size=settings.ANOMALY_MODEL_CACHE_SIZE,
+            cache_dir=settings.ANOMALY_MODEL_CACHE_DIR or None,
+            refit_interval_days=settings.ANOMALY_REFIT_INTERVAL_DAYS,
+            drift_factor=settings.ANOMALY_DRIFT_FACTOR
+        )
+
+        # Online detector for live metric events (e.g. checkout outages)
+        anomaly_stream = StreamingAnomalyDetector(
+            threshold=settings.ANOMALY_STREAM_THRESHOLD,
+            ewma_halflife=settings.ANOMALY_STREAM_EWMA_HALFLIFE,
+            warmup=settings.ANOMALY_STREAM_WARMUP,
+            relearn_after=settings.ANOMALY_STREAM_RELEARN_AFTER or None,
+            capacity=settings.ANOMALY_STREAM_MAX_METRICS,
+            on_anomaly=log_streamed_anomaly,
+        )
 
         logger.info("✅ All ML services initialized successfully")
 
@@ -138,12 +265,189 @@ def initialize_ml_services():
         raise
 
 
+def load_sales_history(product_id: str) -> tuple:
+    """Ingested daily demand for a product, or mock data when there is none"""
+    if sales_ingestor is not None:
+        history = sales_ingestor.sku_history(product_id, days=settings.SALES_HISTORY_DAYS)
+        if history is not None:
+            return history, 'sales'
+    return generate_mock_historical_data(days=90), 'mock'
+
+
+def load_metrics_data() -> tuple:
+    """Ingested daily revenue/orders, or mock metrics when nothing has been ingested"""
+    if sales_ingestor is not None and sales_ingestor.available:
+        metrics_data = sales_ingestor.metrics(days=settings.SALES_HISTORY_DAYS)
+        if not metrics_data.empty:
+            return metrics_data, 'sales'
+    return generate_mock_metrics_data(days=90), 'mock'
+
+
+def run_forecast_job(payload: dict) -> dict:
+    """Forecast job handler executed by the job queue workers"""
+    historical_data, data_source = load_sales_history(payload['productId'])
+
+    return {
+        **forecaster.forecast_product_demand(
+            product_id=payload['productId'],
+            historical_data=historical_data,
+            forecast_days=payload.get('days', 30)
+        ),
+        'dataSource': data_source,
+    }
+
+
+def run_backtest_job(payload: dict) -> dict:
+    """Backtest job handler: rolling-origin evaluation on synthetic SKUs"""
+    catalog = generate_synthetic_catalog(
+        num_skus=payload.get('skus', 500),
+        days=payload.get('days', 365),
+        intermittent_share=payload.get('intermittentShare', 0.3),
+        trend_range=tuple(payload.get('trendRange', (-0.3, 0.5))),
+        seasonality_range=tuple(payload.get('seasonalityRange', (0.0, 0.4))),
+        seed=payload.get('seed', 0)
+    )
+    backtester = Backtester(
+        models=payload.get('models'),
+        horizon=payload.get('horizon', 14),
+        folds=payload.get('folds', 3),
+        step=payload.get('step', 14),
+        workers=payload.get('workers')
+    )
+    return backtester.run(catalog)
+
+
+def _confined_path(root: str, name: str, field: str) -> str:
+    """Resolve a file name inside root, rejecting anything that escapes it"""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise ValueError(f"{field} must be a file name inside the bulk recommendation directory")
+    return path
+
+
+def bulk_output_path(name: str = None) -> str:
+    """Output file for a bulk recommendation run, always inside BULK_RECOMMENDATION_DIR"""
+    if not name:
+        extension = 'parquet' if PYARROW_AVAILABLE else 'npz'
+        name = f"recommendations-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    return _confined_path(settings.BULK_RECOMMENDATION_DIR, name, 'output_path')
+
+
+def bulk_input_path(name: str) -> str:
+    """User file for a bulk recommendation run, always inside BULK_RECOMMENDATION_INPUT_DIR"""
+    path = _confined_path(settings.BULK_RECOMMENDATION_INPUT_DIR, name, 'input_path')
+    if not path.endswith(INPUT_FORMATS):
+        raise ValueError(f"input_path must be one of {', '.join(INPUT_FORMATS)}")
+    return path
+
+
+def run_bulk_recommendations(payload: dict) -> dict:
+    """Bulk recommendation job handler: users streamed from an input file, or stored profiles"""
+    block_size = payload.get('block_size', settings.BULK_RECOMMENDATION_BLOCK_SIZE)
+    if payload.get('input_path'):
+        users = read_users(bulk_input_path(payload['input_path']), block_size)
+    else:
+        # Stored profiles, optionally one [user_id_from, user_id_to) slice of them
+        low, high = payload.get('user_id_from'), payload.get('user_id_to')
+        users = (
+            {'user_id': user_id} for user_id in sorted(profile_store.user_ids())
+            if (low is None or user_id >= low) and (high is None or user_id < high)
+        )
+
+    job = BulkRecommendationJob(
+        recommender,
+        k=payload.get('k', 20),
+        block_size=block_size,
+        workers=payload.get('workers'),
+    )
+    return {
+        **job.run(users, bulk_output_path(payload.get('output_path'))),
+        'generated_at': datetime.now().isoformat(),
+    }
+
+
+def log_streamed_anomaly(anomaly: dict):
+    """Surface streamed anomalies in the service log as soon as they are detected"""
+    logger.warning(
+        f"Anomaly in {anomaly['metric']} at {anomaly['date']}: "
+        f"{anomaly['reason']} (severity {anomaly['severity']})"
+    )
+
+
+def run_anomaly_scan(payload: dict) -> dict:
+    """Scan many series for anomalies; also the job handler for nightly scans"""
+    if payload.get('source') == 'sales':
+        # Every ingested SKU's daily sales; days without orders are zero sales
+        histories = sales_ingestor.sku_histories(days=payload.get('days', settings.SALES_HISTORY_DAYS)) if sales_ingestor else {}
+        table = pd.concat(
+            [
+                pd.DataFrame({'series_id': sku, 'date': history['date'], 'value': history['quantity']})
+                for sku, history in histories.items()
+            ] or [pd.DataFrame(columns=['series_id', 'date', 'value'])],
+            ignore_index=True
+        )
+        fill_value = 0.0
+    else:
+        rows = payload.get('rows', [])
+        table = pd.DataFrame(
+            [{'series_id': str(r['seriesId']), 'date': r['date'], 'value': r['value']} for r in rows],
+            columns=['series_id', 'date', 'value']
+        )
+        fill_value = payload.get('fillValue')
+
+    scanner = AnomalyScanner(
+        method=payload.get('method', 'robust'),
+        threshold=payload.get('threshold', settings.ANOMALY_SCAN_THRESHOLD),
+        window=payload.get('window', settings.ANOMALY_SCAN_WINDOW_DAYS),
+        max_workers=payload.get('workers')
+    )
+    anomalies, stats = scanner.scan(table, fill_value=fill_value)
+
+    # Compact column-oriented table instead of one object per anomaly
+    anomalies['date'] = pd.to_datetime(anomalies['date']).dt.strftime('%Y-%m-%d')
+    anomalies[['value', 'expected', 'score']] = anomalies[['value', 'expected', 'score']].astype(float).round(3)
+    return {
+        'columns': anomalies.columns.tolist(),
+        'rows': anomalies.to_numpy().tolist(),
+        **stats,
+    }
+
+
+def shutdown_forecast_jobs():
+    """Stop job workers on shutdown; unfinished jobs resume once their lease expires"""
+    if forecast_jobs is not None:
+        forecast_jobs.shutdown()
+
+
+def save_profile_snapshot():
+    """Persist user profiles on shutdown"""
+    if profile_store is not None and profile_store.snapshot_path:
+        try:
+            profile_store.save_snapshot()
+        except Exception as e:
+            logger.error(f"Failed to save user profile snapshot: {e}")
+
+
+def save_exclusion_snapshot():
+    """Persist exclusion filters on shutdown, merged with other workers' snapshots"""
+    if exclusion_store is not None and exclusion_store.snapshot_path:
+        try:
+            exclusion_store.save_snapshot()
+        except Exception as e:
+            logger.error(f"Failed to save exclusion snapshot: {e}")
+
+
 # Initialize on startup
 try:
     initialize_ml_services()
 except Exception as e:
     logger.warning(f"ML services initialization failed, will run in fallback mode: {e}")
 
+atexit.register(save_profile_snapshot)
+atexit.register(save_exclusion_snapshot)
+atexit.register(shutdown_forecast_jobs)
+
 
 # ============================================================================
 # API ENDPOINTS
@@ -169,13 +473,15 @@ def recommend_for_user(user_id):
         dosha_type = data.get('dosha_type')
         health_goal = data.get('health_goal')
         num_recommendations = data.get('num_recommendations', 10)
+        deadline_ms = data.get('deadline_ms')
 
         recommendations = recommender.hybrid_recommendations(
             user_id=user_id,
             user_history=user_history,
             dosha_type=dosha_type,
             health_goal=health_goal,
-            n=num_recommendations
+            n=num_recommendations,
+            deadline_ms=deadline_ms
         )
 
         return jsonify({
@@ -190,6 +496,45 @@ def recommend_for_user(user_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def parse_event_timestamp(value):
+    """Convert an ISO-8601 string or Unix timestamp to seconds since the epoch"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+@app.route('/api/ml/events/interaction', methods=['POST'])
+def record_interaction_events():
+    """Update stored user profiles and exclusions from one or more interaction events"""
+    try:
+        data = request.json or {}
+        events = data.get('events', [data])
+
+        recorded = 0
+        errors = []
+        for event in events:
+            try:
+                recommender.record_interaction(
+                    user_id=event['user_id'],
+                    product_id=event['product_id'],
+                    event_type=event.get('event_type', 'view'),
+                    timestamp=parse_event_timestamp(event.get('timestamp')),
+                )
+                recorded += 1
+            except (KeyError, ValueError) as e:
+                errors.append({"event": event, "error": str(e)})
+
+        return jsonify({
+            "success": not errors,
+            "recorded": recorded,
+            "errors": errors,
+        }), 200 if recorded or not errors else 400
+
+    except Exception as e:
+        logger.error(f"Error recording interaction events: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/ml/recommend/product/<product_id>', methods=['POST'])
 def recommend_similar_products(product_id):
     """Get similar product recommendations"""
@@ -199,7 +544,8 @@ def recommend_similar_products(product_id):
 
         recommendations = recommender.content_based_recommendations(
             product_id=product_id,
-            n=num_recommendations
+            n=num_recommendations,
+            user_id=data.get('user_id')
         )
 
         return jsonify({
@@ -214,6 +560,137 @@ def recommend_similar_products(product_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/ml/recommend/batch', methods=['POST'])
+def bulk_recommendations():
+    """
+    Queue a top-k precompute for many users into a columnar file; poll the returned job
+
+    Users come from an uploaded NDJSON/parquet file (multipart field 'users'), a
+    file already in the input directory ('input_path'), an inline 'users' list,
+    or else every stored profile. Uploads and inline lists are written to the
+    input directory first, so the job only carries a reference to them.
+    """
+    try:
+        upload = request.files.get('users')
+        data = dict(request.form) if upload is not None else dict(request.json or {})
+        for field in ('k', 'block_size', 'workers'):
+            if isinstance(data.get(field), str):
+                data[field] = int(data[field])
+
+        if upload is not None:
+            extension = os.path.splitext(upload.filename or '')[1].lower()
+            data['input_path'] = save_user_input(
+                iter(lambda: upload.stream.read(1 << 20), b''),
+                settings.BULK_RECOMMENDATION_INPUT_DIR,
+                extension
+            )
+        elif data.get('users') is not None:
+            data['input_path'] = save_user_input(
+                (json.dumps(user).encode() + b'\n' for user in data.pop('users')),
+                settings.BULK_RECOMMENDATION_INPUT_DIR
+            )
+
+        if data.get('input_path'):
+            if not os.path.isfile(bulk_input_path(data['input_path'])):
+                return jsonify({"success": False, "error": f"input_path {data['input_path']} not found"}), 400
+        elif profile_store is None:
+            return jsonify({"success": False, "error": "users or input_path is required"}), 400
+        bulk_output_path(data.get('output_path'))  # Reject paths outside the output directory up front
+
+        job, deduplicated = forecast_jobs.submit('bulk_recommendations', data)
+        return jsonify({
+            "success": True,
+            "jobId": job['job_id'],
+            "status": job['status'],
+            "deduplicated": deduplicated,
+            "inputPath": data.get('input_path'),
+            "pollUrl": f"/api/ml/forecast/jobs/{job['job_id']}",
+        }), 202
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Job queue is full: {e}"}), 503
+    except Exception as e:
+        logger.error(f"Error in bulk recommendations: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/recommend/bought-together/<product_id>', methods=['GET'])
+def bought_together(product_id):
+    """Products frequently bought together with a product"""
+    try:
+        n = int(request.args.get('n', 10))
+
+        recommendations = []
+        for association in association_miner.bought_together(product_id, n):
+            row = recommender.product_rows.get(association['id'])
+            product = recommender.product_index[row] if row is not None else {}
+            recommendations.append({
+                **association,
+                'name': product.get('name'),
+                'category': product.get('category'),
+                'price': product.get('price'),
+                'reason': 'Frequently bought together',
+            })
+
+        return jsonify({
+            "success": True,
+            "product_id": product_id,
+            "recommendations": recommendations,
+        })
+
+    except Exception as e:
+        logger.error(f"Error in bought-together recommendations: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/orders', methods=['POST'])
+def ingest_orders():
+    """Fold new order baskets into the frequently-bought-together table"""
+    try:
+        data = request.json or {}
+        orders = data.get('orders', [])
+        baskets = [order.get('items', []) if isinstance(order, dict) else order for order in orders]
+
+        if data.get('full_refresh'):
+            refresh = association_miner.fit(baskets)
+        else:
+            refresh = association_miner.partial_fit(baskets)
+
+        # Feed the refreshed table to the content pipeline's co-purchase candidates
+        recommender.set_co_purchase_table(association_miner.co_purchase_table())
+
+        return jsonify({
+            "success": True,
+            **refresh,
+        })
+
+    except Exception as e:
+        logger.error(f"Error ingesting orders: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/recommend/stats', methods=['GET'])
+def recommendation_stats():
+    """Strategy timeout counters and pipeline stage latencies for recommendations"""
+    return jsonify({
+        "success": True,
+        "deadline_ms": recommender.deadline_ms,
+        "strategies": recommender.get_strategy_stats(),
+        "pipelines": recommender.get_pipeline_stats(),
+    })
+
+
+@app.route('/api/ml/recommend/exclusions/stats', methods=['GET'])
+def exclusion_stats():
+    """Memory usage of per-user exclusion filters, projected per million users"""
+    return jsonify({
+        "success": True,
+        **exclusion_store.memory_report(),
+    })
+
+
 @app.route('/api/ml/search', methods=['POST'])
 def semantic_search():
     """Semantic search for products"""
@@ -281,9 +758,17 @@ def demand_forecast():
         product_id = data.get('productId')
         days = data.get('days', 30)
 
-        # In production, load historical data from database
-        # For now, generate mock data
-        historical_data = generate_mock_historical_data(days=90)
+        if data.get('async'):
+            job, deduplicated = forecast_jobs.submit('forecast', {'productId': product_id, 'days': days})
+            return jsonify({
+                "success": True,
+                "jobId": job['job_id'],
+                "status": job['status'],
+                "deduplicated": deduplicated,
+                "pollUrl": f"/api/ml/forecast/jobs/{job['job_id']}",
+            }), 202
+
+        historical_data, data_source = load_sales_history(product_id)
 
         forecast_result = forecaster.forecast_product_demand(
             product_id=product_id,
@@ -294,42 +779,289 @@ def demand_forecast():
         return jsonify({
             "success": True,
             "productId": product_id,
+            "dataSource": data_source,
             **forecast_result,
         })
 
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Forecast queue is full: {e}"}), 503
     except Exception as e:
         logger.error(f"Error in demand forecasting: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/ml/forecast/backtest', methods=['POST'])
+def forecast_backtest():
+    """Queue a forecasting backtest; poll the returned job for the report"""
+    try:
+        data = request.json or {}
+        job, deduplicated = forecast_jobs.submit('backtest', data)
+
+        return jsonify({
+            "success": True,
+            "jobId": job['job_id'],
+            "status": job['status'],
+            "deduplicated": deduplicated,
+            "pollUrl": f"/api/ml/forecast/jobs/{job['job_id']}",
+        }), 202
+
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Forecast queue is full: {e}"}), 503
+    except Exception as e:
+        logger.error(f"Error queuing forecast backtest: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/forecast/jobs/<job_id>', methods=['GET'])
+def forecast_job_status(job_id):
+    """Poll a background forecast job"""
+    try:
+        job = forecast_jobs.get(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+
+        return jsonify({"success": True, **job})
+
+    except Exception as e:
+        logger.error(f"Error getting forecast job {job_id}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/forecast/jobs', methods=['GET'])
+def forecast_job_stats():
+    """Background forecast job counts"""
+    try:
+        return jsonify({"success": True, **forecast_jobs.stats()})
+
+    except Exception as e:
+        logger.error(f"Error getting forecast job stats: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/forecast/batch', methods=['POST'])
+def batch_demand_forecast():
+    """Forecast many products in parallel, streaming NDJSON results as they complete"""
+    try:
+        data = request.json or {}
+        days = data.get('days', 30)
+
+        if data.get('series'):
+            series = {
+                str(item['productId']): pd.DataFrame(item['history'])[['date', 'quantity']]
+                for item in data['series']
+            }
+        else:
+            series = {
+                str(product_id): load_sales_history(str(product_id))[0]
+                for product_id in data.get('productIds', [])
+            }
+
+        if not series:
+            return jsonify({"success": False, "error": "series or productIds is required"}), 400
+
+    except Exception as e:
+        logger.error(f"Error in batch demand forecasting: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    def generate():
+        if data.get('engine') == 'vectorized':
+            # Routed, vectorized fits per model group instead of one fit per series
+            results = forecaster.forecast_many(series, forecast_days=days).values()
+        else:
+            results = forecaster.forecast_batch(series, forecast_days=days, max_workers=data.get('workers'))
+        for result in results:
+            yield json.dumps(result, default=str) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/ml/forecast/observe', methods=['POST'])
+def observe_sales():
+    """Absorb new daily sales into stateful forecasts without refitting"""
+    try:
+        data = request.json or {}
+        observations = pd.DataFrame(
+            [
+                {'product_id': str(o['productId']), 'date': o['date'], 'quantity': o['quantity']}
+                for o in data.get('observations', [])
+            ],
+            columns=['product_id', 'date', 'quantity']
+        )
+
+        result = forecaster.observe(
+            observations,
+            as_of=data.get('asOf'),
+            refit=data.get('refit', True)
+        )
+
+        return jsonify({"success": True, **result})
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error observing sales: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/forecast/state', methods=['GET'])
+def forecast_state_stats():
+    """Stateful forecast update and refit counters"""
+    try:
+        if forecaster.states is None:
+            return jsonify({"success": False, "error": "Forecaster is not in stateful mode"}), 400
+
+        return jsonify({
+            "success": True,
+            "state": forecaster.states.stats(),
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting forecast state stats: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/forecast/routing', methods=['GET'])
+def forecast_routing_stats():
+    """Series routed to each forecasting model and time saved versus Prophet everywhere"""
+    try:
+        return jsonify({
+            "success": True,
+            "routing": forecaster.router.report(),
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting forecast routing stats: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/inventory/plan', methods=['POST'])
+def inventory_plan():
+    """Safety stock, reorder points and order quantities for many SKUs in one pass"""
+    try:
+        data = request.json or {}
+        skus = pd.DataFrame(data.get('skus', []))
+        if skus.empty or 'productId' not in skus:
+            return jsonify({"success": False, "error": "skus with productId are required"}), 400
+
+        defaults = {
+            'meanDailyDemand': np.nan, 'demandStd': np.nan, 'leadTimeDays': 7, 'leadTimeStdDays': 0.0,
+            'onHand': 0.0, 'onOrder': 0.0, 'unitCost': np.nan, 'packSize': 1, 'minOrderQty': 0,
+        }
+        for column, default in defaults.items():
+            skus[column] = pd.to_numeric(skus[column], errors='coerce').fillna(default) if column in skus else default
+        skus['productId'] = skus['productId'].astype(str)
+
+        # SKUs without explicit demand use their stateful forecast, when tracked
+        if forecaster is not None and forecaster.states is not None:
+            missing = skus['meanDailyDemand'].isna() | skus['demandStd'].isna()
+            if missing.any():
+                mean, sigma = forecaster.states.demand_stats(skus.loc[missing, 'productId'].tolist())
+                skus.loc[missing, 'meanDailyDemand'] = skus.loc[missing, 'meanDailyDemand'].fillna(pd.Series(mean, index=skus.index[missing]))
+                skus.loc[missing, 'demandStd'] = skus.loc[missing, 'demandStd'].fillna(pd.Series(sigma, index=skus.index[missing]))
+
+        unknown = skus['meanDailyDemand'].isna() | skus['demandStd'].isna()
+        planned = skus[~unknown]
+
+        has_costs = data.get('orderCost') is not None and data.get('holdingCostRate') is not None
+        plan = plan_inventory(
+            planned['meanDailyDemand'].to_numpy(),
+            planned['demandStd'].to_numpy(),
+            lead_time_days=planned['leadTimeDays'].to_numpy(),
+            lead_time_std_days=planned['leadTimeStdDays'].to_numpy(),
+            service_level=data.get('serviceLevel', 0.95),
+            on_hand=planned['onHand'].to_numpy(),
+            on_order=planned['onOrder'].to_numpy(),
+            unit_cost=planned['unitCost'].to_numpy() if has_costs else None,
+            order_cost=data.get('orderCost') if has_costs else None,
+            holding_cost_rate=data.get('holdingCostRate') if has_costs else None,
+            order_cycle_days=data.get('orderCycleDays', 30),
+            min_order_qty=planned['minOrderQty'].to_numpy(),
+            pack_size=planned['packSize'].to_numpy(),
+        )
+
+        # Compact column-oriented table instead of one object per SKU
+        table = pd.DataFrame({
+            'productId': planned['productId'].to_numpy(),
+            'meanDailyDemand': planned['meanDailyDemand'].round(3).to_numpy(),
+            'safetyStock': plan['safety_stock'],
+            'reorderPoint': plan['reorder_point'],
+            'orderQuantity': plan['order_quantity'],
+            'inventoryPosition': plan['inventory_position'],
+            'needsReorder': plan['needs_reorder'],
+            'suggestedOrder': plan['suggested_order'],
+            'daysOfCover': np.round(np.where(np.isfinite(plan['days_of_cover']), plan['days_of_cover'], -1), 1),
+        })
+
+        return jsonify({
+            "success": True,
+            "columns": table.columns.tolist(),
+            "rows": table.to_numpy().tolist(),
+            "needsReorder": int(plan['needs_reorder'].sum()),
+            "missingDemand": skus.loc[unknown, 'productId'].tolist(),
+        })
+
+    except Exception as e:
+        logger.error(f"Error in inventory planning: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/sales/refresh', methods=['POST'])
+def refresh_sales():
+    """Ingest order lines added since the last refresh (or rebuild with full=true)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = sales_ingestor.refresh(full=bool(data.get('full', False)))
+
+        return jsonify({"success": True, **result})
+
+    except Exception as e:
+        logger.error(f"Error refreshing sales data: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/ml/anomaly', methods=['GET'])
 def detect_anomalies():
     """Detect anomalies in business metrics"""
     try:
         metric_type = request.args.get('metric', 'revenue')
-
-        # In production, load real metrics from database
-        metrics_data = generate_mock_metrics_data(days=90)
-
-        if metric_type == 'revenue':
-            results = anomaly_detector.detect_revenue_anomalies(metrics_data)
-            anomalies = results['revenue_anomalies']
-        elif metric_type == 'orders':
-            results = anomaly_detector.detect_revenue_anomalies(metrics_data)
-            anomalies = results['order_anomalies']
+        # One joint model over revenue, orders and AOV instead of a fit per metric
+        multivariate = request.args.get('mode') == 'joint' or metric_type == 'joint'
+        # Report level shifts and restart baselines after them instead of flagging every point
+        rebaseline = request.args.get('changepoints', 'false').lower() == 'true'
+
+        metrics_data, data_source = load_metrics_data()
+        changepoints = []
+
+        if metric_type == 'joint':
+            anomalies = anomaly_detector.detect_revenue_anomalies(metrics_data, multivariate=True)['joint_anomalies']
+        elif metric_type in ('revenue', 'orders'):
+            results = anomaly_detector.detect_revenue_anomalies(
+                metrics_data, multivariate=multivariate, rebaseline=rebaseline
+            )
+            anomalies = results['revenue_anomalies' if metric_type == 'revenue' else 'order_anomalies']
+            changepoints = results.get('changepoints', {}).get(metric_type, [])
         else:
             # Default to revenue
+            series = metrics_data[['date', 'revenue']].rename(columns={'revenue': 'value'})
+            if rebaseline:
+                changepoints = anomaly_detector.detect_changepoints(series)
             anomalies = anomaly_detector.detect_anomalies(
-                metrics_data[['date', 'revenue']].rename(columns={'revenue': 'value'}),
-                metric_column='value'
+                series,
+                metric_column='value',
+                key='revenue',
+                changepoints=changepoints
             )
 
         return jsonify({
             "success": True,
             "metric": metric_type,
+            "mode": "joint" if multivariate else "univariate",
+            "dataSource": data_source,
             "anomalies": anomalies,
             "total_anomalies": len(anomalies),
+            "changepoints": changepoints,
             "detected_at": datetime.now().isoformat(),
+            "modelStats": anomaly_detector.stats(),
         })
 
     except Exception as e:
@@ -337,6 +1069,75 @@ def detect_anomalies():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/ml/anomaly/scan', methods=['POST'])
+def scan_anomalies():
+    """Scan many series (rows of seriesId/date/value, or source=sales) in one pass"""
+    try:
+        data = request.json or {}
+        if data.get('source') != 'sales' and not data.get('rows'):
+            return jsonify({"success": False, "error": "rows or source=sales is required"}), 400
+
+        if data.get('async'):
+            job, deduplicated = forecast_jobs.submit('anomaly_scan', data)
+            return jsonify({
+                "success": True,
+                "jobId": job['job_id'],
+                "status": job['status'],
+                "deduplicated": deduplicated,
+                "pollUrl": f"/api/ml/forecast/jobs/{job['job_id']}",
+            }), 202
+
+        return jsonify({"success": True, **run_anomaly_scan(data)})
+
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Forecast queue is full: {e}"}), 503
+    except Exception as e:
+        logger.error(f"Error scanning anomalies: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/anomaly/ingest', methods=['POST'])
+def ingest_metric_events():
+    """Score live metric events one by one and return any anomalies immediately"""
+    try:
+        data = request.json or {}
+        events = data.get('events', [])
+        if any('metric' not in e or 'value' not in e for e in events):
+            return jsonify({"success": False, "error": "each event needs metric and value"}), 400
+
+        anomalies = anomaly_stream.observe_many(events)
+
+        return jsonify({
+            "success": True,
+            "processed": len(events),
+            "anomalies": anomalies,
+            "total_anomalies": len(anomalies),
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error ingesting metric events: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/anomaly/stream', methods=['GET'])
+def anomaly_stream_stats():
+    """Streaming detector counters, or one metric's running state with ?metric="""
+    try:
+        metric = request.args.get('metric')
+        if metric is not None:
+            if metric not in anomaly_stream:
+                return jsonify({"success": False, "error": f"Metric {metric} is not tracked"}), 404
+            return jsonify({"success": True, "state": anomaly_stream.state(metric)})
+
+        return jsonify({"success": True, **anomaly_stream.stats()})
+
+    except Exception as e:
+        logger.error(f"Error getting anomaly stream stats: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/ml/ayurveda/dosha', methods=['POST'])
 def get_dosha_recommendations_endpoint():
     """Get Ayurveda recommendations based on dosha"""
@@ -360,6 +1161,70 @@ def get_dosha_recommendations_endpoint():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/ml/ayurveda/scores', methods=['POST'])
+def catalog_dosha_scores_endpoint():
+    """Dosha compatibility of every product for every dosha in one pass"""
+    try:
+        data = request.get_json(silent=True) or {}
+        products = data.get('products') or MOCK_PRODUCTS
+        # Without an explicit version, caller-supplied catalogs are scored uncached
+        version = data.get('catalogVersion') or (None if data.get('products') else 'mock')
+
+        scores = catalog_dosha_scores(products, catalog_version=version)
+
+        return jsonify({
+            "success": True,
+            "doshas": current_knowledge().compiled.doshas,
+            "productIds": [str(p.get('id')) for p in products],
+            "scores": np.round(scores, 3).tolist(),
+        })
+
+    except Exception as e:
+        logger.error(f"Error scoring catalog doshas: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/ayurveda/cart-check', methods=['POST'])
+def cart_check():
+    """Check a whole cart against the user's conditions and dosha"""
+    try:
+        data = request.json or {}
+        product_ids = [str(pid) for pid in data.get('productIds', [])]
+        conditions = data.get('conditions', [])
+        dosha = data.get('dosha')
+
+        if not isinstance(conditions, list):
+            return jsonify({"success": False, "error": "conditions must be a list"}), 400
+
+        return jsonify({"success": True, **cart_checker.check(product_ids, conditions, dosha)})
+
+    except Exception as e:
+        logger.error(f"Error checking cart: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/ml/ayurveda/knowledge', methods=['GET'])
+def ayurveda_knowledge_stats():
+    """Version and size of the knowledge base in use"""
+    return jsonify({"success": True, **current_knowledge().stats()})
+
+
+@app.route('/api/ml/ayurveda/knowledge/reload', methods=['POST'])
+def reload_ayurveda_knowledge():
+    """Reload the configured knowledge base file now; other workers pick it up on their next poll"""
+    try:
+        if not settings.AYURVEDA_KNOWLEDGE_PATH or not os.path.exists(settings.AYURVEDA_KNOWLEDGE_PATH):
+            return jsonify({"success": False, "error": "No knowledge base file configured"}), 404
+
+        return jsonify({"success": True, **reload_knowledge(settings.AYURVEDA_KNOWLEDGE_PATH)})
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error reloading Ayurveda knowledge base: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/ml/ayurveda/goals', methods=['GET'])
 def get_health_goals():
     """Get available health goals"""
@@ -372,7 +1237,7 @@ def get_health_goals():
                 "description": value['description'],
                 "recommended_herbs": value['recommended_herbs'][:5],
             }
-            for key, value in HEALTH_GOALS.items()
+            for key, value in current_knowledge().health_goals.items()
         ]
     })
 
@@ -395,6 +1260,18 @@ def models_info():
                 "status": "active" if recommender else "inactive",
                 "num_products": len(MOCK_PRODUCTS),
             },
+            {
+                "name": "User Profile Store",
+                "type": "LRU time-weighted profiles",
+                "status": "active" if profile_store else "inactive",
+                **(profile_store.stats() if profile_store else {}),
+            },
+            {
+                "name": "Frequently Bought Together",
+                "type": "sparse co-occurrence (support / confidence / lift)",
+                "status": "active" if association_miner else "inactive",
+                **(association_miner.stats() if association_miner else {}),
+            },
             {
                 "name": "Semantic Search",
                 "type": "FAISS vector search",
@@ -403,13 +1280,33 @@ def models_info():
             },
             {
                 "name": "Demand Forecaster",
-                "type": "Prophet / Moving Average",
+                "type": "Routed Prophet / Holt-Winters / Croston-SBA",
                 "status": "active" if forecaster else "inactive",
+                **(forecaster.models.stats() if forecaster else {}),
+            },
+            {
+                "name": "Sales Ingestion",
+                "type": "SQL keyset ingestion -> columnar daily series cache",
+                "status": "active" if sales_ingestor and sales_ingestor.available else "inactive",
+                **(sales_ingestor.stats() if sales_ingestor else {}),
             },
             {
                 "name": "Anomaly Detector",
                 "type": "Isolation Forest / Statistical",
                 "status": "active" if anomaly_detector else "inactive",
+                **(anomaly_detector.stats() if anomaly_detector else {}),
+            },
+            {
+                "name": "Streaming Anomaly Detector",
+                "type": "Welford / EWMA / day-of-week x hour seasonal baselines",
+                "status": "active" if anomaly_stream else "inactive",
+                "tracked_metrics": len(anomaly_stream) if anomaly_stream else 0,
+            },
+            {
+                "name": "Cart Safety Check",
+                "type": "Bitmask inverted indexes (condition / dosha -> products)",
+                "status": "active" if cart_checker else "inactive",
+                **(cart_checker.stats() if cart_checker else {}),
             },
         ]
     })
@@ -30,13 +30,70 @@ class Settings(BaseSettings):
     # Recommendation
     NUM_RECOMMENDATIONS: int = 10
     MIN_SIMILARITY_SCORE: float = 0.5
+    RECOMMENDATION_DEADLINE_MS: float = 250.0
+    RECOMMENDATION_STRATEGY_WORKERS: int = 8
+    RECOMMENDATION_MAX_CANDIDATES: int = 300
+    BULK_RECOMMENDATION_DIR: str = "./data/bulk_recommendations"
+    BULK_RECOMMENDATION_BLOCK_SIZE: int = 2048
+    BULK_RECOMMENDATION_INPUT_DIR: str = "./data/bulk_recommendation_inputs"
+
+    # User Profiles
+    USER_PROFILE_CAPACITY: int = 100_000
+    USER_PROFILE_HISTORY_SIZE: int = 20
+    USER_PROFILE_HALF_LIFE_DAYS: float = 30.0
+    USER_PROFILE_SNAPSHOT_PATH: str = "./data/user_profiles.npz"
+
+    # Recommendation Exclusions (Bloom filters of purchased/dismissed products)
+    EXCLUSION_BITS_PER_USER: int = 1024
+    EXCLUSION_NUM_HASHES: int = 4
+    EXCLUSION_TARGET_FALSE_POSITIVE_RATE: float = 0.01
+    EXCLUSION_MAX_LAYERS: int = 6
+    EXCLUSION_MAX_MEMORY_MB: float = 256.0
+    EXCLUSION_SNAPSHOT_PATH: str = "./data/exclusions.npz"
+
+    # Frequently Bought Together
+    ASSOCIATION_MIN_SUPPORT: int = 2
+    ASSOCIATION_MIN_CONFIDENCE: float = 0.05
+    ASSOCIATION_MIN_LIFT: float = 1.0
+    ASSOCIATION_MAX_PER_ITEM: int = 20
+    ASSOCIATION_FULL_REFRESH_GROWTH: float = 0.1
 
     # Forecasting
     FORECAST_HORIZON_DAYS: int = 30
     MIN_HISTORICAL_DAYS: int = 30
+    FORECAST_MODEL_CACHE_SIZE: int = 256
+    FORECAST_MODEL_CACHE_DIR: str = "./data/forecast_models"
+    FORECAST_STATEFUL: bool = True
+    FORECAST_REFIT_INTERVAL_DAYS: int = 28
+    FORECAST_DRIFT_THRESHOLD: float = 2.0
+    FORECAST_JOB_DB_PATH: str = "./data/forecast_jobs.sqlite3"
+    FORECAST_JOB_WORKERS: int = 2
+    FORECAST_JOB_MAX_PENDING: int = 1000
+    FORECAST_JOB_LEASE_SECONDS: float = 60.0
+
+    # Sales Ingestion (order lines from DATABASE_URL -> cached daily series)
+    SALES_CACHE_DIR: str = "./data/sales"
+    SALES_INGEST_BATCH_SIZE: int = 50_000
+    SALES_INGEST_OVERLAP_SECONDS: float = 600.0
+    SALES_HISTORY_DAYS: int = 365
+
+    # Ayurveda Knowledge Base (versioned JSON file or directory; built-in tables if absent)
+    AYURVEDA_KNOWLEDGE_PATH: str = "./data/ayurveda"
+    AYURVEDA_KNOWLEDGE_POLL_SECONDS: float = 5.0
 
     # Anomaly Detection
     ANOMALY_THRESHOLD: float = 0.8
+    ANOMALY_MODEL_CACHE_SIZE: int = 64
+    ANOMALY_MODEL_CACHE_DIR: str = "./data/anomaly_models"
+    ANOMALY_REFIT_INTERVAL_DAYS: int = 7
+    ANOMALY_DRIFT_FACTOR: float = 3.0
+    ANOMALY_SCAN_THRESHOLD: float = 3.5
+    ANOMALY_SCAN_WINDOW_DAYS: int = 28
+    ANOMALY_STREAM_THRESHOLD: float = 3.0
+    ANOMALY_STREAM_EWMA_HALFLIFE: float = 24.0
+    ANOMALY_STREAM_WARMUP: int = 24
+    ANOMALY_STREAM_RELEARN_AFTER: int = 168
+    ANOMALY_STREAM_MAX_METRICS: int = 10_000
 
     class Config:
         env_file = ".env"
@@ -3,12 +3,21 @@ Anomaly Detection
 Detect anomalies in business metrics (revenue, orders, traffic, etc.)
 """
 
+import argparse
+import copy
+import json
+import threading
+import time
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import logging
 
+from models.changepoint import describe_changepoints, pelt, segment_ids
+from models.lof import IndexedLOF
+from models.model_cache import ModelCache, fingerprint
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -19,30 +28,73 @@ except ImportError:
     PYOD_AVAILABLE = False
     logger.warning("PyOD not installed. Using statistical anomaly detection")
 
+# Points in the rolling window and the seasonal lag (one week of daily data)
+FEATURE_WINDOW = 7
+
+# Score percentiles separating low / medium / high / critical anomalies
+SEVERITY_PERCENTILES = (90, 95, 99)
+SEVERITY_LABELS = np.array(['low', 'medium', 'high', 'critical'])
+
+# Share of the joint squared deviation a metric needs to count as contributing
+JOINT_CONTRIBUTION_SHARE = 0.25
+
+# New points scored since the last fit before the flagged share can trigger a drift refit
+MIN_DRIFT_POINTS = 7
+
 
 class AnomalyDetector:
     """Detect anomalies in time-series business metrics"""
 
-    def __init__(self, method: str = 'isolation_forest'):
+    def __init__(
+        self,
+        method: str = 'isolation_forest',
+        cache_size: int = 64,
+        cache_dir: Optional[str] = None,
+        refit_interval_days: int = 7,
+        drift_factor: float = 3.0
+    ):
         """
         Initialize anomaly detector
 
         Args:
-            method: Detection method ('isolation_forest', 'lof', or 'statistical')
+            method: Detection method ('isolation_forest', 'lof', 'lof_indexed' or 'statistical');
+                'lof_indexed' finds neighbours through a KD-tree/FAISS index and does not need PyOD
+            cache_size: Fitted per-metric models kept in memory
+            cache_dir: Directory to persist fitted models (None for memory only)
+            refit_interval_days: Scheduled refit once a model's fit is this old
+            drift_factor: Refit when the share of new points flagged exceeds this multiple of the contamination
         """
         self.method = method
         self.model = None
+        self.contamination = 0.1
+        self.refit_interval = pd.Timedelta(days=refit_interval_days)
+        self.drift_factor = drift_factor
+        self.models = ModelCache(capacity=cache_size, cache_dir=cache_dir)  # Fitted models per metric key
 
         if PYOD_AVAILABLE and method == 'isolation_forest':
-            self.model = IForest(contamination=0.1, random_state=42)
+            self.model = IForest(contamination=self.contamination, random_state=42)
         elif PYOD_AVAILABLE and method == 'lof':
-            self.model = LOF(contamination=0.1)
+            self.model = LOF(contamination=self.contamination)
+        elif method == 'lof_indexed':
+            self.model = IndexedLOF(contamination=self.contamination)
+
+        self._stats_lock = threading.Lock()
+        self.fits = 0
+        self.scheduled_refits = 0
+        self.drift_refits = 0
+        self.fit_seconds = 0.0
+        self.fitted_points = 0
+        self.scores = 0
+        self.score_seconds = 0.0
+        self.scored_points = 0
 
     def detect_anomalies(
         self,
         data: pd.DataFrame,
         metric_column: str = 'value',
-        threshold: float = 2.5
+        threshold: float = 2.5,
+        key: Optional[str] = None,
+        changepoints: Optional[List[Dict]] = None
     ) -> List[Dict]:
         """
         Detect anomalies in time-series data
@@ -51,6 +103,10 @@ class AnomalyDetector:
             data: DataFrame with columns ['date', metric_column]
             metric_column: Name of the metric column
             threshold: Standard deviations for statistical method
+            key: Metric identifier; ML models fitted under a key are reused and only
+                score points newer than the last call (plus a restated last point)
+            changepoints: Shifts from detect_changepoints on the same data; baselines
+                restart at each one instead of flagging the new level point by point
 
         Returns:
             List of detected anomalies
@@ -59,143 +115,354 @@ class AnomalyDetector:
             logger.warning("Insufficient data for anomaly detection")
             return []
 
-        if self.model and PYOD_AVAILABLE:
-            return self._ml_based_detection(data, metric_column)
+        segments = None
+        if changepoints:
+            segments = segment_ids(len(data), np.array([c['index'] for c in changepoints], dtype=np.int64))
+
+        if self.model is not None:
+            return self._ml_based_detection(data, metric_column, key, segments)
         else:
-            return self._statistical_detection(data, metric_column, threshold)
+            return self._statistical_detection(data, metric_column, threshold, segments)
+
+    def detect_changepoints(
+        self,
+        data: pd.DataFrame,
+        metric_column: str = 'value',
+        penalty: Optional[float] = None,
+        min_shift: float = 1.0
+    ) -> List[Dict]:
+        """
+        Detect level shifts (regime changes) in time-series data
+
+        Args:
+            data: DataFrame with columns ['date', metric_column]
+            metric_column: Name of the metric column
+            penalty: PELT penalty per changepoint (default 4 * log(n), see changepoint.pelt)
+            min_shift: Smallest reported shift, in noise standard deviations
+
+        Returns:
+            List of shifts with the levels before and after, in time order
+        """
+        df = _sorted_by_date(data)
+        values = df[metric_column].to_numpy(dtype=np.float64)
+
+        # A regime must outlast one season (a day of hourly data, a week of daily data)
+        spacing = df['date'].diff().median()
+        season_length = 24 if pd.notna(spacing) and spacing < pd.Timedelta(days=1) else FEATURE_WINDOW
+
+        indices = pelt(values, penalty=penalty, min_size=season_length, season_length=season_length)
+        return describe_changepoints(df['date'], values, indices, min_shift, season_length)
 
     def _ml_based_detection(
         self,
         data: pd.DataFrame,
-        metric_column: str
+        metric_column: str,
+        key: Optional[str] = None,
+        segments: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """Machine learning-based anomaly detection using Isolation Forest or LOF"""
         try:
-            # Prepare features
-            df = data.copy()
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date')
-
-            # Create features
-            features = []
-            for i in range(len(df)):
-                row_features = [
-                    df[metric_column].iloc[i],
-                    df['date'].iloc[i].dayofweek,  # Day of week
-                    df['date'].iloc[i].hour if 'hour' in df.columns else 12,
-                ]
-
-                # Add rolling statistics
-                if i >= 7:
-                    window = df[metric_column].iloc[max(0, i-7):i]
-                    row_features.extend([
-                        window.mean(),
-                        window.std(),
-                    ])
-                else:
-                    row_features.extend([df[metric_column].iloc[i], 0])
-
-                features.append(row_features)
-
-            X = np.array(features)
-
-            # Fit and predict
-            self.model.fit(X)
-            predictions = self.model.predict(X)  # 0 = normal, 1 = anomaly
-            scores = self.model.decision_scores_
-
-            # Extract anomalies
-            anomalies = []
-            for i, (pred, score) in enumerate(zip(predictions, scores)):
-                if pred == 1:  # Anomaly detected
-                    # Calculate expected value (mean of previous 7 days)
-                    if i >= 7:
-                        expected = df[metric_column].iloc[max(0, i-7):i].mean()
-                    else:
-                        expected = df[metric_column].mean()
-
-                    actual = df[metric_column].iloc[i]
-                    deviation = ((actual - expected) / expected * 100) if expected > 0 else 0
-
-                    severity = self._calculate_severity(score, scores)
-
-                    anomalies.append({
-                        'date': df['date'].iloc[i].isoformat(),
-                        'metric': metric_column,
-                        'expected': round(expected, 2),
-                        'actual': round(actual, 2),
-                        'deviation_percent': round(deviation, 2),
-                        'severity': severity,
-                        'anomaly_score': round(float(score), 3),
-                        'reason': self._generate_reason(actual, expected, deviation),
+            df = _sorted_by_date(data)
+            values = df[metric_column].to_numpy(dtype=np.float64)
+            features = anomaly_features(df['date'], values, segments=segments)
+
+            # Expected value: mean of the previous window, or the overall mean before one exists
+            expected = features['rolling_mean'].to_numpy().copy()
+            expected[:FEATURE_WINDOW] = values.mean()
+
+            config_fingerprint = fingerprint(np.zeros(0), self._model_config(metric_column, segments is not None))
+            entry = self.models.get(key, config_fingerprint) if key is not None else None
+            rescore = _history_changes(entry, df['date'], values) if entry and 'dates' in entry else None
+            refit = self._refit_reason(entry, df['date'], rescore)
+
+            if refit is None:
+                # Reuse stored scores for unchanged history; score new points and a
+                # restated last day (e.g. today's partial revenue, now complete)
+                new = (df['date'] > entry['scored_through']).to_numpy()
+                scores = pd.Series(entry['scores'], index=entry['dates']).reindex(df['date']).to_numpy(copy=True)
+                score_mask = new | rescore
+                start = time.perf_counter()
+                if score_mask.any():
+                    scores[score_mask] = entry['model'].decision_function(features.to_numpy()[score_mask])
+                self._record_score(int(score_mask.sum()), time.perf_counter() - start)
+
+                flagged = scores > entry['threshold']
+                anomalies = self._build_anomalies(
+                    df['date'], values, expected, scores,
+                    severity_levels(scores, entry['cutoffs']), flagged, metric_column
+                )
+                if score_mask.any():
+                    entry.update({
+                        'scored_through': df['date'].iloc[-1],
+                        'new_points': entry['new_points'] + int(new.sum()),
+                        'new_flagged': entry['new_flagged'] + int((flagged & new).sum()),
+                        'dates': df['date'].to_numpy(),
+                        'values': values,
+                        'scores': scores,
                     })
+                    self.models.put(key, config_fingerprint, entry)
+                return anomalies
+
+            model = copy.deepcopy(self.model)
+            start = time.perf_counter()
+            model.fit(features.to_numpy())
+            self._record_fit(refit, len(df), time.perf_counter() - start)
+
+            predictions = model.labels_  # 0 = normal, 1 = anomaly
+            scores = model.decision_scores_
+            anomalies = self._build_anomalies(
+                df['date'], values, expected, scores, severity_levels(scores),
+                predictions == 1, metric_column
+            )
 
+            if key is not None:
+                # Scored history is kept so later calls can detect restated points
+                self.models.put(key, config_fingerprint, {
+                    'model': model,
+                    'threshold': float(model.threshold_),
+                    'cutoffs': np.percentile(scores, SEVERITY_PERCENTILES),
+                    'fitted_through': df['date'].iloc[-1],
+                    'scored_through': df['date'].iloc[-1],
+                    'new_points': 0,
+                    'new_flagged': 0,
+                    'dates': df['date'].to_numpy(),
+                    'values': values,
+                    'scores': np.asarray(scores, dtype=np.float64),
+                })
             return anomalies
 
         except Exception as e:
             logger.error(f"ML-based detection failed: {e}")
-            return self._statistical_detection(data, metric_column)
+            return self._statistical_detection(data, metric_column, segments=segments)
+
+    def _model_config(self, metric_column: str, segmented: bool = False) -> Dict:
+        """Settings a stored model must share with the current request to be reused"""
+        return {
+            'method': self.method,
+            'contamination': self.contamination,
+            'window': FEATURE_WINDOW,
+            'metric_column': metric_column,
+            'segmented': segmented,
+        }
+
+    def _refit_reason(
+        self,
+        entry: Optional[Dict],
+        dates: pd.Series,
+        rescore: Optional[np.ndarray] = None
+    ) -> Optional[str]:
+        """Why a stored model must be refitted ('initial', 'scheduled', 'drift'), or None to reuse it"""
+        if entry is None or rescore is None:
+            # No model yet, or the history it was fitted on no longer matches this data
+            return 'initial'
+        if dates.iloc[-1] < entry['scored_through']:
+            # History was truncated; the stored scores no longer apply
+            return 'initial'
+        if dates.iloc[-1] - entry['fitted_through'] >= self.refit_interval:
+            return 'scheduled'
+        if (
+            entry['new_points'] >= MIN_DRIFT_POINTS
+            and entry['new_flagged'] > self.drift_factor * self.contamination * entry['new_points']
+        ):
+            return 'drift'
+        return None
+
+    def _record_fit(self, reason: str, points: int, seconds: float):
+        with self._stats_lock:
+            self.fits += 1
+            self.scheduled_refits += reason == 'scheduled'
+            self.drift_refits += reason == 'drift'
+            self.fitted_points += points
+            self.fit_seconds += seconds
+
+    def _record_score(self, points: int, seconds: float):
+        with self._stats_lock:
+            self.scores += 1
+            self.scored_points += points
+            self.score_seconds += seconds
+
+    def stats(self) -> Dict:
+        """Fit versus score counts and timings, plus model cache occupancy"""
+        with self._stats_lock:
+            return {
+                'fits': self.fits,
+                'scheduled_refits': self.scheduled_refits,
+                'drift_refits': self.drift_refits,
+                'fit_seconds': round(self.fit_seconds, 4),
+                'fit_ms_per_point': round(1000 * self.fit_seconds / self.fitted_points, 6) if self.fitted_points else 0.0,
+                'scores': self.scores,
+                'score_seconds': round(self.score_seconds, 4),
+                'score_ms_per_point': round(1000 * self.score_seconds / self.scored_points, 6) if self.scored_points else 0.0,
+                **self.models.stats(),
+            }
 
     def _statistical_detection(
         self,
         data: pd.DataFrame,
         metric_column: str,
-        threshold: float = 2.5
+        threshold: float = 2.5,
+        segments: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """Statistical anomaly detection using Z-score and moving averages"""
-        df = data.copy()
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
+        df = _sorted_by_date(data)
+        values = df[metric_column].to_numpy(dtype=np.float64)
+        features = anomaly_features(df['date'], values, segments=segments)
+
+        # Moving average and deviation of the previous window; a window that included
+        # the current point would cap |z| at (n - 1) / sqrt(n), 2.27 for 7 points, and
+        # nothing would ever pass the default threshold
+        ma = features['rolling_mean'].to_numpy().copy()
+        ma_std = features['rolling_std'].to_numpy().copy()
+
+        # Before a full window exists, compare against the whole series instead
+        warmup = warmup_mask(len(values), FEATURE_WINDOW, segments)
+        ma[warmup] = values.mean()
+        ma_std[warmup] = values.std(ddof=1) if len(values) > 1 else 0.0
+
+        # Z-score based on moving average
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_scores = np.where(ma_std > 0, np.abs(values - ma) / ma_std, 0.0)
+
+        severity = np.select([z_scores > 4, z_scores > 3], ['critical', 'high'], 'medium')
+        return self._build_anomalies(
+            df['date'], values, ma, z_scores, severity, z_scores > threshold, metric_column
+        )
+
+    def _build_anomalies(
+        self,
+        dates: pd.Series,
+        values: np.ndarray,
+        expected: np.ndarray,
+        scores: np.ndarray,
+        severity: np.ndarray,
+        mask: np.ndarray,
+        metric_column: str
+    ) -> List[Dict]:
+        """Anomaly records for flagged points; everything except the dicts is computed in array form"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = np.where(expected > 0, (values - expected) / expected * 100, 0.0)
 
-        # Calculate statistics
-        mean = df[metric_column].mean()
-        std = df[metric_column].std()
+        anomalies = []
+        for i in np.flatnonzero(mask):
+            anomalies.append({
+                'date': dates.iloc[i].isoformat(),
+                'metric': metric_column,
+                'expected': round(float(expected[i]), 2),
+                'actual': round(float(values[i]), 2),
+                'deviation_percent': round(float(deviation[i]), 2),
+                'severity': str(severity[i]),
+                'anomaly_score': round(float(scores[i]), 3),
+                'reason': self._generate_reason(values[i], expected[i], deviation[i]),
+            })
 
-        # Calculate moving average
-        df['ma_7'] = df[metric_column].rolling(window=7, min_periods=1).mean()
-        df['ma_std'] = df[metric_column].rolling(window=7, min_periods=1).std()
+        return anomalies
 
-        anomalies = []
+    def detect_joint_anomalies(
+        self,
+        data: pd.DataFrame,
+        metric_columns: List[str],
+        threshold: float = 2.5
+    ) -> List[Dict]:
+        """
+        Detect anomalies in several correlated metrics with one model
 
-        for i, row in df.iterrows():
-            value = row[metric_column]
-            ma = row['ma_7']
-            ma_std = row['ma_std'] if not pd.isna(row['ma_std']) else std
+        One detector is fitted on the joint feature space instead of one per
+        metric, so combinations (e.g. revenue and AOV collapsing while orders
+        look normal) are caught. Each anomaly lists the metrics that contributed.
 
-            # Z-score based on moving average
-            z_score = abs((value - ma) / ma_std) if ma_std > 0 else 0
+        Args:
+            data: DataFrame with columns ['date'] + metric_columns
+            metric_columns: Metrics to model jointly
+            threshold: RMS standardized deviation for the statistical fallback
 
-            if z_score > threshold:
-                deviation = ((value - ma) / ma * 100) if ma > 0 else 0
+        Returns:
+            List of joint anomalies
+        """
+        if len(data) < 7:
+            logger.warning("Insufficient data for anomaly detection")
+            return []
 
-                severity = (
-                    'critical' if z_score > 4 else
-                    'high' if z_score > 3 else
-                    'medium'
-                )
+        df = _sorted_by_date(data)
+        values = df[metric_columns].to_numpy(dtype=np.float64)
+
+        # Per-metric features, calendar columns only once
+        per_metric = [anomaly_features(df['date'], values[:, j]) for j in range(len(metric_columns))]
+        calendar = per_metric[0][['day_of_week', 'hour', 'day_of_month']].to_numpy(dtype=np.float64)
+        value_columns = ['value', 'rolling_mean', 'rolling_std', 'lag_1', f"lag_{FEATURE_WINDOW}"]
+        X = np.hstack([calendar] + [f[value_columns].to_numpy() for f in per_metric])
+
+        expected = np.column_stack([f['rolling_mean'].to_numpy() for f in per_metric])
+        expected[:FEATURE_WINDOW] = values.mean(axis=0)
+        spread = np.column_stack([f['rolling_std'].to_numpy() for f in per_metric])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(spread > 0, (values - expected) / spread, 0.0)
+
+        if self.model is not None:
+            # Standardize so no metric dominates distance-based detectors by scale alone
+            std = X.std(axis=0)
+            X = (X - X.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+            model = copy.deepcopy(self.model)
+            start = time.perf_counter()
+            model.fit(X)
+            self._record_fit('initial', len(df), time.perf_counter() - start)
+            scores = model.decision_scores_
+            mask = model.labels_ == 1
+            severity = severity_levels(scores)
+        else:
+            scores = np.sqrt((z ** 2).mean(axis=1))
+            mask = scores > threshold
+            severity = np.select([scores > 4, scores > 3], ['critical', 'high'], 'medium')
 
-                anomalies.append({
-                    'date': row['date'].isoformat(),
-                    'metric': metric_column,
-                    'expected': round(ma, 2),
-                    'actual': round(value, 2),
-                    'deviation_percent': round(deviation, 2),
-                    'severity': severity,
-                    'anomaly_score': round(z_score, 3),
-                    'reason': self._generate_reason(value, ma, deviation),
-                })
+        # Each metric's share of the squared standardized deviation at that point
+        sq = z ** 2
+        total = sq.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.where(total > 0, sq / total, 1.0 / len(metric_columns))
+            deviation = np.where(expected > 0, (values - expected) / expected * 100, 0.0)
+
+        anomalies = []
+        for i in np.flatnonzero(mask):
+            order = np.argsort(-shares[i])
+            contributing = [j for j in order if shares[i, j] >= JOINT_CONTRIBUTION_SHARE] or [order[0]]
+            anomalies.append({
+                'date': df['date'].iloc[i].isoformat(),
+                'metrics': {
+                    metric: {
+                        'expected': round(float(expected[i, j]), 2),
+                        'actual': round(float(values[i, j]), 2),
+                        'deviation_percent': round(float(deviation[i, j]), 2),
+                        'contribution': round(float(shares[i, j]), 3),
+                    }
+                    for j, metric in enumerate(metric_columns)
+                },
+                'contributing_metrics': [metric_columns[j] for j in contributing],
+                'severity': str(severity[i]),
+                'anomaly_score': round(float(scores[i]), 3),
+                'reason': "; ".join(
+                    f"{metric_columns[j]}: {describe_deviation(values[i, j], expected[i, j], deviation[i, j])}"
+                    for j in contributing
+                ),
+            })
 
         return anomalies
 
     def detect_revenue_anomalies(
         self,
-        revenue_data: pd.DataFrame
+        revenue_data: pd.DataFrame,
+        multivariate: bool = False,
+        rebaseline: bool = False
     ) -> Dict:
         """
         Detect anomalies in revenue metrics
 
         Args:
             revenue_data: DataFrame with columns ['date', 'revenue', 'orders']
+            multivariate: Fit one joint model on revenue, orders and AOV instead of three
+                univariate ones; per-metric lists then hold the joint anomalies each
+                metric contributed to
+            rebaseline: Detect level shifts per metric, report them under 'changepoints'
+                and restart the baselines after each (univariate mode)
 
         Returns:
             Anomaly detection results
@@ -205,28 +472,51 @@ class AnomalyDetector:
             'order_anomalies': [],
             'aov_anomalies': [],
         }
+        lists = {'revenue': 'revenue_anomalies', 'orders': 'order_anomalies', 'aov': 'aov_anomalies'}
 
-        # Revenue anomalies
-        if 'revenue' in revenue_data.columns:
-            results['revenue_anomalies'] = self.detect_anomalies(
-                revenue_data[['date', 'revenue']].rename(columns={'revenue': 'value'}),
-                metric_column='value'
+        if multivariate and {'revenue', 'orders'} <= set(revenue_data.columns):
+            joint_data = revenue_data[['date', 'revenue', 'orders']].assign(
+                aov=revenue_data['revenue'] / revenue_data['orders'].replace(0, 1)
             )
+            joint = self.detect_joint_anomalies(joint_data, ['revenue', 'orders', 'aov'])
+
+            for anomaly in joint:
+                for metric in anomaly['contributing_metrics']:
+                    detail = anomaly['metrics'][metric]
+                    results[lists[metric]].append({
+                        'date': anomaly['date'],
+                        'metric': metric,
+                        'expected': detail['expected'],
+                        'actual': detail['actual'],
+                        'deviation_percent': detail['deviation_percent'],
+                        'severity': anomaly['severity'],
+                        'anomaly_score': anomaly['anomaly_score'],
+                        'reason': anomaly['reason'],
+                        'contributing_metrics': anomaly['contributing_metrics'],
+                    })
+            results['joint_anomalies'] = joint
+            return results
 
-        # Order anomalies
+        metric_data = {}
+        if 'revenue' in revenue_data.columns:
+            metric_data['revenue'] = revenue_data[['date', 'revenue']].rename(columns={'revenue': 'value'})
         if 'orders' in revenue_data.columns:
-            results['order_anomalies'] = self.detect_anomalies(
-                revenue_data[['date', 'orders']].rename(columns={'orders': 'value'}),
-                metric_column='value'
-            )
-
-        # AOV anomalies
+            metric_data['orders'] = revenue_data[['date', 'orders']].rename(columns={'orders': 'value'})
         if 'revenue' in revenue_data.columns and 'orders' in revenue_data.columns:
-            aov_data = revenue_data.copy()
-            aov_data['aov'] = aov_data['revenue'] / aov_data['orders'].replace(0, 1)
-            results['aov_anomalies'] = self.detect_anomalies(
-                aov_data[['date', 'aov']].rename(columns={'aov': 'value'}),
-                metric_column='value'
+            aov = revenue_data['revenue'] / revenue_data['orders'].replace(0, 1)
+            metric_data['aov'] = pd.DataFrame({'date': revenue_data['date'], 'value': aov})
+
+        changepoints = {}
+        if rebaseline:
+            changepoints = {metric: self.detect_changepoints(df) for metric, df in metric_data.items()}
+            results['changepoints'] = changepoints
+
+        for metric, df in metric_data.items():
+            results[lists[metric]] = self.detect_anomalies(
+                df,
+                metric_column='value',
+                key=metric,
+                changepoints=changepoints.get(metric)
             )
 
         return results
@@ -249,34 +539,21 @@ class AnomalyDetector:
         if 'visitors' in traffic_data.columns:
             visitor_anomalies = self.detect_anomalies(
                 traffic_data[['date', 'visitors']].rename(columns={'visitors': 'value'}),
-                metric_column='value'
+                metric_column='value',
+                key='visitors'
             )
             anomalies.extend(visitor_anomalies)
 
         if 'page_views' in traffic_data.columns:
             pageview_anomalies = self.detect_anomalies(
                 traffic_data[['date', 'page_views']].rename(columns={'page_views': 'value'}),
-                metric_column='value'
+                metric_column='value',
+                key='page_views'
             )
             anomalies.extend(pageview_anomalies)
 
         return anomalies
 
-    def _calculate_severity(self, score: float, all_scores: np.ndarray) -> str:
-        """Calculate severity level based on anomaly score"""
-        percentile_90 = np.percentile(all_scores, 90)
-        percentile_95 = np.percentile(all_scores, 95)
-        percentile_99 = np.percentile(all_scores, 99)
-
-        if score >= percentile_99:
-            return 'critical'
-        elif score >= percentile_95:
-            return 'high'
-        elif score >= percentile_90:
-            return 'medium'
-        else:
-            return 'low'
-
     def _generate_reason(
         self,
         actual: float,
@@ -284,22 +561,143 @@ class AnomalyDetector:
         deviation: float
     ) -> str:
         """Generate human-readable reason for anomaly"""
-        if actual > expected:
-            direction = "spike"
-            if abs(deviation) > 100:
-                return f"Unusual {direction} - {abs(deviation):.0f}% above normal (possible campaign or viral effect)"
-            elif abs(deviation) > 50:
-                return f"Significant {direction} - {abs(deviation):.0f}% above normal (investigate traffic sources)"
-            else:
-                return f"Moderate {direction} - {abs(deviation):.0f}% above normal"
+        return describe_deviation(actual, expected, deviation)
+
+
+def describe_deviation(actual: float, expected: float, deviation: float) -> str:
+    """Human-readable reason for an anomaly, shared by the batch and streaming detectors"""
+    if actual > expected:
+        direction = "spike"
+        if abs(deviation) > 100:
+            return f"Unusual {direction} - {abs(deviation):.0f}% above normal (possible campaign or viral effect)"
+        elif abs(deviation) > 50:
+            return f"Significant {direction} - {abs(deviation):.0f}% above normal (investigate traffic sources)"
         else:
-            direction = "drop"
-            if abs(deviation) > 100:
-                return f"Critical {direction} - {abs(deviation):.0f}% below normal (possible technical issue)"
-            elif abs(deviation) > 50:
-                return f"Significant {direction} - {abs(deviation):.0f}% below normal (investigate immediately)"
-            else:
-                return f"Moderate {direction} - {abs(deviation):.0f}% below normal"
+            return f"Moderate {direction} - {abs(deviation):.0f}% above normal"
+    else:
+        direction = "drop"
+        if abs(deviation) > 100:
+            return f"Critical {direction} - {abs(deviation):.0f}% below normal (possible technical issue)"
+        elif abs(deviation) > 50:
+            return f"Significant {direction} - {abs(deviation):.0f}% below normal (investigate immediately)"
+        else:
+            return f"Moderate {direction} - {abs(deviation):.0f}% below normal"
+
+
+def _history_changes(entry: Dict, dates: pd.Series, values: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Compare data with the history a stored model already scored
+
+    Only the last scored point may differ (a partial day completed since); any
+    other mismatch or gap means the history was restated or belongs to another
+    series under the same key.
+
+    Returns:
+        Mask of points to re-score, or None if the history no longer matches
+    """
+    if pd.Index(entry['dates']).has_duplicates:
+        return None
+    old = (dates <= entry['scored_through']).to_numpy()
+    previous = pd.Series(entry['values'], index=entry['dates']).reindex(dates[old]).to_numpy()
+    changed = ~np.isclose(previous, values[old])  # NaN (date not seen before) counts as changed
+
+    is_last = (dates[old] == entry['scored_through']).to_numpy()
+    if (changed & ~is_last).any():
+        return None
+
+    rescore = np.zeros(len(dates), dtype=bool)
+    rescore[np.flatnonzero(old)[changed]] = True
+    return rescore
+
+
+def _sorted_by_date(data: pd.DataFrame) -> pd.DataFrame:
+    df = data.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    return df.sort_values('date', ignore_index=True)
+
+
+def warmup_mask(length: int, window: int, segments: Optional[np.ndarray] = None) -> np.ndarray:
+    """Points with fewer than `window` earlier points in their regime (the whole series without segments)"""
+    if segments is None:
+        return np.arange(length) < window
+    groups = pd.Series(segments)
+    return (groups.groupby(groups).cumcount() < window).to_numpy()
+
+
+def anomaly_features(
+    dates: pd.Series,
+    values: np.ndarray,
+    window: int = FEATURE_WINDOW,
+    segments: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """
+    Feature matrix for the ML detectors, built with array operations only
+
+    Rolling statistics cover the previous `window` points (excluding the current
+    one); before a full window exists they fall back to the value itself and 0.
+    With segments, windows and lags never reach back across a regime change, so
+    the baseline restarts after each detected shift.
+
+    Args:
+        dates: Timestamps sorted ascending
+        values: Metric values aligned with dates
+        window: Rolling window and seasonal lag length
+        segments: Optional regime number of every point (see changepoint.segment_ids)
+
+    Returns:
+        DataFrame with one row per point: value, calendar, hour-of-day,
+        rolling mean/std and lag features
+    """
+    dates = pd.DatetimeIndex(dates)
+    series = pd.Series(values, dtype=np.float64)
+
+    warmup = warmup_mask(len(series), window, segments)
+    if segments is None:
+        prior = series.shift(1).rolling(window, min_periods=window)
+        lag_1, lag_w = series.shift(1), series.shift(window)
+    else:
+        groups = pd.Series(segments)
+        lag_1 = series.groupby(groups).shift(1)
+        lag_w = series.groupby(groups).shift(window)
+        prior = lag_1.groupby(groups).rolling(window, min_periods=window)
+
+    # Daily data carries no hour-of-day signal; use midday so the feature is constant
+    hours = dates.hour.to_numpy()
+    if len(hours) and (hours == hours[0]).all():
+        hours = np.full(len(dates), 12)
+
+    rolling_mean, rolling_std = prior.mean(), prior.std()
+    if segments is not None:
+        rolling_mean = rolling_mean.reset_index(level=0, drop=True).sort_index()
+        rolling_std = rolling_std.reset_index(level=0, drop=True).sort_index()
+
+    return pd.DataFrame({
+        'value': series.to_numpy(),
+        'day_of_week': dates.dayofweek.to_numpy(),
+        'hour': hours,
+        'rolling_mean': np.where(warmup, series.to_numpy(), rolling_mean.to_numpy()),
+        'rolling_std': np.where(warmup, 0.0, rolling_std.to_numpy()),
+        'lag_1': lag_1.fillna(series).to_numpy(),
+        f"lag_{window}": lag_w.fillna(series).to_numpy(),
+        'day_of_month': dates.day.to_numpy(),
+    })
+
+
+def severity_levels(scores: np.ndarray, cutoffs: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Severity label for every score from one percentile pass over all scores
+
+    Args:
+        scores: Anomaly scores (higher = more anomalous)
+        cutoffs: Precomputed SEVERITY_PERCENTILES of the training scores, for
+            scoring new points against a stored model
+
+    Returns:
+        Array of 'low' / 'medium' / 'high' / 'critical'
+    """
+    if cutoffs is None:
+        cutoffs = np.percentile(scores, SEVERITY_PERCENTILES)
+    return SEVERITY_LABELS[np.searchsorted(cutoffs, scores, side='right')]
 
 
 def generate_mock_metrics_data(days: int = 90) -> pd.DataFrame:
@@ -330,3 +728,55 @@ def generate_mock_metrics_data(days: int = 90) -> pd.DataFrame:
         'revenue': revenue.round(2),
         'orders': (revenue / 500 + np.random.normal(0, 5, days)).round(0).astype(int),
     })
+
+
+if __name__ == '__main__':
+    # python -m models.anomaly --points 100000
+    parser = argparse.ArgumentParser(description="Benchmark anomaly detection on a long hourly series")
+    parser.add_argument('--points', type=int, default=100_000)
+    parser.add_argument('--method', default='isolation_forest', choices=['isolation_forest', 'lof', 'lof_indexed', 'statistical'])
+    parser.add_argument('--new-points', type=int, default=24, help="Points appended before the incremental re-score")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    total = args.points + args.new_points
+
+    rng = np.random.default_rng(args.seed)
+    hours = np.arange(total)
+    values = (
+        1000
+        + 300 * np.sin(hours * 2 * np.pi / 24)
+        + 150 * np.sin(hours * 2 * np.pi / (24 * 7))
+        + rng.normal(0, 50, total)
+    )
+    spikes = rng.choice(args.points, size=max(args.points // 1000, 1), replace=False)
+    values[spikes] *= rng.choice([0.3, 2.0], size=len(spikes))
+    full_series = pd.DataFrame({
+        'date': pd.date_range('2020-01-01', periods=total, freq='h'),
+        'value': values,
+    })
+    series = full_series.head(args.points)
+
+    detector = AnomalyDetector(method=args.method)
+    start = time.perf_counter()
+    anomaly_features(series['date'], values[:args.points])
+    feature_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    anomalies = detector.detect_anomalies(series, key='benchmark')
+    detect_seconds = time.perf_counter() - start
+
+    # Same metric with new points appended: the stored model only scores those
+    start = time.perf_counter()
+    detector.detect_anomalies(full_series, key='benchmark')
+    rescore_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'points': args.points,
+        'method': args.method if detector.model is not None else 'statistical',
+        'feature_seconds': round(feature_seconds, 3),
+        'detect_seconds': round(detect_seconds, 3),
+        'rescore_seconds': round(rescore_seconds, 3),
+        'anomalies': len(anomalies),
+        'injected': len(spikes),
+        'model': detector.stats(),
+    }, indent=2, default=str))
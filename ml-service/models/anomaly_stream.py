@@ -0,0 +1,277 @@
+"""
+Streaming Anomaly Detection
+Score metric events as they arrive against incrementally updated per-metric state
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import logging
+
+from models.anomaly import describe_deviation
+
+logger = logging.getLogger(__name__)
+
+# Seasonal buckets: one per hour of the week (day-of-week x hour-of-day)
+NUM_BUCKETS = 7 * 24
+
+# Smallest spread allowed, as a share of the pooled one-step error of all events
+SPREAD_FLOOR = 0.5
+
+# z-score reported when a metric with zero spread (e.g. a flat success rate) moves
+ZERO_SPREAD_SCORE = 1e6
+
+
+class MetricState:
+    """Running statistics for one metric; every update and score is O(1)"""
+
+    __slots__ = (
+        'count', 'mean', 'm2', 'ewma', 'ewm_var', 'err_sq',
+        'bucket_count', 'bucket_mean', 'bucket_var', 'last_seen', 'anomalies', 'anomaly_run',
+    )
+
+    def __init__(self):
+        self.count = 0  # Welford count, mean and sum of squared deviations over all events
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = 0.0  # Exponentially weighted mean and variance of recent events
+        self.ewm_var = 0.0
+        self.err_sq = 0.0  # Exponentially weighted squared one-step error, pooled over all buckets
+        self.bucket_count = np.zeros(NUM_BUCKETS, dtype=np.int64)
+        self.bucket_mean = np.zeros(NUM_BUCKETS)
+        self.bucket_var = np.zeros(NUM_BUCKETS)
+        self.last_seen: Optional[pd.Timestamp] = None
+        self.anomalies = 0
+        self.anomaly_run = 0  # Consecutive anomalous events, none of which were absorbed
+
+    @property
+    def std(self) -> float:
+        """Standard deviation over every event seen"""
+        return float(np.sqrt(self.m2 / self.count)) if self.count > 1 else 0.0
+
+    def baseline(self, bucket: int, min_bucket_count: int, bucket_memory: int, bucket_prior: float) -> tuple:
+        """
+        Expected value and spread for an event in the given bucket
+
+        The seasonal bucket mean is used once it has min_bucket_count events,
+        otherwise the EWMA. A bucket only ever holds a handful of events, so its
+        variance is shrunk toward the pooled one-step error (bucket_prior events'
+        worth) and floored at SPREAD_FLOOR of it; a zero spread falls back to the
+        all-time deviation.
+        """
+        pooled = self.err_sq if self.err_sq > 0 else self.ewm_var
+        n = min(int(self.bucket_count[bucket]), bucket_memory)
+        if n >= min_bucket_count:
+            expected = self.bucket_mean[bucket]
+            var = (n * self.bucket_var[bucket] + bucket_prior * pooled) / (n - 1 + bucket_prior)
+        else:
+            expected, var = self.ewma, pooled
+        var = max(var, SPREAD_FLOOR ** 2 * pooled)
+        std = float(np.sqrt(var)) if var > 0 else self.std
+        return float(expected), std
+
+    def update(self, value: float, bucket: int, ewma_alpha: float, bucket_memory: int, expected: float):
+        """Fold one event, and its error against the expected value, into the running statistics"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        # 1/n weighting until the window fills makes early EWMA values exact running means
+        self.ewma, self.ewm_var = _ew_update(
+            self.ewma, self.ewm_var, value, max(1.0 / self.count, ewma_alpha)
+        )
+        if self.count > 1:
+            alpha = max(1.0 / (self.count - 1), ewma_alpha)
+            self.err_sq += alpha * ((value - expected) ** 2 - self.err_sq)
+
+        self.bucket_count[bucket] += 1
+        alpha = 1.0 / min(self.bucket_count[bucket], bucket_memory)
+        self.bucket_mean[bucket], self.bucket_var[bucket] = _ew_update(
+            self.bucket_mean[bucket], self.bucket_var[bucket], value, alpha
+        )
+
+
+def _ew_update(mean: float, var: float, value: float, alpha: float) -> tuple:
+    """Exponentially weighted mean/variance step (alpha = 1 / n reproduces Welford)"""
+    diff = value - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * (var + diff * increment)
+
+
+class StreamingAnomalyDetector:
+    """Per-metric online detector that flags anomalies the moment an event arrives"""
+
+    def __init__(
+        self,
+        threshold: float = 3.0,
+        ewma_halflife: float = 24.0,
+        bucket_memory: int = 8,
+        min_bucket_count: int = 3,
+        bucket_prior: float = 24.0,
+        warmup: int = 24,
+        relearn_after: Optional[int] = 168,
+        capacity: int = 10_000,
+        on_anomaly: Optional[Callable[[Dict], None]] = None
+    ):
+        """
+        Initialize streaming detector
+
+        Args:
+            threshold: |z| above which an event is anomalous
+            ewma_halflife: Half-life of the EWMA baseline, in events
+            bucket_memory: Events after which a seasonal bucket switches to exponential forgetting
+            min_bucket_count: Events a seasonal bucket needs before it replaces the EWMA baseline
+            bucket_prior: Weight, in events, of the pooled error when estimating a bucket's spread
+            warmup: Events per metric scored before any anomaly is reported
+            relearn_after: Consecutive anomalous events after which the metric is relearned
+                from scratch, treating the shift as the new normal (None to flag indefinitely)
+            capacity: Maximum metrics tracked; the least recently updated is evicted
+            on_anomaly: Called with every anomaly record as soon as it is detected
+        """
+        self.threshold = threshold
+        self.ewma_alpha = 1 - 0.5 ** (1.0 / ewma_halflife)
+        self.bucket_memory = bucket_memory
+        self.min_bucket_count = min_bucket_count
+        self.bucket_prior = bucket_prior
+        self.warmup = warmup
+        self.relearn_after = relearn_after
+        self.capacity = capacity
+        self.on_anomaly = on_anomaly
+
+        self._states: 'OrderedDict[str, MetricState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.events = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, metric: str) -> bool:
+        return metric in self._states
+
+    def observe(self, metric: str, value: float, timestamp=None) -> Optional[Dict]:
+        """
+        Score one event against the metric's state, then absorb it
+
+        Anomalous events are not absorbed, so a sustained outage keeps being
+        scored against the pre-outage baseline and stays flagged until values
+        recover (or relearn_after consecutive events have been flagged).
+
+        Args:
+            metric: Metric name (e.g. 'revenue', 'checkout_success')
+            value: Observed value
+            timestamp: Event time (defaults to now)
+
+        Returns:
+            Anomaly record if the event is anomalous, else None
+        """
+        timestamp = pd.Timestamp.now() if timestamp is None else pd.Timestamp(timestamp)
+        value = float(value)
+        bucket = timestamp.dayofweek * 24 + timestamp.hour
+
+        with self._lock:
+            state = self._states.get(metric)
+            if state is None:
+                state = MetricState()
+                self._states[metric] = state
+                if len(self._states) > self.capacity:
+                    self._states.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._states.move_to_end(metric)
+
+            # Score before updating, so the event cannot dampen its own z-score
+            expected, std = state.baseline(bucket, self.min_bucket_count, self.bucket_memory, self.bucket_prior)
+            if std > 0:
+                z_score = abs(value - expected) / std
+            else:
+                # Nothing has ever varied: any move (a flat checkout rate dropping to 0) is anomalous
+                z_score = 0.0 if np.isclose(value, expected) else ZERO_SPREAD_SCORE
+            anomalous = state.count >= self.warmup and z_score > self.threshold
+
+            if not anomalous:
+                state.anomaly_run = 0
+                state.update(value, bucket, self.ewma_alpha, self.bucket_memory, expected)
+            else:
+                state.anomalies += 1
+                state.anomaly_run += 1
+                if self.relearn_after and state.anomaly_run >= self.relearn_after:
+                    logger.warning(f"{metric} anomalous for {state.anomaly_run} events; relearning its baseline")
+                    relearned = MetricState()
+                    relearned.anomalies = state.anomalies
+                    relearned.update(value, bucket, self.ewma_alpha, self.bucket_memory, value)
+                    self._states[metric] = state = relearned
+            state.last_seen = timestamp
+            self.events += 1
+
+        if not anomalous:
+            return None
+
+        deviation = (value - expected) / expected * 100 if expected > 0 else 0.0
+        anomaly = {
+            'date': timestamp.isoformat(),
+            'metric': metric,
+            'expected': round(expected, 2),
+            'actual': round(value, 2),
+            'deviation_percent': round(deviation, 2),
+            'severity': 'critical' if z_score > 4 else 'high' if z_score > 3 else 'medium',
+            'anomaly_score': round(z_score, 3),
+            'reason': describe_deviation(value, expected, deviation),
+        }
+        if self.on_anomaly is not None:
+            try:
+                self.on_anomaly(anomaly)
+            except Exception as e:
+                logger.error(f"Anomaly callback failed: {e}")
+        return anomaly
+
+    def observe_many(self, events: List[Dict]) -> List[Dict]:
+        """
+        Score a batch of events in arrival order
+
+        Args:
+            events: Dicts with 'metric', 'value' and optional 'timestamp'
+
+        Returns:
+            Anomaly records for the anomalous events
+        """
+        anomalies = []
+        for event in events:
+            anomaly = self.observe(event['metric'], event['value'], event.get('timestamp'))
+            if anomaly is not None:
+                anomalies.append(anomaly)
+        return anomalies
+
+    def state(self, metric: str) -> Dict:
+        """Current running statistics of one metric"""
+        with self._lock:
+            state = self._states[metric]
+            return {
+                'metric': metric,
+                'events': state.count,
+                'mean': round(state.mean, 4),
+                'std': round(state.std, 4),
+                'ewma': round(state.ewma, 4),
+                'ewm_std': round(float(np.sqrt(max(state.ewm_var, 0.0))), 4),
+                'error_std': round(float(np.sqrt(state.err_sq)), 4),
+                'seasonal_buckets_ready': int((state.bucket_count >= self.min_bucket_count).sum()),
+                'anomalies': state.anomalies,
+                'anomaly_run': state.anomaly_run,
+                'last_seen': state.last_seen.isoformat() if state.last_seen is not None else None,
+            }
+
+    def stats(self) -> Dict:
+        """Tracked metrics and event counters"""
+        with self._lock:
+            metrics = list(self._states.keys())
+            anomalies = sum(state.anomalies for state in self._states.values())
+        return {
+            'tracked_metrics': len(metrics),
+            'metrics': metrics,
+            'events': self.events,
+            'anomalies': anomalies,
+            'evictions': self.evictions,
+        }
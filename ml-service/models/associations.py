@@ -0,0 +1,220 @@
+"""
+Frequently Bought Together
+Sparse co-occurrence association mining over order baskets
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List
+import numpy as np
+from scipy import sparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AssociationMiner:
+    """Pruned per-product 'bought together' table built from basket co-occurrence"""
+
+    def __init__(
+        self,
+        min_support: int = 2,
+        min_confidence: float = 0.05,
+        min_lift: float = 1.0,
+        max_per_item: int = 20,
+        full_refresh_growth: float = 0.1
+    ):
+        """
+        Initialize miner
+
+        Args:
+            min_support: Minimum number of baskets containing both products
+            min_confidence: Minimum P(other | product)
+            min_lift: Minimum lift, confidence / P(other)
+            max_per_item: Associations kept per product
+            full_refresh_growth: Recompute every product once the basket count has grown
+                by this fraction since the last full refresh (0 to refresh on every update)
+        """
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.min_lift = min_lift
+        self.max_per_item = max_per_item
+        self.full_refresh_growth = full_refresh_growth
+
+        self.product_ids: List[str] = []
+        self.product_cols: Dict[str, int] = {}
+        self.item_counts = np.zeros(0, dtype=np.int64)
+        self.cooccurrence = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.num_baskets = 0
+
+        self.table: Dict[str, List[Dict]] = {}
+        self.last_refresh = None
+        self.last_full_refresh = None
+        self._baskets_at_full_refresh = 0
+        self._lock = threading.Lock()
+
+    def fit(self, baskets: Iterable[List[str]]) -> Dict:
+        """
+        Rebuild counts and the association table from scratch
+
+        Args:
+            baskets: Iterable of orders, each a list of product IDs
+
+        Returns:
+            Refresh statistics
+        """
+        with self._lock:
+            self.product_ids = []
+            self.product_cols = {}
+            self.item_counts = np.zeros(0, dtype=np.int64)
+            self.cooccurrence = sparse.csr_matrix((0, 0), dtype=np.int64)
+            self.num_baskets = 0
+            self.table = {}
+            self._baskets_at_full_refresh = 0
+
+        return self.partial_fit(baskets, full_refresh=True)
+
+    def partial_fit(self, baskets: Iterable[List[str]], full_refresh: bool = False) -> Dict:
+        """
+        Fold new orders into the counts and refresh affected products
+
+        Only products that appear in the new baskets get their associations
+        recomputed. Every product's lift also depends on num_baskets and the
+        other product's count, so rows of untouched products drift out of date;
+        once the basket count has grown by full_refresh_growth since the last
+        full refresh, all products are recomputed. Pass full_refresh=True to
+        force that.
+
+        Args:
+            baskets: Iterable of orders, each a list of product IDs
+            full_refresh: Recompute all products instead of the affected ones
+
+        Returns:
+            Refresh statistics
+        """
+        start_time = time.perf_counter()
+
+        with self._lock:
+            basket_matrix = self._basket_matrix(baskets)
+            num_new = basket_matrix.shape[0]
+
+            # Co-occurrence is X^T X over the binary baskets x products matrix
+            num_items = len(self.product_ids)
+            self.cooccurrence.resize((num_items, num_items))
+            self.cooccurrence = (self.cooccurrence + (basket_matrix.T @ basket_matrix)).tocsr()
+            self.item_counts = np.concatenate([
+                self.item_counts, np.zeros(num_items - len(self.item_counts), dtype=np.int64)
+            ]) + np.asarray(basket_matrix.sum(axis=0)).ravel()
+            self.num_baskets += num_new
+
+            growth = self.num_baskets - self._baskets_at_full_refresh
+            full_refresh = full_refresh or growth > self.full_refresh_growth * self._baskets_at_full_refresh
+            if full_refresh:
+                affected = np.arange(num_items)
+                self._baskets_at_full_refresh = self.num_baskets
+                self.last_full_refresh = time.time()
+            else:
+                affected = np.flatnonzero(np.asarray(basket_matrix.sum(axis=0)).ravel())
+
+            table = dict(self.table)
+            for col in affected:
+                table[self.product_ids[col]] = self._associations_for(col)
+            self.table = table  # Swap in whole so readers never see a partial update
+            self.last_refresh = time.time()
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Association table refreshed for {len(affected)} products in {elapsed_ms:.0f}ms")
+
+        return {
+            'new_baskets': num_new,
+            'total_baskets': self.num_baskets,
+            'products': len(self.product_ids),
+            'refreshed_products': int(len(affected)),
+            'full_refresh': full_refresh,
+            'elapsed_ms': round(elapsed_ms, 2),
+        }
+
+    def bought_together(self, product_id: str, n: int = 10) -> List[Dict]:
+        """
+        Products frequently bought with the given product
+
+        Args:
+            product_id: Product ID
+            n: Maximum number of associations
+
+        Returns:
+            Precomputed associations, best first
+        """
+        return self.table.get(product_id, [])[:n]
+
+    def co_purchase_table(self) -> Dict[str, List[str]]:
+        """Product ID -> associated product IDs, for candidate generation"""
+        return {pid: [a['id'] for a in assocs] for pid, assocs in self.table.items() if assocs}
+
+    def stats(self) -> Dict:
+        """Table size and pruning settings"""
+        return {
+            'baskets': self.num_baskets,
+            'products': len(self.product_ids),
+            'products_with_associations': sum(1 for assocs in self.table.values() if assocs),
+            'cooccurrence_nnz': int(self.cooccurrence.nnz),
+            'min_support': self.min_support,
+            'min_confidence': self.min_confidence,
+            'min_lift': self.min_lift,
+            'last_refresh': self.last_refresh,
+            'last_full_refresh': self.last_full_refresh,
+            'baskets_since_full_refresh': self.num_baskets - self._baskets_at_full_refresh,
+        }
+
+    def _basket_matrix(self, baskets: Iterable[List[str]]) -> sparse.csr_matrix:
+        """Binary baskets x products matrix, growing the product vocabulary as needed"""
+        indptr = [0]
+        indices = []
+        for basket in baskets:
+            cols = {self._column(str(pid)) for pid in basket}
+            if len(cols) == 0:
+                continue
+            indices.extend(cols)
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.int64)
+        return sparse.csr_matrix(
+            (data, np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.product_ids))
+        )
+
+    def _column(self, product_id: str) -> int:
+        col = self.product_cols.get(product_id)
+        if col is None:
+            col = len(self.product_ids)
+            self.product_cols[product_id] = col
+            self.product_ids.append(product_id)
+        return col
+
+    def _associations_for(self, col: int) -> List[Dict]:
+        """Score and prune one product's co-occurrence row"""
+        start, stop = self.cooccurrence.indptr[col], self.cooccurrence.indptr[col + 1]
+        others = self.cooccurrence.indices[start:stop]
+        support = self.cooccurrence.data[start:stop]
+
+        keep = (others != col) & (support >= self.min_support)
+        others, support = others[keep], support[keep]
+        if len(others) == 0:
+            return []
+
+        confidence = support / self.item_counts[col]
+        lift = confidence / (self.item_counts[others] / self.num_baskets)
+
+        keep = (confidence >= self.min_confidence) & (lift >= self.min_lift)
+        others, support, confidence, lift = others[keep], support[keep], confidence[keep], lift[keep]
+
+        order = np.lexsort((-lift, -confidence))[:self.max_per_item]
+        return [
+            {
+                'id': self.product_ids[other],
+                'support': int(support[i]),
+                'confidence': round(float(confidence[i]), 4),
+                'lift': round(float(lift[i]), 4),
+            }
+            for i, other in zip(order, others[order])
+        ]
@@ -0,0 +1,329 @@
+"""
+Forecast Backtesting
+Rolling-origin evaluation of forecasting models on synthetic or real SKU histories
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+from models.ets import fit_holt_winters
+from models.forecast_router import croston_sba
+from models.forecasting import (
+    PROPHET_AVAILABLE,
+    DemandForecaster,
+    generate_mock_historical_data,
+    prophet_config,
+    align_ends,
+    series_matrix,
+)
+
+logger = logging.getLogger(__name__)
+
+if PROPHET_AVAILABLE:
+    from prophet import Prophet
+
+
+class BacktestModel:
+    """Model adapter: fit on training histories, then predict a horizon for every series"""
+
+    name = 'model'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        raise NotImplementedError
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+
+class MovingAverageModel(BacktestModel):
+    name = 'moving_average'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        self.series = series
+        self.forecaster = DemandForecaster()
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        return {
+            product_id: np.array([p['predicted'] for p in self.forecaster._moving_average_forecast(df, horizon)['forecasts']])
+            for product_id, df in self.series.items()
+        }
+
+
+class ProphetModel(BacktestModel):
+    name = 'prophet'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        self.models = {}
+        for product_id, df in series.items():
+            train = pd.DataFrame({'ds': pd.to_datetime(df.iloc[:, 0]), 'y': df.iloc[:, 1]})
+            model = Prophet(**prophet_config(len(train)))
+            model.fit(train)
+            self.models[product_id] = model
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        predictions = {}
+        for product_id, model in self.models.items():
+            forecast = model.predict(model.make_future_dataframe(periods=horizon))
+            predictions[product_id] = np.maximum(forecast['yhat'].tail(horizon).to_numpy(), 0)
+        return predictions
+
+
+class HoltWintersModel(BacktestModel):
+    name = 'holt_winters'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        self.product_ids, Y, calendar = series_matrix(series)
+        self.fit_result = fit_holt_winters(align_ends(Y, calendar)[0])
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        mean = self.fit_result.forecast(horizon)[0]
+        return dict(zip(self.product_ids, mean))
+
+
+class CrostonModel(BacktestModel):
+    name = 'croston_sba'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        self.product_ids, Y, calendar = series_matrix(series)
+        self.rate, _ = croston_sba(align_ends(Y, calendar)[0])
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        return {product_id: np.full(horizon, rate) for product_id, rate in zip(self.product_ids, self.rate)}
+
+
+class RoutedModel(BacktestModel):
+    """DemandForecaster.forecast_many: per-series routing, so fitting happens at predict time"""
+
+    name = 'routed'
+
+    def fit(self, series: Dict[str, pd.DataFrame]):
+        self.series = series
+        self.forecaster = DemandForecaster()
+
+    def predict(self, horizon: int) -> Dict[str, np.ndarray]:
+        results = self.forecaster.forecast_many(self.series, horizon)
+        return {
+            product_id: np.array([p['predicted'] for p in result['forecasts']])
+            for product_id, result in results.items()
+        }
+
+
+MODELS = {
+    model.name: model
+    for model in (MovingAverageModel, HoltWintersModel, CrostonModel, RoutedModel, ProphetModel)
+    if model is not ProphetModel or PROPHET_AVAILABLE
+}
+
+
+def generate_synthetic_catalog(
+    num_skus: int,
+    days: int = 365,
+    intermittent_share: float = 0.3,
+    trend_range: Tuple[float, float] = (-0.3, 0.5),
+    seasonality_range: Tuple[float, float] = (0.0, 0.4),
+    seed: int = 0
+) -> Dict[str, pd.DataFrame]:
+    """
+    Synthetic SKU histories with varied level, trend, seasonality and intermittency
+
+    Args:
+        num_skus: Number of SKUs
+        days: Days of history per SKU
+        intermittent_share: Fraction of SKUs with sporadic demand
+        trend_range: Total change in demand over the history, drawn uniformly per SKU
+            from this range as a multiple of its base demand
+        seasonality_range: Weekly seasonal amplitude, drawn uniformly per SKU from this
+            range as a multiple of its base demand
+        seed: Random seed
+
+    Returns:
+        SKU ID -> DataFrame with columns ['date', 'quantity']
+    """
+    for name, (low, high) in (('trend_range', trend_range), ('seasonality_range', seasonality_range)):
+        if low > high:
+            raise ValueError(f"{name} must be (low, high), got ({low}, {high})")
+    if seasonality_range[0] < 0:
+        raise ValueError("seasonality_range must not be negative")
+
+    rng = np.random.default_rng(seed)
+    end = datetime(2024, 12, 31)
+    base = rng.lognormal(3.0, 1.0, num_skus)
+    intermittent = rng.random(num_skus) < intermittent_share
+
+    return {
+        f"SKU-{i:06d}": generate_mock_historical_data(
+            days=days,
+            base_demand=base[i],
+            trend=base[i] * rng.uniform(*trend_range),
+            seasonality=base[i] * rng.uniform(*seasonality_range),
+            noise=base[i] * rng.uniform(0.05, 0.3),
+            intermittency=rng.uniform(0.5, 0.9) if intermittent[i] else 0.0,
+            seed=seed * 1_000_003 + i,
+            end=end,
+        )
+        for i in range(num_skus)
+    }
+
+
+def _evaluate(model_name: str, series: Dict[str, pd.DataFrame], origin: int, horizon: int) -> Dict:
+    """Fit one model on data before the origin and score the next horizon days"""
+    train = {pid: df.iloc[:origin] for pid, df in series.items()}
+    actual = {pid: df.iloc[origin:origin + horizon, 1].to_numpy(dtype=np.float64) for pid, df in series.items()}
+    model = MODELS[model_name]()
+
+    start = time.perf_counter()
+    model.fit(train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.predict(horizon)
+    predict_seconds = time.perf_counter() - start
+
+    # Peak memory from a separate traced run; tracing slows Python-heavy models
+    # several times over and would skew the timings above
+    tracemalloc.start()
+    try:
+        traced = MODELS[model_name]()
+        traced.fit(train)
+        traced.predict(horizon)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    product_ids = list(series)
+    y = np.vstack([actual[pid] for pid in product_ids])
+    y_hat = np.vstack([predictions[pid][:horizon] for pid in product_ids])
+    abs_err = np.abs(y - y_hat)
+    denom = np.abs(y) + np.abs(y_hat)
+
+    # Error sums, so folds can be pooled exactly
+    return {
+        'model': model_name,
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'peak_bytes': peak_bytes,
+        'ape_sum': float((abs_err[y > 0] / y[y > 0]).sum()),
+        'ape_count': int((y > 0).sum()),
+        'sape_sum': float((2 * abs_err[denom > 0] / denom[denom > 0]).sum()),
+        'sape_count': int((denom > 0).sum()),
+        'abs_err_sum': float(abs_err.sum()),
+        'actual_sum': float(np.abs(y).sum()),
+    }
+
+
+class Backtester:
+    """Rolling-origin backtest of several models, folds run in parallel"""
+
+    def __init__(
+        self,
+        models: Optional[List[str]] = None,
+        horizon: int = 14,
+        folds: int = 3,
+        step: int = 14,
+        workers: Optional[int] = None
+    ):
+        """
+        Initialize backtester
+
+        Args:
+            models: Model names from MODELS (defaults to all available)
+            horizon: Days forecast at each origin
+            folds: Number of forecast origins
+            step: Days between consecutive origins
+            workers: Worker processes (defaults to CPU count; 1 runs inline and gives
+                the cleanest timings)
+        """
+        unknown = set(models or []) - set(MODELS)
+        if unknown:
+            raise ValueError(f"Unknown models: {sorted(unknown)}. Available: {sorted(MODELS)}")
+
+        self.models = models or list(MODELS)
+        self.horizon = horizon
+        self.folds = folds
+        self.step = step
+        self.workers = workers or os.cpu_count() or 1
+
+    def run(self, series: Dict[str, pd.DataFrame]) -> Dict:
+        """
+        Evaluate every model at every origin
+
+        Args:
+            series: SKU ID -> DataFrame with columns ['date', 'quantity'] on a shared calendar
+
+        Returns:
+            Per-model accuracy (MAPE, sMAPE, WAPE in %), fit/predict wall time and peak memory
+        """
+        num_days = min(len(df) for df in series.values())
+        origins = [num_days - self.horizon - i * self.step for i in range(self.folds)]
+        if min(origins) < 28:
+            raise ValueError("Not enough history for the requested folds")
+
+        tasks = [(model, origin) for model in self.models for origin in origins]
+        start = time.perf_counter()
+
+        if self.workers <= 1:
+            fold_results = [_evaluate(model, series, origin, self.horizon) for model, origin in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(_evaluate, model, series, origin, self.horizon) for model, origin in tasks]
+                fold_results = [future.result() for future in futures]
+
+        report = {}
+        for model in self.models:
+            folds = [r for r in fold_results if r['model'] == model]
+            fit_seconds = sum(r['fit_seconds'] for r in folds)
+            predict_seconds = sum(r['predict_seconds'] for r in folds)
+            report[model] = {
+                'mape': round(100 * sum(r['ape_sum'] for r in folds) / max(sum(r['ape_count'] for r in folds), 1), 2),
+                'smape': round(100 * sum(r['sape_sum'] for r in folds) / max(sum(r['sape_count'] for r in folds), 1), 2),
+                'wape': round(100 * sum(r['abs_err_sum'] for r in folds) / max(sum(r['actual_sum'] for r in folds), 1e-9), 2),
+                'fit_seconds': round(fit_seconds, 3),
+                'predict_seconds': round(predict_seconds, 3),
+                'ms_per_series': round(1000 * (fit_seconds + predict_seconds) / (len(folds) * len(series)), 3),
+                'peak_memory_mb': round(max(r['peak_bytes'] for r in folds) / 1e6, 2),
+            }
+
+        return {
+            'series': len(series),
+            'horizon': self.horizon,
+            'folds': self.folds,
+            'workers': self.workers,
+            'elapsed_seconds': round(time.perf_counter() - start, 3),
+            'models': report,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backtest forecasting models on synthetic SKUs")
+    parser.add_argument('--skus', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--intermittent-share', type=float, default=0.3)
+    parser.add_argument('--trend-range', type=float, nargs=2, default=[-0.3, 0.5], metavar=('LOW', 'HIGH'),
+                        help="Total trend over the history, as a multiple of base demand")
+    parser.add_argument('--seasonality-range', type=float, nargs=2, default=[0.0, 0.4], metavar=('LOW', 'HIGH'),
+                        help="Weekly seasonal amplitude, as a multiple of base demand")
+    parser.add_argument('--horizon', type=int, default=14)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--step', type=int, default=14)
+    parser.add_argument('--models', nargs='*', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = generate_synthetic_catalog(
+        args.skus, args.days, args.intermittent_share,
+        trend_range=tuple(args.trend_range),
+        seasonality_range=tuple(args.seasonality_range),
+        seed=args.seed
+    )
+    backtester = Backtester(args.models, args.horizon, args.folds, args.step, args.workers)
+    print(json.dumps(backtester.run(catalog), indent=2))
@@ -0,0 +1,360 @@
+"""
+Bulk Recommendation Precompute
+Block-wise users x items scoring for campaign-sized recommendation exports
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not installed. Bulk recommendations will be written as .npz")
+
+# Item embeddings shared by pool workers, set once per process by _init_worker
+_worker_embeddings = None
+
+
+def _init_worker(normalized_embeddings: np.ndarray):
+    """Process pool initializer: keep the item matrix resident in each worker"""
+    global _worker_embeddings
+    _worker_embeddings = normalized_embeddings
+
+
+def score_block(
+    profiles: np.ndarray,
+    exclude_indptr: np.ndarray,
+    exclude_indices: np.ndarray,
+    k: int,
+    embeddings: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score a block of user profiles against every item and keep the top k
+
+    Args:
+        profiles: User profile vectors (n_users, dim)
+        exclude_indptr: CSR row pointers of item rows to exclude per user
+        exclude_indices: CSR column indices of item rows to exclude
+        k: Recommendations per user
+        embeddings: L2-normalized item embeddings (defaults to the worker's copy)
+
+    Returns:
+        (item_rows, scores), both of shape (n_users, k), best first
+    """
+    embeddings = _worker_embeddings if embeddings is None else embeddings
+
+    norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+    scores = (profiles / np.maximum(norms, 1e-12)) @ embeddings.T
+
+    # Mask already-seen items in one scatter
+    user_rows = np.repeat(np.arange(len(profiles)), np.diff(exclude_indptr))
+    scores[user_rows, exclude_indices] = -np.inf
+
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    rows = np.take_along_axis(top, order, axis=1).astype(np.int32)
+    top_scores = np.take_along_axis(top_scores, order, axis=1).astype(np.float32)
+
+    # Users who have seen nearly the whole catalog get -1 padding
+    rows[~np.isfinite(top_scores)] = -1
+    top_scores[rows < 0] = np.nan
+
+    return rows, top_scores
+
+
+# Extensions accepted for user input files
+INPUT_FORMATS = ('.ndjson', '.jsonl', '.parquet')
+
+
+def read_users(path: str, block_size: int = 2048) -> Iterator[Dict]:
+    """
+    Stream users from an NDJSON or parquet file without loading it whole
+
+    Args:
+        path: .ndjson/.jsonl file with one {'user_id': ..., 'history': [...]} object
+            per line, or a .parquet file with user_id and (optionally) history columns
+        block_size: Rows decoded per parquet batch
+
+    Yields:
+        {'user_id': ..., 'history': [product IDs]} per user
+    """
+    if path.endswith('.parquet'):
+        if not PYARROW_AVAILABLE:
+            raise ValueError("pyarrow is required to read parquet user files")
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in ('user_id', 'history') if c in parquet.schema_arrow.names]
+        if 'user_id' not in columns:
+            raise ValueError(f"{os.path.basename(path)} has no user_id column")
+        for batch in parquet.iter_batches(batch_size=block_size, columns=columns):
+            yield from batch.to_pylist()
+    elif path.endswith(INPUT_FORMATS):
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                user = json.loads(line)
+                if 'user_id' not in user:
+                    raise ValueError(f"{os.path.basename(path)} line {line_number} has no user_id")
+                yield user
+    else:
+        raise ValueError(f"User files must be one of {', '.join(INPUT_FORMATS)}")
+
+
+def save_user_input(chunks: Iterable[bytes], directory: str, extension: str = '.ndjson') -> str:
+    """
+    Write an uploaded or inline user list to a content-addressed file
+
+    The name is the SHA-256 of the contents, so resubmitting the same users
+    references the same file (and deduplicates as the same job).
+
+    Args:
+        chunks: File contents, streamed
+        directory: Input directory
+        extension: One of INPUT_FORMATS
+
+    Returns:
+        Name of the file inside directory
+    """
+    if extension not in INPUT_FORMATS:
+        raise ValueError(f"User files must be one of {', '.join(INPUT_FORMATS)}")
+    os.makedirs(directory, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        name = f"users-{digest.hexdigest()}{extension}"
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+class BulkRecommendationJob:
+    """Precompute top-k recommendations for a stream of users"""
+
+    def __init__(
+        self,
+        recommender,
+        k: int = 20,
+        block_size: int = 2048,
+        workers: Optional[int] = None
+    ):
+        """
+        Initialize job
+
+        Args:
+            recommender: ProductRecommender with a loaded catalog
+            k: Recommendations per user
+            block_size: Users scored per matrix block
+            workers: Worker processes (defaults to CPU count; 1 runs inline)
+        """
+        if recommender.product_embeddings is None:
+            raise ValueError("Products not loaded. Call load_products() first")
+
+        self.recommender = recommender
+        self.k = k
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+
+    def run(self, users: Iterable[Dict], output_path: str) -> Dict:
+        """
+        Score all users and write the results to a columnar file
+
+        Args:
+            users: Iterable of {'user_id': ..., 'history': [product IDs]}; users
+                without history fall back to their stored profile, then popularity
+            output_path: .parquet (requires pyarrow) or .npz output file
+
+        Returns:
+            Job statistics including users/second throughput
+        """
+        start_time = time.perf_counter()
+        embeddings = self.recommender.normalized_embeddings
+        writer = _ResultWriter(output_path, self.recommender, self.k)
+
+        blocks = self._iter_blocks(users)
+        num_users = 0
+
+        if self.workers <= 1:
+            for user_ids, profiles, indptr, indices in blocks:
+                rows, scores = score_block(profiles, indptr, indices, self.k, embeddings)
+                writer.write(user_ids, rows, scores)
+                num_users += len(user_ids)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(embeddings,)
+            ) as pool:
+                # Bound the number of blocks in flight and write them in submission order
+                pending = deque()
+                for user_ids, profiles, indptr, indices in blocks:
+                    pending.append((user_ids, pool.submit(score_block, profiles, indptr, indices, self.k)))
+                    if len(pending) >= 2 * self.workers:
+                        num_users += self._drain_one(pending, writer)
+                while pending:
+                    num_users += self._drain_one(pending, writer)
+
+        writer.close()
+        elapsed = time.perf_counter() - start_time
+
+        stats = {
+            'output_path': writer.path,
+            'format': writer.format,
+            'users': num_users,
+            'k': self.k,
+            'workers': self.workers,
+            'elapsed_seconds': round(elapsed, 3),
+            'users_per_second': round(num_users / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Bulk recommendations: {num_users} users at {stats['users_per_second']} users/s")
+        return stats
+
+    @staticmethod
+    def _drain_one(pending: deque, writer: '_ResultWriter') -> int:
+        """Wait for the oldest block and write it"""
+        user_ids, future = pending.popleft()
+        rows, scores = future.result()
+        writer.write(user_ids, rows, scores)
+        return len(user_ids)
+
+    def _iter_blocks(self, users: Iterable[Dict]) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+        """Group users into blocks of (ids, profile matrix, CSR exclusions)"""
+        block = []
+        for user in users:
+            block.append(user)
+            if len(block) >= self.block_size:
+                yield self._build_block(block)
+                block = []
+        if block:
+            yield self._build_block(block)
+
+    def _build_block(self, users: List[Dict]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Resolve each user's profile vector and already-seen item rows"""
+        recommender = self.recommender
+        product_rows = recommender.product_rows
+        num_items = len(product_rows)
+
+        user_ids = [str(user['user_id']) for user in users]
+        seen = [
+            np.array([product_rows[pid] for pid in (user.get('history') or []) if pid in product_rows], dtype=np.int32)
+            for user in users
+        ]
+
+        # Users without usable history fall back to their stored profile
+        stored = {}
+        if recommender.profile_store is not None:
+            for i, rows in enumerate(seen):
+                if len(rows) == 0:
+                    profile = recommender.profile_store.get(user_ids[i])
+                    if profile is not None and profile.weight > 0:
+                        stored[i] = profile.profile_vector()
+                        seen[i] = profile.recent_items()
+
+        lengths = np.array([len(rows) for rows in seen], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.concatenate(seen).astype(np.int32) if seen else np.empty(0, dtype=np.int32)
+
+        # History profiles are row-normalized users x items matrix times the item embeddings
+        weights = np.repeat(1.0 / np.maximum(lengths, 1), lengths).astype(np.float32)
+        history_matrix = sparse.csr_matrix((weights, indices, indptr), shape=(len(users), num_items))
+        profiles = np.asarray(history_matrix @ recommender.product_embeddings, dtype=np.float32)
+
+        # Fold purchased/dismissed products into the per-user exclusions
+        if recommender.exclusion_store is not None and len(recommender.exclusion_store) > 0:
+            excluded = recommender.exclusion_store.excluded_matrix(user_ids, recommender.exclusion_positions)
+            if excluded.any():
+                combined = (history_matrix != 0).astype(bool) + sparse.csr_matrix(excluded)
+                indptr, indices = combined.indptr.astype(np.int64), combined.indices.astype(np.int32)
+
+        for i, vector in stored.items():
+            profiles[i] = vector
+
+        # Cold start: steer towards the most popular items
+        cold = (lengths == 0)
+        if cold.any():
+            popular = recommender.popularity.generate({}, self.k)
+            profiles[cold] = recommender.normalized_embeddings[popular].mean(axis=0)
+
+        return user_ids, profiles, indptr, indices
+
+
+class _ResultWriter:
+    """Columnar writer for bulk recommendation results"""
+
+    def __init__(self, path: str, recommender, k: int):
+        if path.endswith('.parquet') and not PYARROW_AVAILABLE:
+            path = path[:-len('.parquet')] + '.npz'
+            logger.warning(f"pyarrow not installed, writing {path} instead")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.format = 'parquet' if path.endswith('.parquet') else 'npz'
+        self.k = k
+        self.product_ids = np.array(
+            [recommender.product_index[i]['id'] for i in range(len(recommender.product_index))],
+            dtype=str
+        )
+        self._writer = None
+        self._chunks = []
+
+    def write(self, user_ids: List[str], rows: np.ndarray, scores: np.ndarray):
+        if self.format == 'npz':
+            self._chunks.append((np.array(user_ids, dtype=str), rows, scores))
+            return
+
+        # Long format with dictionary-encoded product IDs: one row per (user, rank)
+        k = rows.shape[1]
+        valid = rows.ravel() >= 0
+        table = pa.table({
+            'user_id': pa.array(np.repeat(np.array(user_ids, dtype=object), k)[valid]),
+            'rank': pa.array(np.tile(np.arange(1, k + 1, dtype=np.int16), len(user_ids))[valid]),
+            'product_id': pa.DictionaryArray.from_arrays(
+                pa.array(rows.ravel()[valid]), pa.array(self.product_ids)
+            ),
+            'score': pa.array(scores.ravel()[valid]),
+        })
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self.format == 'parquet':
+            if self._writer is not None:
+                self._writer.close()
+            return
+
+        # Wide format: item_rows/scores are (n_users, k), product_ids maps rows to IDs
+        with open(self.path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                user_ids=np.concatenate([c[0] for c in self._chunks]) if self._chunks else np.empty(0, dtype=str),
+                item_rows=np.vstack([c[1] for c in self._chunks]) if self._chunks else np.empty((0, self.k), dtype=np.int32),
+                scores=np.vstack([c[2] for c in self._chunks]) if self._chunks else np.empty((0, self.k), dtype=np.float32),
+                product_ids=self.product_ids,
+            )
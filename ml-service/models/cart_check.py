@@ -0,0 +1,189 @@
+"""
+Cart Safety Check
+Contraindication and dosha-conflict screening of whole carts with precomputed bitmask indexes
+"""
+
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from models.ayurveda import KnowledgeBase, current_knowledge, normalize_name
+
+logger = logging.getLogger(__name__)
+
+_QUALIFIER = re.compile(r'\s*\(.*?\)')
+
+
+def normalize_condition(condition: str) -> str:
+    """Condition lookup key without qualifiers: 'Pregnancy (high doses)' -> 'pregnancy'"""
+    return normalize_name(_QUALIFIER.sub('', str(condition)))
+
+
+class CartIndex:
+    """
+    Inverted indexes from condition / dosha to catalog products, as integer bitsets
+
+    Bit i of every mask stands for catalog row i, so a whole cart is screened
+    with one AND per user condition and one per dosha.
+    """
+
+    def __init__(self, products: List[Dict], kb: KnowledgeBase):
+        self.generation = kb.compiled.generation
+        self.product_ids = [str(p.get('id')) for p in products]
+        self.product_rows = {pid: row for row, pid in enumerate(self.product_ids)}
+
+        self.condition_products: Dict[str, int] = {}
+        self.aggravating_products: Dict[str, int] = {dosha: 0 for dosha in kb.compiled.doshas}
+        self.balancing_products: Dict[str, int] = {dosha: 0 for dosha in kb.compiled.doshas}
+
+        # Explanations for flagged (row, condition) and (row, dosha) pairs
+        self.condition_details: Dict[Tuple[int, str], List[Tuple[str, str]]] = {}
+        self.aggravating_ingredients: Dict[Tuple[int, str], List[str]] = {}
+
+        compiled = kb.compiled
+        for row, product in enumerate(products):
+            ingredients = product.get('ingredients')
+            if not isinstance(ingredients, list):
+                continue
+            bit = 1 << row
+            for name in ingredients:
+                ingredient_row = compiled.ingredient_row(name)
+                if ingredient_row is None:
+                    continue
+                canonical = compiled.ingredient_names[ingredient_row]
+
+                for contraindication in kb.ingredient_properties[canonical].get('contraindications', []):
+                    key = normalize_condition(contraindication)
+                    self.condition_products[key] = self.condition_products.get(key, 0) | bit
+                    self.condition_details.setdefault((row, key), []).append((canonical, contraindication))
+
+                for dosha, col in compiled.dosha_index.items():
+                    if compiled.aggravates[ingredient_row, col]:
+                        self.aggravating_products[dosha] |= bit
+                        self.aggravating_ingredients.setdefault((row, dosha), []).append(canonical)
+                    elif compiled.balances[ingredient_row, col]:
+                        self.balancing_products[dosha] |= bit
+
+    def cart_mask(self, product_ids: List[str]) -> Tuple[int, List[str]]:
+        """(bitset of the cart's catalog rows, IDs not in the catalog)"""
+        mask, unknown = 0, []
+        for pid in product_ids:
+            row = self.product_rows.get(str(pid))
+            if row is None:
+                unknown.append(str(pid))
+            else:
+                mask |= 1 << row
+        return mask, unknown
+
+    def check(self, product_ids: List[str], conditions: List[str], dosha: Optional[str] = None) -> Dict:
+        """
+        Screen a cart against a user's conditions and dosha
+
+        Args:
+            product_ids: Products in the cart
+            conditions: User's health conditions (e.g. 'Pregnancy', 'Gallstones')
+            dosha: User's primary dosha, if known
+
+        Returns:
+            Contraindicated products, dosha-aggravating products and balancing products;
+            'safe' is None when some products are not in the catalog and could not be screened
+        """
+        cart, unknown = self.cart_mask(product_ids)
+
+        contraindicated = []
+        for condition in dict.fromkeys(normalize_condition(c) for c in conditions):
+            hits = cart & self.condition_products.get(condition, 0)
+            for row in _rows(hits):
+                contraindicated.append({
+                    'productId': self.product_ids[row],
+                    'condition': condition,
+                    'ingredients': [
+                        {'ingredient': ingredient, 'contraindication': text}
+                        for ingredient, text in self.condition_details[(row, condition)]
+                    ],
+                })
+
+        dosha_conflicts, balancing = [], []
+        dosha = dosha.upper() if dosha else None
+        if dosha in self.aggravating_products:
+            for row in _rows(cart & self.aggravating_products[dosha]):
+                dosha_conflicts.append({
+                    'productId': self.product_ids[row],
+                    'dosha': dosha,
+                    'ingredients': self.aggravating_ingredients[(row, dosha)],
+                })
+            balancing = [self.product_ids[row] for row in _rows(cart & self.balancing_products[dosha])]
+
+        return {
+            'safe': False if contraindicated else None if unknown else True,
+            'contraindications': contraindicated,
+            'doshaConflicts': dosha_conflicts,
+            'balancingProducts': balancing,
+            'unknownProducts': unknown,
+        }
+
+
+def _rows(mask: int):
+    """Catalog rows of the set bits, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class CartChecker:
+    """Cart screening for one catalog, reindexed when the catalog or knowledge base changes"""
+
+    def __init__(self, products: List[Dict]):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._products = list(products)
+        self._index = CartIndex(self._products, current_knowledge())
+        self.checks = 0
+        self.check_seconds = 0.0
+
+    def load_products(self, products: List[Dict]):
+        """Replace the catalog and rebuild the indexes"""
+        products = list(products)
+        index = CartIndex(products, current_knowledge())
+        with self._lock:
+            self._products, self._index = products, index
+
+    def check(self, product_ids: List[str], conditions: List[str], dosha: Optional[str] = None) -> Dict:
+        """Screen a cart (see CartIndex.check); timing is included as checkMicros"""
+        index = self._current_index()
+        start = time.perf_counter()
+        result = index.check(product_ids, conditions, dosha)
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self.checks += 1
+            self.check_seconds += elapsed
+        result['checkMicros'] = round(elapsed * 1e6, 1)
+        return result
+
+    def stats(self) -> Dict:
+        """Index sizes and mean check latency"""
+        index = self._index
+        with self._stats_lock:
+            checks, seconds = self.checks, self.check_seconds
+        return {
+            'products': len(index.product_ids),
+            'conditions': len(index.condition_products),
+            'checks': checks,
+            'mean_check_micros': round(seconds / checks * 1e6, 1) if checks else 0.0,
+        }
+
+    def _current_index(self) -> CartIndex:
+        kb = current_knowledge()
+        index = self._index
+        if index.generation == kb.compiled.generation:
+            return index
+
+        # Knowledge base was reloaded since the last build
+        with self._lock:
+            if self._index.generation != kb.compiled.generation:
+                self._index = CartIndex(self._products, kb)
+            return self._index
@@ -0,0 +1,361 @@
+"""
+Holt-Winters Exponential Smoothing
+Vectorized additive/multiplicative Holt-Winters fitted on many series at once
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEASON_LENGTH = 7  # Weekly seasonality on daily data
+
+# Smoothing parameter grid searched for every series in one pass
+DEFAULT_ALPHAS = (0.1, 0.3, 0.5)
+DEFAULT_BETAS = (0.0, 0.05, 0.15)
+DEFAULT_GAMMAS = (0.05, 0.2)
+
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}
+
+_EPS = 1e-6
+
+
+class HoltWintersFit:
+    """Fitted parameters and final state for a block of series"""
+
+    def __init__(
+        self,
+        alpha: np.ndarray,
+        beta: np.ndarray,
+        gamma: np.ndarray,
+        multiplicative: np.ndarray,
+        level: np.ndarray,
+        trend: np.ndarray,
+        season: np.ndarray,
+        sigma: np.ndarray,
+        n_obs: np.ndarray,
+        next_phase,
+        season_length: int = SEASON_LENGTH
+    ):
+        """
+        Args:
+            alpha, beta, gamma: Selected smoothing parameters per series (S,)
+            multiplicative: True where the multiplicative model was selected (S,)
+            level, trend: Final level and trend per series (S,)
+            season: Seasonal state per series, indexed by calendar phase (S, m)
+            sigma: Residual standard deviation per series (S,)
+            n_obs: Observed (non-missing) points per series (S,)
+            next_phase: Calendar phase of the first forecast step, shared or per series
+            season_length: Season length m
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.multiplicative = multiplicative
+        self.level = level
+        self.trend = trend
+        self.season = season
+        self.sigma = sigma
+        self.n_obs = n_obs
+        self.next_phase = np.broadcast_to(np.asarray(next_phase, dtype=np.int64), np.shape(level)).copy()
+        self.season_length = season_length
+
+    def __len__(self) -> int:
+        return len(self.level)
+
+    def forecast(self, horizon: int, interval: float = 0.95) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Point forecasts and prediction intervals for every series
+
+        Args:
+            horizon: Steps ahead
+            interval: Coverage of the prediction interval (0.8, 0.9, 0.95 or 0.99)
+
+        Returns:
+            (mean, lower, upper), each of shape (S, horizon), clipped at zero
+        """
+        m = self.season_length
+        h = np.arange(1, horizon + 1, dtype=np.float64)
+        phases = (self.next_phase[:, None] + np.arange(horizon)[None, :]) % m
+
+        trend_path = self.level[:, None] + h[None, :] * self.trend[:, None]
+        season_path = np.take_along_axis(self.season, phases, axis=1)
+        mean = np.where(
+            self.multiplicative[:, None],
+            trend_path * season_path,
+            trend_path + season_path
+        )
+
+        # ETS(A,A,A) forecast variance, in state-space parameters beta = alpha * beta*, gamma = (1 - alpha) * gamma*
+        alpha = self.alpha[:, None]
+        beta = alpha * self.beta[:, None]
+        gamma = (1 - alpha) * self.gamma[:, None]
+        k = np.floor((h - 1) / m)[None, :]
+        hh = h[None, :]
+        multiplier = (
+            1
+            + (hh - 1) * (alpha ** 2 + alpha * beta * hh + beta ** 2 * hh * (2 * hh - 1) / 6)
+            + gamma * k * (2 * alpha + gamma + beta * m * (k + 1))
+        )
+        half_width = Z_SCORES.get(interval, 1.96) * self.sigma[:, None] * np.sqrt(multiplier)
+
+        mean = np.maximum(mean, 0)
+        return mean, np.maximum(mean - half_width, 0), mean + half_width
+
+    def update(self, y: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Absorb one new day per series in O(1), without refitting
+
+        Args:
+            y: New observation per updated series
+            rows: Series to update (defaults to all)
+
+        Returns:
+            One-step-ahead forecast errors for the updated series
+        """
+        rows = np.arange(len(self.level)) if rows is None else np.asarray(rows)
+        phase = self.next_phase[rows]
+
+        level, trend, season, err = holt_winters_step(
+            self.level[rows], self.trend[rows], self.season[rows, phase], np.asarray(y, dtype=np.float64),
+            self.alpha[rows], self.beta[rows], self.gamma[rows], self.multiplicative[rows]
+        )
+        self.level[rows] = level
+        self.trend[rows] = trend
+        self.season[rows, phase] = season
+        self.next_phase[rows] = (phase + 1) % self.season_length
+        return err
+
+    def take(self, rows: np.ndarray) -> 'HoltWintersFit':
+        """Copy of the fit restricted to some series"""
+        return HoltWintersFit(
+            alpha=self.alpha[rows], beta=self.beta[rows], gamma=self.gamma[rows],
+            multiplicative=self.multiplicative[rows], level=self.level[rows], trend=self.trend[rows],
+            season=self.season[rows], sigma=self.sigma[rows], n_obs=self.n_obs[rows],
+            next_phase=self.next_phase[rows], season_length=self.season_length,
+        )
+
+    def params(self, row: int) -> Dict:
+        """Selected model for one series"""
+        return {
+            'seasonal': 'multiplicative' if self.multiplicative[row] else 'additive',
+            'alpha': float(self.alpha[row]),
+            'beta': float(self.beta[row]),
+            'gamma': float(self.gamma[row]),
+            'sigma': round(float(self.sigma[row]), 4),
+        }
+
+
+def fit_holt_winters(
+    Y: np.ndarray,
+    season_length: int = SEASON_LENGTH,
+    seasonal: str = 'auto',
+    alphas: Sequence[float] = DEFAULT_ALPHAS,
+    betas: Sequence[float] = DEFAULT_BETAS,
+    gammas: Sequence[float] = DEFAULT_GAMMAS,
+    chunk_size: int = 1024
+) -> HoltWintersFit:
+    """
+    Fit Holt-Winters to every row of a series matrix at once
+
+    Each series gets the grid point with the lowest one-step-ahead squared
+    error. Series are aligned on a shared daily calendar; NaN marks days
+    before a series starts or with no data.
+
+    Args:
+        Y: Series matrix (S series, T days)
+        season_length: Season length m
+        seasonal: 'additive', 'multiplicative' or 'auto' (best of both; multiplicative
+            is only considered for strictly positive series)
+        alphas, betas, gammas: Level, trend and seasonal smoothing grids
+        chunk_size: Series per block; keeps the (grid x series) state cache-resident
+
+    Returns:
+        HoltWintersFit for all S series
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    num_series, num_days = Y.shape
+    m = season_length
+
+    grid = np.array(np.meshgrid(alphas, betas, gammas, indexing='ij')).reshape(3, -1)
+    observed = ~np.isnan(Y)
+    first = np.where(observed.any(axis=1), observed.argmax(axis=1), num_days)
+
+    candidates = []
+    if seasonal in ('additive', 'auto'):
+        candidates.append(False)
+    if seasonal in ('multiplicative', 'auto'):
+        candidates.append(True)
+
+    # Ratios are meaningless for series that ever sell zero
+    positive = np.where(observed, Y > 0, True).all(axis=1)
+
+    blocks = []
+    for start in range(0, num_series, chunk_size):
+        rows = slice(start, start + chunk_size)
+        best = None
+        for multiplicative in candidates:
+            result = _smooth(Y[rows], observed[rows], first[rows], grid, m, multiplicative)
+            if multiplicative:
+                result['sse'][~positive[rows]] = np.inf
+            if best is None:
+                best = result
+            else:
+                better = result['sse'] < best['sse']
+                for key in best:
+                    best[key] = np.where(better.reshape((-1,) + (1,) * (best[key].ndim - 1)), result[key], best[key])
+        blocks.append(best)
+    best = {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]} if blocks else None
+
+    n_obs = observed.sum(axis=1)
+    n_scored = np.maximum(best['n_scored'], 1)
+    sse = np.where(np.isfinite(best['sse']), best['sse'], 0.0)
+
+    return HoltWintersFit(
+        alpha=best['alpha'],
+        beta=best['beta'],
+        gamma=best['gamma'],
+        multiplicative=best['multiplicative'].astype(bool),
+        level=best['level'],
+        trend=best['trend'],
+        season=best['season'],
+        sigma=np.sqrt(sse / n_scored),
+        n_obs=n_obs,
+        next_phase=num_days % m,
+        season_length=m,
+    )
+
+
+def holt_winters_step(
+    level: np.ndarray,
+    trend: np.ndarray,
+    season: np.ndarray,
+    y: np.ndarray,
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    gamma: np.ndarray,
+    multiplicative
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One Holt-Winters recursion step
+
+    Args:
+        level, trend: Current level and trend
+        season: Seasonal state for the current phase
+        y: Today's observation
+        alpha, beta, gamma: Smoothing parameters (broadcastable)
+        multiplicative: bool for all series, or a boolean array per series
+
+    Returns:
+        (new_level, new_trend, new_season, one-step error)
+    """
+    base = level + trend
+    if multiplicative is False or (multiplicative is not True and not np.any(multiplicative)):
+        err = y - (base + season)
+        new_level = alpha * (y - season) + (1 - alpha) * base
+        new_season = gamma * (y - new_level) + (1 - gamma) * season
+    elif multiplicative is True:
+        err = y - base * season
+        new_level = np.maximum(alpha * (y / np.maximum(season, _EPS)) + (1 - alpha) * base, _EPS)
+        new_season = gamma * (y / new_level) + (1 - gamma) * season
+    else:
+        additive = holt_winters_step(level, trend, season, y, alpha, beta, gamma, False)
+        ratio = holt_winters_step(level, trend, season, y, alpha, beta, gamma, True)
+        return tuple(np.where(multiplicative, r, a) for a, r in zip(additive, ratio))
+
+    new_trend = beta * (new_level - level) + (1 - beta) * trend
+    return new_level, new_trend, new_season, err
+
+
+def _initial_state(Y: np.ndarray, first: np.ndarray, m: int, multiplicative: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Heuristic level/trend/season from each series' first two seasons"""
+    num_series, num_days = Y.shape
+    rows = np.arange(num_series)[:, None]
+    cols = first[:, None] + np.arange(2 * m)[None, :]
+    window = np.where(cols < num_days, Y[rows, np.minimum(cols, num_days - 1)], np.nan)
+
+    with np.errstate(all='ignore'):
+        first_mean = np.nanmean(window[:, :m], axis=1)
+        second_mean = np.nanmean(window[:, m:], axis=1)
+    first_mean = np.nan_to_num(first_mean)
+    trend = np.nan_to_num((second_mean - first_mean) / m)
+    level = first_mean
+
+    # Seasonal state is indexed by calendar phase so all series share the same clock
+    phases = (first[:, None] + np.arange(m)[None, :]) % m
+    if multiplicative:
+        offsets = np.nan_to_num(window[:, :m] / np.maximum(level[:, None], _EPS), nan=1.0)
+    else:
+        offsets = np.nan_to_num(window[:, :m] - level[:, None], nan=0.0)
+    season = np.empty((num_series, m))
+    season[rows, phases] = offsets
+
+    return level, trend, season
+
+
+def _smooth(
+    Y: np.ndarray,
+    observed: np.ndarray,
+    first: np.ndarray,
+    grid: np.ndarray,
+    m: int,
+    multiplicative: bool
+) -> Dict[str, np.ndarray]:
+    """Run the smoothing recursion for every (grid point, series) pair and keep each series' best"""
+    num_series, num_days = Y.shape
+    num_grid = grid.shape[1]
+
+    level0, trend0, season0 = _initial_state(Y, first, m, multiplicative)
+    alpha, beta, gamma = (grid[i][:, None] for i in range(3))  # (G, 1)
+
+    level = np.repeat(level0[None, :], num_grid, axis=0)  # (G, S)
+    trend = np.repeat(trend0[None, :], num_grid, axis=0)
+    season = np.repeat(season0.T[:, None, :], num_grid, axis=1)  # (m, G, S): contiguous per phase
+    sse = np.zeros((num_grid, num_series))
+    n_scored = np.zeros(num_series, dtype=np.int64)
+
+    all_active = observed.all(axis=0)
+    all_scored = all_active & (np.arange(num_days) >= first.max(initial=0) + m)
+    Y_filled = np.where(observed, Y, 0.0)
+
+    for t in range(num_days):
+        y_filled = Y_filled[:, t]
+        active = observed[:, t]
+        started = t >= first
+        scored = active & (t >= first + m)  # First season only warms up the state
+
+        s = season[t % m]
+        new_level, new_trend, new_season, err = holt_winters_step(
+            level, trend, s, y_filled, alpha, beta, gamma, multiplicative
+        )
+
+        n_scored += scored
+        if all_active[t]:
+            # Common case: every series observed today, no masking needed
+            sse += err * err if all_scored[t] else np.where(scored, err * err, 0.0)
+            level, trend = new_level, new_trend
+            season[t % m] = new_season
+            continue
+
+        sse += np.where(scored, err * err, 0.0)
+
+        # Missing days carry the trend forward; days before a series starts leave it untouched
+        level = np.where(active, new_level, np.where(started, level + trend, level))
+        trend = np.where(active, new_trend, trend)
+        season[t % m] = np.where(active, new_season, s)
+
+    best = np.argmin(sse, axis=0)  # (S,)
+    cols = np.arange(num_series)
+
+    return {
+        'alpha': grid[0][best],
+        'beta': grid[1][best],
+        'gamma': grid[2][best],
+        'multiplicative': np.full(num_series, multiplicative),
+        'level': level[best, cols],
+        'trend': trend[best, cols],
+        'season': season[:, best, cols].T,
+        'sse': sse[best, cols],
+        'n_scored': n_scored,
+    }
@@ -0,0 +1,571 @@
+"""
+Per-User Exclusion Filters
+Compact Bloom filters of purchased or dismissed products, applied as vectorized masks
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Interaction events that permanently hide a product from a user's recommendations
+EXCLUSION_EVENTS = ('purchase', 'dismiss')
+
+# Each new filter layer doubles in size and halves its false-positive budget,
+# so a user's total false-positive rate stays below twice the target
+LAYER_GROWTH = 2
+LAYER_TIGHTENING = 0.5
+
+# Evictions free memory down to this fraction of the cap, so spills to disk come in batches
+EVICTION_LOW_WATER = 0.9
+
+# Hash values are kept to 62 bits so they fit int64 and reduce modulo any layer size
+_HASH_MASK = np.uint64((1 << 62) - 1)
+
+
+class _UserFilter:
+    """Layer slots and item counts of one user's scalable Bloom filter"""
+
+    __slots__ = ('slots', 'items', 'layer_items', 'dirty')
+
+    def __init__(self):
+        self.slots: List[int] = []  # Row in the tier matrix of each layer, smallest first
+        self.items = 0
+        self.layer_items = 0  # Items added to the newest layer
+        self.dirty = True  # Holds items the snapshot on disk does not have yet
+
+
+class ExclusionStore:
+    """
+    Scalable Bloom filter per user, stored as rows of one packed bit matrix per layer size
+
+    A user starts with one bits_per_user layer. When it holds as many items as
+    the target false-positive rate allows, a layer twice as large is added
+    (up to max_layers), so light users stay small and heavy buyers keep an
+    accurate filter. Total filter memory is capped; the least recently updated
+    users are evicted first, to the snapshot on disk, and reloaded the next time
+    they are looked up. Without a snapshot path evicted filters are lost, and a
+    warning says so.
+    """
+
+    def __init__(
+        self,
+        bits_per_user: int = 1024,
+        num_hashes: int = 4,
+        target_false_positive_rate: float = 0.01,
+        max_layers: int = 6,
+        max_memory_mb: Optional[float] = 256.0,
+        initial_capacity: int = 1024,
+        snapshot_path: Optional[str] = None
+    ):
+        """
+        Initialize exclusion store
+
+        Args:
+            bits_per_user: Size of each user's first filter layer (multiple of 8)
+            num_hashes: Hash functions per item
+            target_false_positive_rate: False-positive rate the first layer is filled to
+            max_layers: Layers per user; the last one keeps filling once reached
+            max_memory_mb: Filter memory of all users before the least recently updated are evicted
+                to the snapshot (None for no cap)
+            initial_capacity: Rows allocated up front in the first-layer matrix; matrices double as needed
+            snapshot_path: Optional .npz file used by save_snapshot/load_snapshot and for evictions
+        """
+        if bits_per_user % 8:
+            raise ValueError("bits_per_user must be a multiple of 8")
+
+        self.bits_per_user = bits_per_user
+        self.num_hashes = num_hashes
+        self.target_false_positive_rate = target_false_positive_rate
+        self.max_layers = max_layers
+        self.max_bytes = int(max_memory_mb * 1e6) if max_memory_mb is not None else None
+        self.snapshot_path = snapshot_path
+
+        self.layer_bits = [bits_per_user * LAYER_GROWTH ** j for j in range(max_layers)]
+        self.layer_capacity = [
+            _bloom_capacity(bits, num_hashes, target_false_positive_rate * LAYER_TIGHTENING ** j)
+            for j, bits in enumerate(self.layer_bits)
+        ]
+
+        self._tiers = [np.zeros((initial_capacity if j == 0 else 0, bits // 8), dtype=np.uint8)
+                       for j, bits in enumerate(self.layer_bits)]
+        self._tier_used = [0] * max_layers  # Rows handed out so far
+        self._tier_free: List[List[int]] = [[] for _ in range(max_layers)]  # Rows released by evictions
+        self._users: 'OrderedDict[str, _UserFilter]' = OrderedDict()  # Least recently updated first
+        self._spilled = set()  # Users evicted to the snapshot, reloaded on their next lookup
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.dropped = 0  # Users evicted with nowhere to spill them
+
+    def __len__(self) -> int:
+        return len(self._users) + len(self._spilled)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users or user_id in self._spilled
+
+    def item_positions(self, product_ids: List[str]) -> np.ndarray:
+        """
+        Bloom hash values for each product, computed once per catalog
+
+        Values are derived from product IDs, so filters stay valid when the
+        catalog is reordered or reloaded; each layer reduces them modulo its size.
+
+        Returns:
+            Array of shape (n_products, num_hashes)
+        """
+        digests = np.array(
+            [int.from_bytes(hashlib.blake2b(str(pid).encode(), digest_size=8).digest(), 'little') for pid in product_ids],
+            dtype=np.uint64
+        ).reshape(-1, 1)
+
+        # Double hashing: h1 + i * h2
+        h1 = digests & np.uint64(0xFFFFFFFF)
+        h2 = (digests >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64).reshape(1, -1)
+        return ((h1 + steps * h2) & _HASH_MASK).astype(np.int64)
+
+    def add(self, user_id: str, positions: np.ndarray):
+        """
+        Add products to a user's exclusion filter
+
+        Args:
+            user_id: User identifier
+            positions: Hash values from item_positions, shape (n_products, num_hashes)
+        """
+        positions = np.asarray(positions).reshape(-1, self.num_hashes)
+
+        with self._lock:
+            self._reload([user_id])
+            user = self._users.get(user_id)
+            if user is None:
+                user = _UserFilter()
+                self._users[user_id] = user
+            else:
+                self._users.move_to_end(user_id)
+            user.dirty = True
+
+            start = 0
+            while start < len(positions):
+                layer = len(user.slots) - 1
+                if layer < 0 or (
+                    user.layer_items >= self.layer_capacity[layer] and layer + 1 < self.max_layers
+                ):
+                    user.slots.append(self._allocate(layer + 1))
+                    user.layer_items = 0
+                    layer += 1
+
+                # Fill the newest layer up to its capacity (the last layer takes everything left)
+                room = len(positions) - start
+                if layer + 1 < self.max_layers:
+                    room = min(room, self.layer_capacity[layer] - user.layer_items)
+                batch = positions[start:start + room]
+                flat = (batch % self.layer_bits[layer]).ravel()
+                np.bitwise_or.at(self._tiers[layer][user.slots[layer]], flat >> 3, (1 << (flat & 7)).astype(np.uint8))
+
+                user.layer_items += len(batch)
+                user.items += len(batch)
+                start += len(batch)
+
+            self._evict(keep=[user_id])
+
+    def excluded(self, user_id: Optional[str], positions: np.ndarray) -> np.ndarray:
+        """
+        Vectorized membership test for many products at once
+
+        Args:
+            user_id: User identifier
+            positions: Hash values of the products to test, shape (n, num_hashes)
+
+        Returns:
+            Boolean array, True where the product is (probably) excluded
+        """
+        mask = np.zeros(len(positions), dtype=bool)
+        if not user_id:
+            return mask
+
+        # Under the writers' lock: add() may grow a tier matrix or recycle an evicted row
+        with self._lock:
+            self._reload([user_id])
+            user = self._users.get(user_id)
+            if user is None:
+                return mask
+            for layer, slot in enumerate(user.slots):
+                reduced = positions % self.layer_bits[layer]
+                bits = (self._tiers[layer][slot][reduced >> 3] >> (reduced & 7)) & 1
+                mask |= bits.all(axis=1)
+        return mask
+
+    def excluded_matrix(self, user_ids: List[str], positions: np.ndarray) -> np.ndarray:
+        """
+        Exclusion mask for a block of users against the same products
+
+        Returns:
+            Boolean array of shape (n_users, n_products)
+        """
+        mask = np.zeros((len(user_ids), len(positions)), dtype=bool)
+
+        with self._lock:
+            self._reload(user_ids)
+            users = [(i, self._users.get(uid)) for i, uid in enumerate(user_ids)]
+            users = [(i, user.slots) for i, user in users if user is not None]
+
+            # One gather per layer size over every user that has a layer of that size
+            for layer in range(self.max_layers):
+                known = [(i, slots[layer]) for i, slots in users if len(slots) > layer]
+                if not known:
+                    break
+                rows, slots = (np.array(x) for x in zip(*known))
+                reduced = positions % self.layer_bits[layer]
+                filters = self._tiers[layer][slots]  # (n_known, layer_bytes)
+                bits = (filters[:, reduced >> 3] >> (reduced & 7)) & 1  # (n_known, n_products, num_hashes)
+                mask[rows] |= bits.all(axis=2)
+        return mask
+
+    def memory_report(self) -> Dict:
+        """Memory usage and estimated false-positive rate, projected per million users"""
+        with self._lock:
+            users = list(self._users.values())
+            filter_bytes = self._bytes
+            spilled = len(self._spilled)
+            sample_key = next(iter(self._users), 'user-000000')
+
+        num_users = len(users)
+        per_user = filter_bytes / num_users if num_users else self.bits_per_user // 8
+
+        # Dict entry, a typical user-ID string and the layer record
+        index_bytes = sys.getsizeof(sample_key) + sys.getsizeof(_UserFilter()) + sys.getsizeof([0]) + 3 * 8
+
+        items = np.array([u.items for u in users], dtype=np.float64)
+        fp_rates = np.array([self._false_positive_rate(u) for u in users])
+
+        return {
+            'users': num_users,
+            'bits_per_user': self.bits_per_user,
+            'num_hashes': self.num_hashes,
+            'max_layers': self.max_layers,
+            'layer_capacity': self.layer_capacity,
+            'filter_bytes_per_user': round(per_user, 1),
+            'index_bytes_per_user': index_bytes,
+            'filter_mb': round(filter_bytes / 1e6, 2),
+            'max_memory_mb': round(self.max_bytes / 1e6, 2) if self.max_bytes is not None else None,
+            'allocated_mb': round(sum(t.nbytes for t in self._tiers) / 1e6, 2),
+            # Bytes per user is numerically the same as MB per million users
+            'mb_per_million_users': round(float(per_user + index_bytes), 1),
+            'avg_items_per_user': round(float(items.mean()), 1) if num_users else 0.0,
+            'max_items_per_user': int(items.max()) if num_users else 0,
+            'estimated_false_positive_rate': round(float(fp_rates.mean()), 6) if num_users else 0.0,
+            'max_false_positive_rate': round(float(fp_rates.max()), 6) if num_users else 0.0,
+            'evictions': self.evictions,
+            'spilled_users': spilled,
+            'dropped_users': self.dropped,
+        }
+
+    def save_snapshot(self, path: Optional[str] = None):
+        """
+        Write all filters to a .npz snapshot, merged with the one on disk
+
+        Bloom filters of the same layout merge by OR, so processes sharing a
+        snapshot path (e.g. gunicorn workers) keep each other's exclusions, and
+        users evicted to the snapshot stay in it.
+        """
+        path = path or self.snapshot_path
+        if not path:
+            raise ValueError("No snapshot path configured")
+
+        with self._lock:
+            saved = self._write_snapshot(self, path)
+            if path == self.snapshot_path:
+                for user in self._users.values():
+                    user.dirty = False
+
+        logger.info(f"Saved exclusion filters of {saved} users to {path}")
+
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        """
+        Merge filters from a snapshot written by save_snapshot
+
+        Returns:
+            Number of users in the snapshot
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        layout = (int(arrays['bits_per_user']), int(arrays['num_hashes']))
+        if layout != (self.bits_per_user, self.num_hashes):
+            raise ValueError(f"Snapshot filter layout {layout} != {(self.bits_per_user, self.num_hashes)}")
+
+        snapshot = ExclusionStore(
+            self.bits_per_user, self.num_hashes, self.target_false_positive_rate,
+            max(self.max_layers, int(arrays['num_layers'].max(initial=0))), None, initial_capacity=0
+        )
+        offsets = [0] * snapshot.max_layers
+        for user_id, items, layer_items, num_layers in zip(
+            arrays['user_ids'], arrays['items'], arrays['layer_items'], arrays['num_layers']
+        ):
+            user = _UserFilter()
+            for layer in range(int(num_layers)):
+                slot = snapshot._allocate(layer)
+                snapshot._tiers[layer][slot] = arrays[f"layer_{layer}"][offsets[layer]]
+                offsets[layer] += 1
+                user.slots.append(slot)
+            user.items, user.layer_items = int(items), int(layer_items)
+            user.dirty = False
+            snapshot._users[str(user_id)] = user
+
+        with self._lock:
+            self._merge(snapshot)
+            self._evict()
+
+        logger.info(f"Loaded exclusion filters of {len(snapshot)} users from {path}")
+        return len(snapshot)
+
+    def _merge(self, other: 'ExclusionStore'):
+        """OR another store's filters into this one (caller holds self._lock)"""
+        for user_id, theirs in other._users.items():
+            mine = self._users.get(user_id)
+            if mine is None:
+                mine = _UserFilter()
+                mine.dirty = theirs.dirty
+                self._users[user_id] = mine
+            else:
+                self._users.move_to_end(user_id)
+                mine.dirty = mine.dirty or theirs.dirty
+
+            for layer, slot in enumerate(theirs.slots[:self.max_layers]):
+                if layer == len(mine.slots):
+                    mine.slots.append(self._allocate(layer))
+                self._tiers[layer][mine.slots[layer]] |= other._tiers[layer][slot]
+            # Shared items would be double counted; overcounting only adds layers sooner
+            mine.items += theirs.items
+            if len(theirs.slots) >= len(mine.slots):
+                mine.layer_items = max(mine.layer_items, theirs.layer_items)
+
+    def _to_arrays(self) -> Dict[str, np.ndarray]:
+        """Snapshot arrays; layer_j holds the layer-j rows of every user that has one, in user order"""
+        users = list(self._users.items())
+        arrays = {
+            'bits_per_user': np.array(self.bits_per_user),
+            'num_hashes': np.array(self.num_hashes),
+            'user_ids': np.array([user_id for user_id, _ in users], dtype=str),
+            'items': np.array([u.items for _, u in users], dtype=np.int64),
+            'layer_items': np.array([u.layer_items for _, u in users], dtype=np.int64),
+            'num_layers': np.array([len(u.slots) for _, u in users], dtype=np.int64),
+        }
+        for layer in range(self.max_layers):
+            slots = np.array([u.slots[layer] for _, u in users if len(u.slots) > layer], dtype=np.int64)
+            arrays[f"layer_{layer}"] = self._tiers[layer][slots]
+        return arrays
+
+    def _allocate(self, layer: int) -> int:
+        """Zeroed row in the layer's matrix (caller holds self._lock)"""
+        if self._tier_free[layer]:
+            slot = self._tier_free[layer].pop()
+            self._tiers[layer][slot] = 0
+        else:
+            slot = self._tier_used[layer]
+            if slot >= len(self._tiers[layer]):
+                tier = self._tiers[layer]
+                self._tiers[layer] = np.vstack([tier, np.zeros((max(len(tier), 64), tier.shape[1]), dtype=np.uint8)])
+            self._tier_used[layer] += 1
+        self._bytes += self.layer_bits[layer] // 8
+        return slot
+
+    def _evict(self, keep: Iterable[str] = ()):
+        """
+        Evict least recently updated users until filters fit in max_bytes (caller holds self._lock)
+
+        Users whose filters changed since the last snapshot are merged into it first;
+        the rest are already on disk. If that write fails they stay in memory, over
+        the cap, rather than losing exclusions.
+        """
+        if self.max_bytes is None or self._bytes <= self.max_bytes:
+            return
+
+        keep = set(keep)
+        target = self.max_bytes * EVICTION_LOW_WATER
+        remaining = self._bytes
+        victims = []
+        for user_id, user in self._users.items():
+            if remaining <= target:
+                break
+            if user_id in keep:
+                continue
+            victims.append(user_id)
+            remaining -= sum(self.layer_bits[layer] // 8 for layer in range(len(user.slots)))
+        if not victims:
+            return
+
+        if self.snapshot_path:
+            changed = [user_id for user_id in victims if self._users[user_id].dirty]
+            if changed:
+                try:
+                    self._write_snapshot(self._subset(changed), self.snapshot_path)
+                except OSError as e:
+                    logger.error(f"Could not evict exclusion filters to {self.snapshot_path}, keeping them in memory: {e}")
+                    return
+            self._spilled.update(victims)
+        else:
+            self.dropped += len(victims)
+            logger.warning(
+                f"Exclusion filter memory cap reached without a snapshot path: dropped {len(victims)} users' "
+                f"filters, their purchased/dismissed products may be recommended again"
+            )
+
+        for user_id in victims:
+            user = self._users.pop(user_id)
+            for layer, slot in enumerate(user.slots):
+                self._tier_free[layer].append(slot)
+                self._bytes -= self.layer_bits[layer] // 8
+        self.evictions += len(victims)
+
+    def _reload(self, user_ids: Iterable[str]):
+        """Bring evicted users back from the snapshot, keeping all of user_ids in memory (caller holds self._lock)"""
+        user_ids = list(dict.fromkeys(user_ids))
+        wanted = [user_id for user_id in user_ids if user_id in self._spilled]
+        if not wanted:
+            return
+
+        try:
+            arrays = _read_npz(self.snapshot_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.error(f"Could not reload {len(wanted)} users' exclusion filters from {self.snapshot_path}: {e}")
+            return
+        self._spilled.difference_update(wanted)
+
+        snapshot_ids = arrays['user_ids']
+        num_layers = np.asarray(arrays['num_layers'])
+        rows = np.flatnonzero(np.isin(snapshot_ids, wanted))
+        if len(rows) < len(wanted):
+            logger.warning(f"{len(wanted) - len(rows)} evicted users missing from {self.snapshot_path}")
+
+        # layer_j holds one row per user with more than j layers, in user order
+        loaded = ExclusionStore(
+            self.bits_per_user, self.num_hashes, self.target_false_positive_rate,
+            self.max_layers, None, initial_capacity=0
+        )
+        offsets = [np.cumsum(num_layers > layer) - 1 for layer in range(min(self.max_layers, int(num_layers.max(initial=0))))]
+        for row in rows:
+            user = _UserFilter()
+            for layer in range(min(int(num_layers[row]), self.max_layers)):
+                user.slots.append(loaded._allocate(layer))
+                loaded._tiers[layer][user.slots[-1]] = arrays[f"layer_{layer}"][offsets[layer][row]]
+            user.items, user.layer_items = int(arrays['items'][row]), int(arrays['layer_items'][row])
+            user.dirty = False
+            loaded._users[str(snapshot_ids[row])] = user
+
+        self._merge(loaded)
+        self._evict(keep=user_ids)
+
+    def _subset(self, user_ids: List[str]) -> 'ExclusionStore':
+        """Detached copy of some users' filters (caller holds self._lock)"""
+        subset = ExclusionStore(
+            self.bits_per_user, self.num_hashes, self.target_false_positive_rate,
+            self.max_layers, None, initial_capacity=0
+        )
+        for user_id in user_ids:
+            user = self._users[user_id]
+            copy = _UserFilter()
+            for layer, slot in enumerate(user.slots):
+                copy.slots.append(subset._allocate(layer))
+                subset._tiers[layer][copy.slots[-1]] = self._tiers[layer][slot]
+            copy.items, copy.layer_items = user.items, user.layer_items
+            subset._users[user_id] = copy
+        return subset
+
+    def _write_snapshot(self, source: 'ExclusionStore', path: str) -> int:
+        """
+        Merge source's filters into the snapshot at path (caller holds source's lock)
+
+        Returns:
+            Users in the written snapshot
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{path}.lock", 'w') as lock_file:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # The snapshot is the overflow for every process's evictions, so it is not capped
+            merged = ExclusionStore(
+                self.bits_per_user, self.num_hashes, self.target_false_positive_rate,
+                self.max_layers, None, initial_capacity=0
+            )
+            if os.path.exists(path):
+                merged.load_snapshot(path)
+            merged._merge(source)
+            arrays = merged._to_arrays()
+
+            # Write to a temporary file and swap it in so readers never see a partial snapshot.
+            # Stored uncompressed (Bloom filter bits barely compress) so reloads can memory-map it
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+
+        return len(merged)
+
+    def _false_positive_rate(self, user: _UserFilter) -> float:
+        """Chance that a product the user never added tests positive in any layer"""
+        miss = 1.0
+        for layer in range(len(user.slots)):
+            items = user.layer_items if layer == len(user.slots) - 1 else self.layer_capacity[layer]
+            fill = 1 - np.exp(-self.num_hashes * items / self.layer_bits[layer])
+            miss *= 1 - fill ** self.num_hashes
+        return 1 - miss
+
+
+def _bloom_capacity(bits: int, num_hashes: int, false_positive_rate: float) -> int:
+    """Items a Bloom filter holds before its false-positive rate exceeds the target"""
+    return max(1, int(-bits / num_hashes * np.log(1 - false_positive_rate ** (1.0 / num_hashes))))
+
+
+def _read_npz(path: str) -> Dict[str, np.ndarray]:
+    """Arrays of an .npz file, memory-mapping uncompressed members instead of reading them"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # Skip the member's local header to the .npy data
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            count = int(np.prod(shape))
+            if count * dtype.itemsize < 1 << 16:
+                array = np.fromfile(f, dtype=dtype, count=count).reshape(shape, order='F' if fortran_order else 'C')
+            else:
+                array = np.memmap(f, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                  order='F' if fortran_order else 'C')
+            arrays[name] = array
+    return arrays
@@ -0,0 +1,191 @@
+"""
+Forecast Model Router
+Cheap per-series profiling that sends each series to the least expensive adequate model
+"""
+
+import threading
+from typing import Dict, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+SIMPLE = 'simple_average'
+CROSTON = 'croston_sba'
+HOLT_WINTERS = 'holt_winters'
+PROPHET = 'prophet'
+
+# Seconds per Prophet fit assumed until real fits have been timed
+DEFAULT_PROPHET_SECONDS = 1.5
+
+
+def profile_series(Y: np.ndarray, season_length: int = 7) -> Dict[str, np.ndarray]:
+    """
+    Vectorized demand profile for every row of a series matrix
+
+    Args:
+        Y: Series matrix (S series, T days), NaN before a series starts
+        season_length: Season length used for seasonality strength
+
+    Returns:
+        Per-series arrays: length, zero_ratio, adi (average demand interval),
+        cv2 (squared CV of non-zero demand) and seasonality (0-1 strength)
+    """
+    observed = ~np.isnan(Y)
+    values = np.where(observed, Y, 0.0)
+    length = observed.sum(axis=1)
+    nonzero = (values > 0).sum(axis=1)
+
+    with np.errstate(all='ignore'):
+        zero_ratio = np.where(length > 0, 1 - nonzero / length, 1.0)
+        adi = np.where(nonzero > 0, length / nonzero, np.inf)
+
+        demand = np.where(values > 0, values, np.nan)
+        cv2 = np.nan_to_num(np.nanvar(demand, axis=1) / np.nanmean(demand, axis=1) ** 2)
+
+        # Share of variance around the series mean explained by the day-of-week profile
+        centered = Y - np.nanmean(Y, axis=1, keepdims=True)
+        phases = np.arange(Y.shape[1]) % season_length
+        profile = np.stack([np.nanmean(centered[:, phases == p], axis=1) for p in range(season_length)], axis=1)
+        seasonality = np.nan_to_num(np.nanvar(profile, axis=1) / np.nanvar(centered, axis=1))
+
+    return {
+        'length': length,
+        'zero_ratio': zero_ratio,
+        'adi': adi,
+        'cv2': cv2,
+        'seasonality': np.clip(seasonality, 0.0, 1.0),
+    }
+
+
+def croston_sba(Y: np.ndarray, alpha: float = 0.1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Croston's method with the Syntetos-Boylan bias correction, for all series at once
+
+    Args:
+        Y: Series matrix (S series, T days), NaN before a series starts
+        alpha: Smoothing for demand size and inter-demand interval
+
+    Returns:
+        (daily demand rate, one-step residual standard deviation), each of shape (S,)
+    """
+    num_series, num_days = Y.shape
+    size = np.full(num_series, np.nan)
+    interval = np.full(num_series, np.nan)
+    since = np.zeros(num_series)
+    sse = np.zeros(num_series)
+    n_scored = np.zeros(num_series)
+
+    for t in range(num_days):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        since += observed
+
+        # Score the forecast in force before today's update
+        rate = (1 - alpha / 2) * size / interval
+        scored = observed & ~np.isnan(rate)
+        err = np.where(scored, y - np.nan_to_num(rate), 0.0)
+        sse += err * err
+        n_scored += scored
+
+        demand = observed & (y > 0)
+        first = demand & np.isnan(size)
+        update = demand & ~first
+        size = np.where(first, y, np.where(update, size + alpha * (y - size), size))
+        interval = np.where(first, since, np.where(update, interval + alpha * (since - interval), interval))
+        since[demand] = 0
+
+    rate = np.nan_to_num((1 - alpha / 2) * size / interval)
+    sigma = np.sqrt(sse / np.maximum(n_scored, 1))
+    return rate, sigma
+
+
+class ForecastRouter:
+    """Assigns each series a model and accounts for the time spent per model"""
+
+    def __init__(
+        self,
+        prophet_available: bool,
+        min_length: int = 14,
+        intermittent_adi: float = 1.32,
+        prophet_min_length: int = 365,
+        prophet_min_seasonality: float = 0.6
+    ):
+        """
+        Initialize router
+
+        Args:
+            prophet_available: Whether Prophet can be used at all
+            min_length: Shorter series get a simple average
+            intermittent_adi: Average demand interval above which demand is intermittent
+                (Syntetos-Boylan cut-off)
+            prophet_min_length: Days of history before Prophet's yearly terms pay off
+            prophet_min_seasonality: Seasonality strength required for Prophet
+        """
+        self.prophet_available = prophet_available
+        self.min_length = min_length
+        self.intermittent_adi = intermittent_adi
+        self.prophet_min_length = prophet_min_length
+        self.prophet_min_seasonality = prophet_min_seasonality
+
+        self._lock = threading.Lock()
+        self._counts = {SIMPLE: 0, CROSTON: 0, HOLT_WINTERS: 0, PROPHET: 0}
+        self._seconds = {SIMPLE: 0.0, CROSTON: 0.0, HOLT_WINTERS: 0.0, PROPHET: 0.0}
+
+    def route(self, Y: np.ndarray) -> np.ndarray:
+        """
+        Pick a model for every row of a series matrix
+
+        Args:
+            Y: Series matrix (S series, T days)
+
+        Returns:
+            Array of model names, one per series
+        """
+        profile = profile_series(Y)
+        routes = np.full(len(Y), HOLT_WINTERS, dtype=object)
+
+        if self.prophet_available:
+            pays_off = (
+                (profile['length'] >= self.prophet_min_length)
+                & (profile['seasonality'] >= self.prophet_min_seasonality)
+            )
+            routes[pays_off] = PROPHET
+
+        routes[profile['adi'] > self.intermittent_adi] = CROSTON
+        routes[profile['length'] < self.min_length] = SIMPLE
+        return routes
+
+    def record(self, model: str, num_series: int, seconds: float):
+        """Add the wall time spent forecasting num_series series with a model"""
+        with self._lock:
+            self._counts[model] = self._counts.get(model, 0) + num_series
+            self._seconds[model] = self._seconds.get(model, 0.0) + seconds
+
+    def report(self) -> Dict:
+        """Series per model, time spent, and time saved against fitting Prophet everywhere"""
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+
+        if counts[PROPHET]:
+            prophet_seconds = seconds[PROPHET] / counts[PROPHET]
+            estimate_source = 'observed'
+        else:
+            prophet_seconds = DEFAULT_PROPHET_SECONDS
+            estimate_source = 'default'
+
+        total_series = sum(counts.values())
+        actual = sum(seconds.values())
+        all_prophet = total_series * prophet_seconds
+
+        return {
+            'series_by_model': counts,
+            'seconds_by_model': {model: round(s, 3) for model, s in seconds.items()},
+            'total_series': total_series,
+            'actual_seconds': round(actual, 3),
+            'prophet_seconds_per_series': round(prophet_seconds, 3),
+            'prophet_estimate_source': estimate_source,
+            'estimated_all_prophet_seconds': round(all_prophet, 3),
+            'time_saved_seconds': round(max(all_prophet - actual, 0.0), 3),
+        }
@@ -0,0 +1,367 @@
+"""
+Incremental Forecast State
+Holt-Winters state per product that absorbs new daily sales without refitting
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+from models.ets import HoltWintersFit, fit_holt_winters
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastStateBank:
+    """Fitted Holt-Winters states for many products, updated in O(1) per product per day"""
+
+    def __init__(
+        self,
+        refit_interval_days: int = 28,
+        drift_threshold: float = 2.0,
+        drift_halflife_days: float = 7.0,
+        history_days: int = 364,
+        initial_capacity: int = 1024
+    ):
+        """
+        Initialize state bank
+
+        Args:
+            refit_interval_days: Scheduled full refit after this many days
+            drift_threshold: Refit when recent RMS one-step error exceeds this multiple of the fitted sigma
+            drift_halflife_days: Half-life of the recent squared-error average
+            history_days: Recent days kept per product for refits
+            initial_capacity: Products allocated up front; arrays double as needed
+        """
+        self.refit_interval_days = refit_interval_days
+        self.drift_threshold = drift_threshold
+        self.drift_decay = 0.5 ** (1.0 / drift_halflife_days)
+        self.history_days = history_days
+
+        self.rows: Dict[str, int] = {}
+        self.product_ids: List[str] = []
+        self.fit: Optional[HoltWintersFit] = None
+        self._capacity = initial_capacity
+        self._last_date = np.zeros(0, dtype='datetime64[D]')
+        self._fitted_date = np.zeros(0, dtype='datetime64[D]')
+        self._recent_sq_err = np.zeros(0)
+        self._since_fit = np.zeros(0, dtype=np.int64)
+        self._history = np.zeros((0, history_days))  # Ring buffer per product
+        self._history_pos = np.zeros(0, dtype=np.int64)  # Next slot to write, i.e. the oldest day
+        self._lock = threading.RLock()
+
+        self.updates = 0
+        self.scheduled_refits = 0
+        self.drift_refits = 0
+        self.skipped = 0
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def load(self, product_ids: List[str], fit: HoltWintersFit, Y: np.ndarray, last_date):
+        """
+        Install freshly fitted states, replacing any existing ones
+
+        Args:
+            product_ids: Products in fit row order
+            fit: Holt-Winters fit for those products
+            Y: Training matrix the fit was made on (for the refit history)
+            last_date: Date of the last column of Y, shared or per product
+        """
+        if isinstance(last_date, np.ndarray):
+            last_day = last_date.astype('datetime64[D]')
+        else:
+            last_day = np.datetime64(pd.Timestamp(last_date).date(), 'D')
+        history = np.asarray(Y, dtype=np.float64)[:, -self.history_days:]
+
+        with self._lock:
+            rows = np.array([self._row(pid) for pid in product_ids], dtype=np.int64)
+            for name in ('alpha', 'beta', 'gamma', 'multiplicative', 'level', 'trend', 'season', 'sigma', 'n_obs', 'next_phase'):
+                getattr(self.fit, name)[rows] = getattr(fit, name)
+
+            self._last_date[rows] = last_day
+            self._fitted_date[rows] = last_day
+            self._recent_sq_err[rows] = fit.sigma ** 2
+            self._since_fit[rows] = 0
+
+            # Start each ring right-aligned, so slot 0 holds the oldest day
+            self._history[rows] = np.nan
+            self._history[rows, self.history_days - history.shape[1]:] = history
+            self._history_pos[rows] = 0
+
+    def observe(self, observations: pd.DataFrame, as_of: Optional[pd.Timestamp] = None) -> Dict:
+        """
+        Absorb new daily sales into the tracked states
+
+        Days a product has no row for count as zero sales. Observations on or
+        before a product's last absorbed day are skipped.
+
+        Args:
+            observations: DataFrame with columns ['product_id', 'date', 'quantity']
+            as_of: Advance every tracked product to this date, even without sales
+
+        Returns:
+            Update statistics
+        """
+        df = observations.copy()
+        df['product_id'] = df['product_id'].astype(str)
+        df['date'] = pd.to_datetime(df['date']).dt.normalize()
+        df = df[df['product_id'].isin(self.rows.keys())]
+        daily = df.groupby(['date', 'product_id'])['quantity'].sum()
+
+        observed_dates = set(daily.index.get_level_values(0))
+        dates = sorted(observed_dates)
+        if as_of is not None:
+            dates = sorted(observed_dates | {pd.Timestamp(as_of).normalize()})
+
+        updated = 0
+        with self._lock:
+            for date in dates:
+                day = np.datetime64(date.date(), 'D')
+                values = daily.loc[date] if date in observed_dates else pd.Series(dtype=float)
+                observed_rows = np.array([self.rows[pid] for pid in values.index], dtype=np.int64)
+
+                if as_of is not None:
+                    rows = np.arange(len(self.product_ids))
+                    quantity = np.zeros(len(rows))
+                    quantity[observed_rows] = values.to_numpy(dtype=np.float64)
+                else:
+                    rows, quantity = observed_rows, values.to_numpy(dtype=np.float64)
+                if len(rows) == 0:
+                    continue
+
+                stale = self._last_date[rows] >= day
+                self.skipped += int(stale.sum())
+                rows, quantity = rows[~stale], quantity[~stale]
+
+                # Fill gap days with zero sales, one vectorized step per missing day
+                gaps = (day - self._last_date[rows]).astype(np.int64) - 1
+                for step in range(int(gaps.max(initial=0))):
+                    behind = rows[gaps > step]
+                    self._absorb(behind, np.zeros(len(behind)))
+
+                self._absorb(rows, quantity)
+                self._last_date[rows] = day
+                updated += len(rows)
+
+        return {
+            'updated': updated,
+            'tracked_products': len(self.rows),
+            'due_for_refit': len(self.due_for_refit()),
+        }
+
+    def sync(self, product_id: str, series: np.ndarray, last_date) -> bool:
+        """
+        Bring one product's state up to date with a full daily series
+
+        Days after the state's last absorbed day are absorbed; days it already
+        absorbed must match the tracked history, so restated or unrelated data
+        is never answered from a stale state.
+
+        Args:
+            product_id: Tracked product
+            series: Daily quantities, oldest first, ending on last_date
+            last_date: Date of the last value
+
+        Returns:
+            False if the series disagrees with the tracked history or the
+            product is due for a refit; the caller should refit from the series
+        """
+        values = np.asarray(series, dtype=np.float64)
+        last_day = np.datetime64(pd.Timestamp(last_date).date(), 'D')
+
+        with self._lock:
+            row = self.rows[product_id]
+            ahead = int((last_day - self._last_date[row]).astype(np.int64))
+            tracked = np.roll(self._history[row], -self._history_pos[row])
+
+            # Align the series with the tracked history on the days both cover
+            data = values[:len(values) - ahead] if ahead > 0 else values
+            tracked_end = self.history_days + min(ahead, 0)
+            overlap = min(len(data), tracked_end)
+            if overlap <= 0:
+                return False
+            data = data[len(data) - overlap:]
+            tracked = tracked[tracked_end - overlap:tracked_end]
+            known = ~np.isnan(data) & ~np.isnan(tracked)
+            if not known.any() or not np.allclose(data[known], tracked[known]):
+                return False
+
+            if ahead > 0:
+                for quantity in np.nan_to_num(values[-ahead:]):
+                    self._absorb(np.array([row]), np.array([quantity]))
+                self._last_date[row] = last_day
+
+            return row not in self._due_rows(np.array([row]))
+
+    def due_for_refit(self) -> List[str]:
+        """Products whose refit is scheduled or whose recent errors show drift"""
+        with self._lock:
+            scheduled, drifted = self._due_masks()
+            return [self.product_ids[row] for row in np.flatnonzero(scheduled | drifted)]
+
+    def refit_due(self) -> Dict:
+        """
+        Refit every due product in one vectorized fit on its recent history
+
+        Returns:
+            Refit statistics
+        """
+        with self._lock:
+            scheduled, drifted = self._due_masks()
+            rows = np.flatnonzero(scheduled | drifted)
+            if len(rows) == 0:
+                return {'refitted': 0, 'scheduled': 0, 'drift': 0}
+
+            # Unroll the rings oldest-first, right-aligned on each product's own last absorbed day
+            order = (self._history_pos[rows][:, None] + np.arange(self.history_days)[None, :]) % self.history_days
+            history = np.take_along_axis(self._history[rows], order, axis=1)
+            product_ids = [self.product_ids[row] for row in rows]
+            self.load(product_ids, fit_holt_winters(history), history, self._last_date[rows].copy())
+
+            num_drift = int((drifted[rows] & ~scheduled[rows]).sum())
+            self.scheduled_refits += len(rows) - num_drift
+            self.drift_refits += num_drift
+
+        logger.info(f"Refitted {len(rows)} forecast states ({num_drift} on drift)")
+        return {'refitted': len(rows), 'scheduled': len(rows) - num_drift, 'drift': num_drift}
+
+    def forecast(self, product_id: str, horizon: int, interval: float = 0.8) -> Tuple[np.ndarray, np.ndarray, np.ndarray, pd.Timestamp]:
+        """
+        Forecast one product from its current state
+
+        Returns:
+            (mean, lower, upper, last absorbed date)
+        """
+        with self._lock:
+            row = self.rows[product_id]
+            mean, lower, upper = self.fit.take(np.array([row])).forecast(horizon, interval)
+            return mean[0], lower[0], upper[0], pd.Timestamp(self._last_date[row])
+
+    def demand_stats(self, product_ids: List[str], horizon: int = 28) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Forecast mean daily demand and residual sigma for many products
+
+        Returns:
+            (mean_daily_demand, demand_std), NaN for untracked products
+        """
+        mean = np.full(len(product_ids), np.nan)
+        sigma = np.full(len(product_ids), np.nan)
+        with self._lock:
+            positions = [(i, self.rows[pid]) for i, pid in enumerate(product_ids) if pid in self.rows]
+            if positions:
+                index, rows = (np.array(x) for x in zip(*positions))
+                mean[index] = self.fit.take(rows).forecast(horizon)[0].mean(axis=1)
+                sigma[index] = self.fit.sigma[rows]
+        return mean, sigma
+
+    def history(self, product_id: str) -> np.ndarray:
+        """Recent daily history of one product, oldest first"""
+        with self._lock:
+            row = self.rows[product_id]
+            return np.roll(self._history[row], -self._history_pos[row])
+
+    def params(self, product_id: str) -> Dict:
+        """Selected model for one product"""
+        return self.fit.params(self.rows[product_id])
+
+    def stats(self) -> Dict:
+        """Update and refit counters, including the refit rate per series-day"""
+        with self._lock:
+            scheduled, drifted = self._due_masks()
+        refits = self.scheduled_refits + self.drift_refits
+        return {
+            'tracked_products': len(self.rows),
+            'updates': self.updates,
+            'skipped_observations': self.skipped,
+            'refits': refits,
+            'scheduled_refits': self.scheduled_refits,
+            'drift_refits': self.drift_refits,
+            'refit_rate': round(refits / self.updates, 6) if self.updates else 0.0,
+            'due_for_refit': int((scheduled | drifted).sum()),
+        }
+
+    def _absorb(self, rows: np.ndarray, quantity: np.ndarray):
+        """O(1) state, error and history update for one day"""
+        if len(rows) == 0:
+            return
+        err = self.fit.update(quantity, rows)
+
+        decay = self.drift_decay
+        self._recent_sq_err[rows] = decay * self._recent_sq_err[rows] + (1 - decay) * err * err
+        self._since_fit[rows] += 1
+        self.fit.n_obs[rows] += 1
+
+        pos = self._history_pos[rows]
+        self._history[rows, pos] = quantity
+        self._history_pos[rows] = (pos + 1) % self.history_days
+        self.updates += len(rows)
+
+    def _due_masks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(scheduled, drifted) boolean masks over tracked products"""
+        return self._due(np.arange(len(self.product_ids)))
+
+    def _due_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Rows among these that are due for a refit"""
+        scheduled, drifted = self._due(rows)
+        return rows[scheduled | drifted]
+
+    def _due(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        age = (self._last_date[rows] - self._fitted_date[rows]).astype(np.int64)
+        scheduled = age >= self.refit_interval_days
+
+        # Wait a week after a fit so a single outlier cannot trigger a refit
+        sigma = np.maximum(self.fit.sigma[rows], 1e-6) if len(rows) else np.zeros(0)
+        drifted = (
+            (self._since_fit[rows] >= 7)
+            & (self._recent_sq_err[rows] > (self.drift_threshold * sigma) ** 2)
+        )
+        return scheduled, drifted
+
+    def _row(self, product_id: str) -> int:
+        row = self.rows.get(product_id)
+        if row is not None:
+            return row
+
+        row = len(self.product_ids)
+        if self.fit is None or row >= len(self.fit.level):
+            self._grow(max(self._capacity, 2 * row))
+        self.rows[product_id] = row
+        self.product_ids.append(product_id)
+        return row
+
+    def _grow(self, capacity: int):
+        """Reallocate state arrays with room for capacity products"""
+        def extend(array: Optional[np.ndarray], fill, shape=(), dtype=np.float64) -> np.ndarray:
+            grown = np.full((capacity,) + shape, fill, dtype=dtype)
+            if array is not None and len(array):
+                grown[:len(array)] = array
+            return grown
+
+        old = self.fit
+        m = old.season_length if old is not None else 7
+        self.fit = HoltWintersFit(
+            alpha=extend(old.alpha if old else None, 0.0),
+            beta=extend(old.beta if old else None, 0.0),
+            gamma=extend(old.gamma if old else None, 0.0),
+            multiplicative=extend(old.multiplicative if old else None, False, dtype=bool),
+            level=extend(old.level if old else None, 0.0),
+            trend=extend(old.trend if old else None, 0.0),
+            season=extend(old.season if old else None, 0.0, (m,)),
+            sigma=extend(old.sigma if old else None, 0.0),
+            n_obs=extend(old.n_obs if old else None, 0, dtype=np.int64),
+            next_phase=extend(old.next_phase if old else None, 0, dtype=np.int64),
+            season_length=m,
+        )
+        self._last_date = extend(self._last_date, np.datetime64('NaT'), dtype='datetime64[D]')
+        self._fitted_date = extend(self._fitted_date, np.datetime64('NaT'), dtype='datetime64[D]')
+        self._recent_sq_err = extend(self._recent_sq_err, 0.0)
+        self._since_fit = extend(self._since_fit, 0, dtype=np.int64)
+        self._history = extend(self._history, np.nan, (self.history_days,))
+        self._history_pos = extend(self._history_pos, 0, dtype=np.int64)
+        self._capacity = capacity
@@ -1,13 +1,21 @@
 """
 Demand Forecasting
-Time-series forecasting for product demand using Prophet
+Time-series forecasting for product demand using Prophet or Holt-Winters
 """
 
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
+from models.ets import HoltWintersFit, SEASON_LENGTH, Z_SCORES, fit_holt_winters
+from models.forecast_state import ForecastStateBank
+from models.inventory import plan_inventory
+from models.forecast_router import CROSTON, HOLT_WINTERS, PROPHET, SIMPLE, ForecastRouter, croston_sba
+from models.model_cache import ModelCache, fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +30,31 @@ except ImportError:
 class DemandForecaster:
     """Product demand forecasting using time-series models"""
 
-    def __init__(self):
-        """Initialize forecaster"""
-        self.models = {}  # Store trained models per product
+    def __init__(
+        self,
+        cache_size: int = 256,
+        cache_dir: Optional[str] = None,
+        stateful: bool = False,
+        refit_interval_days: int = 28,
+        drift_threshold: float = 2.0
+    ):
+        """
+        Initialize forecaster
+
+        Args:
+            cache_size: Fitted models kept in memory
+            cache_dir: Directory to persist fitted models (None for memory only)
+            stateful: Keep Holt-Winters states and update them with observe() instead of refitting;
+                requests whose history disagrees with a state refit it
+            refit_interval_days: Stateful mode: scheduled refit interval
+            drift_threshold: Stateful mode: refit when recent RMS error exceeds this multiple of the fitted sigma
+        """
+        self.models = ModelCache(capacity=cache_size, cache_dir=cache_dir)  # Trained models per product
+        self.router = ForecastRouter(prophet_available=PROPHET_AVAILABLE)
+        self.states = ForecastStateBank(
+            refit_interval_days=refit_interval_days,
+            drift_threshold=drift_threshold
+        ) if stateful else None
 
     def forecast_product_demand(
         self,
@@ -43,14 +73,173 @@ class DemandForecaster:
         Returns:
             Forecast dictionary with predictions and confidence intervals
         """
+        start = time.perf_counter()
+
+        if len(historical_data):
+            product_ids, Y, calendar = series_matrix({product_id: historical_data})
+            Y, last_dates = align_ends(Y, calendar)
+
+        if self.states is not None and product_id in self.states and len(historical_data):
+            # Stateful mode: absorb any newer days; refit below if the data disagrees with the state
+            if self.states.sync(product_id, Y[0], last_dates[0]):
+                result = self._state_forecast(product_id, forecast_days)
+                self.router.record(HOLT_WINTERS, 1, time.perf_counter() - start)
+                return result
+
         if len(historical_data) < 14:
             logger.warning(f"Insufficient data for product {product_id}. Using simple average.")
-            return self._simple_forecast(historical_data, forecast_days)
-
-        if PROPHET_AVAILABLE:
-            return self._prophet_forecast(product_id, historical_data, forecast_days)
+            model = SIMPLE
         else:
-            return self._moving_average_forecast(historical_data, forecast_days)
+            model = self.router.route(Y)[0]
+
+        if model == SIMPLE:
+            result = self._simple_forecast(historical_data, forecast_days)
+        elif model == CROSTON:
+            result = self._format_croston(product_ids, Y, last_dates, forecast_days)[product_id]
+        elif model == PROPHET:
+            result = self._prophet_forecast(product_id, historical_data, forecast_days)
+        else:
+            result = self._ets_forecast(product_id, historical_data, forecast_days)
+
+        self.router.record(model, 1, time.perf_counter() - start)
+        return result
+
+    def forecast_many(
+        self,
+        series: Dict[str, pd.DataFrame],
+        forecast_days: int = 30
+    ) -> Dict[str, Dict]:
+        """
+        Forecast many products, grouping series by routed model
+
+        Intermittent series share one vectorized Croston fit and regular ones
+        one vectorized Holt-Winters fit; only series where it pays off go to
+        Prophet, fanned out over the process pool. Series may end on different
+        days; each is routed on its own history and forecast from its own last day.
+
+        Args:
+            series: Product ID -> DataFrame with columns ['date', 'quantity']
+            forecast_days: Number of days to forecast
+
+        Returns:
+            Product ID -> forecast dictionary
+        """
+        results = {}
+        if not series:
+            return results
+
+        product_ids, Y, calendar = series_matrix(series)
+        routes = self.router.route(Y)
+        Y, last_dates = align_ends(Y, calendar)
+
+        for model in (SIMPLE, CROSTON, HOLT_WINTERS):
+            rows = np.flatnonzero(routes == model)
+            if len(rows) == 0:
+                continue
+
+            start = time.perf_counter()
+            ids = [product_ids[row] for row in rows]
+            if model == SIMPLE:
+                for product_id in ids:
+                    results[product_id] = self._simple_forecast(series[product_id], forecast_days)
+            elif model == CROSTON:
+                results.update(self._format_croston(ids, Y[rows], last_dates[rows], forecast_days))
+            else:
+                fit = fit_holt_winters(Y[rows])
+                if self.states is not None:
+                    self.states.load(ids, fit, Y[rows], last_dates[rows])
+                results.update(self._format_holt_winters(ids, Y[rows], last_dates[rows], fit, forecast_days))
+            self.router.record(model, len(rows), time.perf_counter() - start)
+
+        prophet_series = {product_ids[row]: series[product_ids[row]] for row in np.flatnonzero(routes == PROPHET)}
+        for result in self.forecast_batch(prophet_series, forecast_days):
+            results[result['product_id']] = result
+
+        return results
+
+    def observe(
+        self,
+        observations: pd.DataFrame,
+        as_of: Optional[datetime] = None,
+        refit: bool = True
+    ) -> Dict:
+        """
+        Stateful mode: absorb new daily sales into tracked forecast states
+
+        Each product-day is an O(1) state update. Products whose refit is
+        scheduled or whose recent errors have drifted are then refitted
+        together in one vectorized fit.
+
+        Args:
+            observations: DataFrame with columns ['product_id', 'date', 'quantity']
+            as_of: Advance every tracked product to this date, even without sales
+            refit: Refit due products after absorbing the observations
+
+        Returns:
+            Update and refit statistics
+        """
+        if self.states is None:
+            raise ValueError("Forecaster is not in stateful mode")
+
+        result = self.states.observe(observations, as_of=as_of)
+        if refit:
+            result['refits'] = self.states.refit_due()
+        result['refit_rate'] = self.states.stats()['refit_rate']
+        return result
+
+    def forecast_batch(
+        self,
+        series: Dict[str, pd.DataFrame],
+        forecast_days: int = 30,
+        max_workers: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Forecast many products in parallel, yielding each result as it completes
+
+        Args:
+            series: Product ID -> DataFrame with columns ['date', 'quantity']
+            forecast_days: Number of days to forecast
+            max_workers: Worker processes (defaults to the CPU count)
+
+        Yields:
+            Forecast dictionaries with 'product_id', 'model' and 'fit_time_ms'
+        """
+        workers = min(max_workers or os.cpu_count() or 1, max(len(series), 1))
+
+        if workers <= 1:
+            for product_id, historical_data in series.items():
+                yield _forecast_series(product_id, historical_data, forecast_days, self)
+            return
+
+        items = iter(series.items())
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.models.capacity, self.models.cache_dir)
+        ) as pool:
+            # Keep a bounded window of series in flight instead of pickling them all up front
+            pending = {}
+            for product_id, historical_data in items:
+                pending[pool.submit(_forecast_series, product_id, historical_data, forecast_days)] = product_id
+                if len(pending) >= 2 * workers:
+                    break
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    product_id = pending.pop(future)
+                    try:
+                        result = future.result()
+                        # Workers route and time their own fits; account for them here
+                        self.router.record(result['model'], 1, result['fit_time_ms'] / 1000)
+                        yield result
+                    except Exception as e:
+                        logger.error(f"Batch forecast failed for product {product_id}: {e}")
+                        yield {'product_id': product_id, 'error': str(e)}
+
+                    next_item = next(items, None)
+                    if next_item is not None:
+                        pending[pool.submit(_forecast_series, next_item[0], next_item[1], forecast_days)] = next_item[0]
 
     def _prophet_forecast(
         self,
@@ -65,23 +254,25 @@ class DemandForecaster:
             df.columns = ['ds', 'y']  # Prophet requires these column names
             df['ds'] = pd.to_datetime(df['ds'])
 
-            # Initialize and fit model
-            model = Prophet(
-                daily_seasonality=True,
-                weekly_seasonality=True,
-                yearly_seasonality=True if len(df) > 365 else False,
-                changepoint_prior_scale=0.05,
-                seasonality_prior_scale=10.0,
-            )
+            config = prophet_config(len(df))
+            data_fingerprint = fingerprint(df, dict(config, model='prophet'))
 
-            model.fit(df)
+            # Reuse the fit when the data and config are unchanged
+            cached = self.models.get(product_id, data_fingerprint)
+            if cached is None:
+                model = Prophet(**config)
+                model.fit(df)
+                cached = {'model': model, 'forecast': None}
 
-            # Make future dataframe
-            future = model.make_future_dataframe(periods=forecast_days)
-            forecast = model.predict(future)
+            # Predictions for a longer horizon cover any shorter one
+            if cached['forecast'] is None or len(cached['forecast']) < forecast_days:
+                future = cached['model'].make_future_dataframe(periods=forecast_days)
+                forecast = cached['model'].predict(future)
+                cached['forecast'] = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(forecast_days)
+                self.models.put(product_id, data_fingerprint, cached)
 
             # Extract forecast for future dates only
-            forecast_future = forecast.tail(forecast_days)
+            forecast_future = cached['forecast'].head(forecast_days)
 
             # Format results
             predictions = []
@@ -115,6 +306,108 @@ class DemandForecaster:
             logger.error(f"Prophet forecast failed: {e}")
             return self._moving_average_forecast(historical_data, forecast_days)
 
+    def _ets_forecast(
+        self,
+        product_id: str,
+        historical_data: pd.DataFrame,
+        forecast_days: int
+    ) -> Dict:
+        """Use vectorized Holt-Winters for forecasting"""
+        try:
+            product_ids, Y, calendar = series_matrix({product_id: historical_data})
+            Y, last_dates = align_ends(Y, calendar)
+
+            data_fingerprint = fingerprint(Y, {'model': 'holt_winters', 'season_length': SEASON_LENGTH})
+            fit = self.models.get(product_id, data_fingerprint)
+            if fit is None:
+                fit = fit_holt_winters(Y)
+                self.models.put(product_id, data_fingerprint, fit)
+            if self.states is not None:
+                self.states.load(product_ids, fit, Y, last_dates)
+
+            return self._format_holt_winters(product_ids, Y, last_dates, fit, forecast_days)[product_id]
+
+        except Exception as e:
+            logger.error(f"Holt-Winters forecast failed: {e}")
+            return self._moving_average_forecast(historical_data, forecast_days)
+
+    def _state_forecast(self, product_id: str, forecast_days: int) -> Dict:
+        """Forecast from a tracked state without refitting"""
+        mean, lower, upper, last_date = self.states.forecast(product_id, forecast_days)
+        params = dict(self.states.params(product_id), stateful=True)
+        return self._format_forecasts(
+            HOLT_WINTERS, [product_id], self.states.history(product_id)[None, :],
+            np.array([last_date], dtype='datetime64[D]'), mean[None, :], lower[None, :], upper[None, :], [params]
+        )[product_id]
+
+    def _format_holt_winters(
+        self,
+        product_ids: List[str],
+        Y: np.ndarray,
+        last_dates: np.ndarray,
+        fit: HoltWintersFit,
+        forecast_days: int
+    ) -> Dict[str, Dict]:
+        """Turn a block of Holt-Winters forecasts into per-product result dictionaries"""
+        mean, lower, upper = fit.forecast(forecast_days, interval=0.8)
+        params = [fit.params(row) for row in range(len(product_ids))]
+        return self._format_forecasts(HOLT_WINTERS, product_ids, Y, last_dates, mean, lower, upper, params)
+
+    def _format_croston(
+        self,
+        product_ids: List[str],
+        Y: np.ndarray,
+        last_dates: np.ndarray,
+        forecast_days: int
+    ) -> Dict[str, Dict]:
+        """Vectorized Croston/SBA forecasts for intermittent series"""
+        rate, sigma = croston_sba(Y)
+        mean = np.repeat(rate[:, None], forecast_days, axis=1)
+        half_width = Z_SCORES[0.8] * sigma[:, None]
+        lower, upper = np.maximum(mean - half_width, 0), mean + half_width
+        params = [{'demand_rate': round(float(r), 4), 'sigma': round(float(s), 4)} for r, s in zip(rate, sigma)]
+        return self._format_forecasts(CROSTON, product_ids, Y, last_dates, mean, lower, upper, params)
+
+    def _format_forecasts(
+        self,
+        model: str,
+        product_ids: List[str],
+        Y: np.ndarray,
+        last_dates: np.ndarray,
+        mean: np.ndarray,
+        lower: np.ndarray,
+        upper: np.ndarray,
+        params: List[Dict]
+    ) -> Dict[str, Dict]:
+        """Per-product result dictionaries from (products x days) forecast arrays, dated from each product's last day"""
+        forecast_days = mean.shape[1]
+        mean, lower, upper = mean.round(2).tolist(), lower.round(2).tolist(), upper.round(2).tolist()
+        calendars = {}
+        for last_date in np.unique(last_dates):
+            start = pd.Timestamp(last_date) + timedelta(days=1)
+            calendars[last_date] = [d.isoformat() for d in pd.date_range(start, periods=forecast_days)]
+        historical_avg = np.nanmean(Y, axis=1)
+
+        results = {}
+        for row, product_id in enumerate(product_ids):
+            forecast_avg = sum(mean[row]) / forecast_days if forecast_days else 0.0
+            results[product_id] = {
+                'product_id': product_id,
+                'model': model,
+                'params': params[row],
+                'forecasts': [
+                    {'date': date, 'predicted': p, 'lower': lo, 'upper': hi, 'confidence': 0.80}
+                    for date, p, lo, hi in zip(calendars[last_dates[row]], mean[row], lower[row], upper[row])
+                ],
+                'summary': {
+                    'historical_avg': round(float(historical_avg[row]), 2),
+                    'forecast_avg': round(forecast_avg, 2),
+                    'trend': 'increasing' if forecast_avg > historical_avg[row] else 'decreasing',
+                    'total_forecast': round(sum(mean[row]), 2),
+                },
+            }
+        return results
+
     def _moving_average_forecast(
         self,
         historical_data: pd.DataFrame,
@@ -208,7 +501,9 @@ class DemandForecaster:
         self,
         avg_daily_demand: float,
         lead_time_days: int = 7,
-        service_level: float = 0.95
+        service_level: float = 0.95,
+        demand_std: Optional[float] = None,
+        lead_time_std_days: float = 0.0
     ) -> Dict:
         """
         Calculate reorder point for inventory management
@@ -217,38 +512,178 @@ class DemandForecaster:
             avg_daily_demand: Average daily demand
             lead_time_days: Supplier lead time in days
             service_level: Desired service level (0-1)
+            demand_std: Standard deviation of daily demand (Poisson sqrt(demand) if unknown)
+            lead_time_std_days: Standard deviation of the lead time
 
         Returns:
             Reorder point recommendations
         """
-        # Safety stock calculation (simplified)
-        # In production, use standard deviation of demand
-        safety_stock = avg_daily_demand * lead_time_days * (1 / (1 - service_level))
+        if demand_std is None:
+            demand_std = np.sqrt(max(avg_daily_demand, 0))
 
-        reorder_point = (avg_daily_demand * lead_time_days) + safety_stock
+        plan = plan_inventory(
+            avg_daily_demand,
+            demand_std,
+            lead_time_days=lead_time_days,
+            lead_time_std_days=lead_time_std_days,
+            service_level=service_level,
+        )
 
         return {
-            'reorder_point': round(reorder_point, 0),
-            'safety_stock': round(safety_stock, 0),
+            'reorder_point': float(plan['reorder_point']),
+            'safety_stock': float(plan['safety_stock']),
+            'order_quantity': float(plan['order_quantity']),
             'avg_daily_demand': round(avg_daily_demand, 2),
+            'demand_std': round(float(demand_std), 2),
             'lead_time_days': lead_time_days,
             'service_level': service_level,
         }
 
 
-def generate_mock_historical_data(days: int = 90) -> pd.DataFrame:
-    """Generate mock historical data for testing"""
-    dates = pd.date_range(end=datetime.now(), periods=days, freq='D')
+def prophet_config(num_days: int) -> Dict:
+    """Prophet settings for a history of num_days"""
+    return {
+        'daily_seasonality': True,
+        'weekly_seasonality': True,
+        'yearly_seasonality': True if num_days > 365 else False,
+        'changepoint_prior_scale': 0.05,
+        'seasonality_prior_scale': 10.0,
+    }
+
+
+# Forecaster used by batch worker processes, created once per process
+_worker_forecaster = None
+
+
+def _init_worker(cache_size: int, cache_dir: Optional[str]):
+    """Process pool initializer: one forecaster per worker sharing the on-disk model cache"""
+    global _worker_forecaster
+    _worker_forecaster = DemandForecaster(cache_size=cache_size, cache_dir=cache_dir)
+
+
+def _forecast_series(
+    product_id: str,
+    historical_data: pd.DataFrame,
+    forecast_days: int,
+    forecaster: Optional[DemandForecaster] = None
+) -> Dict:
+    """Forecast one series and record how long the fit took"""
+    global _worker_forecaster
+    if forecaster is None:
+        if _worker_forecaster is None:
+            _worker_forecaster = DemandForecaster()
+        forecaster = _worker_forecaster
+
+    start = time.perf_counter()
+    result = forecaster.forecast_product_demand(product_id, historical_data, forecast_days)
+    result['product_id'] = product_id
+    result['fit_time_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def series_matrix(series: Dict[str, pd.DataFrame]) -> Tuple[List[str], np.ndarray, pd.DatetimeIndex]:
+    """
+    Align per-product daily histories on one calendar
+
+    Days without a record between a product's first and last record count as
+    zero demand; days before its first or after its last record are NaN, so a
+    series that ends early is not padded with demand it never had.
+
+    Args:
+        series: Product ID -> DataFrame with columns ['date', 'quantity']
+
+    Returns:
+        (product_ids, matrix of shape (n_products, n_days), calendar)
+    """
+    product_ids = list(series)
+    lengths = np.array([len(df) for df in series.values()], dtype=np.int64)
+    rows = np.repeat(np.arange(len(product_ids)), lengths)
+
+    # Concatenate once and convert in bulk; per-series pandas work dominates at catalog scale
+    dates = pd.to_datetime(np.concatenate([df.iloc[:, 0].to_numpy() for df in series.values()])).normalize()
+    quantities = pd.to_numeric(
+        np.concatenate([df.iloc[:, 1].to_numpy() for df in series.values()]), errors='coerce'
+    ).astype(np.float64)
+
+    calendar = pd.date_range(dates.min(), dates.max(), freq='D')
+    num_products, num_days = len(product_ids), len(calendar)
+    cols = ((dates - calendar[0]) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+    valid = ~np.isnan(quantities)
+    cells = rows[valid] * num_days + cols[valid]
+    Y = np.bincount(cells, weights=quantities[valid], minlength=num_products * num_days)
+    Y = Y.reshape(num_products, num_days)
+
+    first = np.full(num_products, num_days, dtype=np.int64)
+    last = np.full(num_products, -1, dtype=np.int64)
+    np.minimum.at(first, rows[valid], cols[valid])
+    np.maximum.at(last, rows[valid], cols[valid])
+    days = np.arange(num_days)[None, :]
+    Y[(days < first[:, None]) | (days > last[:, None])] = np.nan
+    return product_ids, Y, calendar
+
+
+def align_ends(Y: np.ndarray, calendar: pd.DatetimeIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shift every row of a series matrix so its last observed day is the final column
+
+    Vectorized fits forecast from the final column, so right-aligning lets
+    series that end on different days share one fit while each forecast still
+    starts the day after its own last observation.
+
+    Args:
+        Y: Series matrix from series_matrix (NaN outside each series)
+        calendar: Calendar of Y's columns
+
+    Returns:
+        (right-aligned matrix, last observed date per row as datetime64[D])
+    """
+    num_series, num_days = Y.shape
+    observed = ~np.isnan(Y)
+    last = np.where(observed.any(axis=1), num_days - 1 - observed[:, ::-1].argmax(axis=1), num_days - 1)
+
+    cols = np.arange(num_days)[None, :] - (num_days - 1 - last)[:, None]
+    aligned = np.where(cols >= 0, Y[np.arange(num_series)[:, None], np.maximum(cols, 0)], np.nan)
+    return aligned, calendar.to_numpy().astype('datetime64[D]')[last]
+
+
+def generate_mock_historical_data(
+    days: int = 90,
+    base_demand: float = 50,
+    trend: float = 20,
+    seasonality: float = 10,
+    noise: float = 5,
+    intermittency: float = 0.0,
+    seed: Optional[int] = None,
+    end: Optional[datetime] = None
+) -> pd.DataFrame:
+    """
+    Generate mock historical data for testing
+
+    Args:
+        days: Number of days
+        base_demand: Demand on the first day
+        trend: Total demand increase over the period
+        seasonality: Amplitude of the weekly pattern
+        noise: Standard deviation of daily noise
+        intermittency: Probability that a day has no sales at all
+        seed: Random seed (None uses the global NumPy state)
+        end: Last date (defaults to now)
+    """
+    rng = np.random.default_rng(seed) if seed is not None else np.random
+    dates = pd.date_range(end=end or datetime.now(), periods=days, freq='D')
 
     # Generate demand with trend and seasonality
-    base_demand = 50
-    trend = np.linspace(0, 20, days)
-    seasonality = 10 * np.sin(np.arange(days) * 2 * np.pi / 7)  # Weekly pattern
-    noise = np.random.normal(0, 5, days)
+    trend_component = np.linspace(0, trend, days)
+    seasonal_component = seasonality * np.sin(np.arange(days) * 2 * np.pi / 7)  # Weekly pattern
+    noise_component = rng.normal(0, noise, days)
 
-    quantities = base_demand + trend + seasonality + noise
+    quantities = base_demand + trend_component + seasonal_component + noise_component
     quantities = np.maximum(quantities, 0)  # Ensure non-negative
 
+    if intermittency > 0:
+        quantities[rng.random(days) < intermittency] = 0
+
     return pd.DataFrame({
         'date': dates,
         'quantity': quantities.round(0)
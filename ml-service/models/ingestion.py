@@ -0,0 +1,428 @@
+"""
+Sales Ingestion
+Incremental load of order lines from SQL into cached per-SKU and per-metric daily series
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not installed. Sales cache will be written as .npz")
+
+try:
+    import psycopg2
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+    logger.warning("psycopg2 not installed. Sales ingestion supports sqlite:/// URLs only")
+
+# Orders in these states never turn into demand or revenue
+EXCLUDED_STATUSES = ('CANCELLED', 'REFUNDED', 'FAILED')
+
+# Rows from an overlap window behind the newest created_at seen; rows whose transaction
+# commits after a refresh can carry an earlier created_at, and are deduplicated by id
+_ORDER_LINES_SQL = """
+SELECT oi.created_at, CAST(oi.id AS TEXT), oi.product_id, oi.quantity
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+WHERE UPPER(o.status) NOT IN ({excluded})
+  AND oi.created_at >= {p}
+ORDER BY oi.created_at, CAST(oi.id AS TEXT)
+"""
+
+_ORDERS_SQL = """
+SELECT o.created_at, CAST(o.id AS TEXT), o.total
+FROM orders o
+WHERE UPPER(o.status) NOT IN ({excluded})
+  AND o.created_at >= {p}
+ORDER BY o.created_at, CAST(o.id AS TEXT)
+"""
+
+# Before any real created_at
+_START_TIME = '1970-01-01 00:00:00'
+
+
+def _start_watermark() -> Dict:
+    """Newest created_at read, and the IDs already ingested inside the overlap window behind it"""
+    return {'created_at': None, 'seen': {}}
+
+
+class SalesIngestor:
+    """Order lines -> daily per-SKU quantities and daily revenue/orders, cached on disk"""
+
+    def __init__(self, database_url: str, cache_dir: str, batch_size: int = 50_000, overlap_seconds: float = 600.0):
+        """
+        Initialize ingestor and load any cached series
+
+        Args:
+            database_url: sqlite:///path or postgresql://... (requires psycopg2)
+            cache_dir: Directory for the columnar series cache
+            batch_size: Rows per fetchmany() round trip
+            overlap_seconds: Each refresh re-reads rows this far behind the newest created_at
+                it has seen, so rows committed late (e.g. long checkout transactions) are not
+                skipped; should exceed the longest time between a row's created_at and its commit
+        """
+        self.database_url = database_url
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.overlap = pd.Timedelta(seconds=overlap_seconds)
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._version = 0
+        self._watermarks = {'order_lines': _start_watermark(), 'orders': _start_watermark()}
+        self._sku_daily = pd.DataFrame({
+            'product_id': pd.Series(dtype=str),
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'quantity': pd.Series(dtype=np.float64),
+        })
+        self._metrics_daily = pd.DataFrame({
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'revenue': pd.Series(dtype=np.float64),
+            'orders': pd.Series(dtype=np.float64),
+        })
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._last_refresh: Optional[Dict] = None
+
+        self._load_cache()
+
+    @property
+    def available(self) -> bool:
+        """Whether any sales have been ingested"""
+        return len(self._metrics_daily) > 0 or len(self._sku_daily) > 0
+
+    def refresh(self, full: bool = False) -> Dict:
+        """
+        Pull rows past the watermarks and fold them into the cached series
+
+        Only rows from overlap_seconds behind the newest created_at seen
+        onwards are read, so a refresh costs time proportional to the sales
+        since the last one. Rows in the overlap that were already ingested are
+        skipped by ID. Rows committed more than overlap_seconds after their
+        created_at, and status changes on already-ingested orders (e.g. a later
+        cancellation), are picked up by a full rebuild.
+
+        Args:
+            full: Drop the cache and re-read everything
+
+        Returns:
+            Rows read, series sizes, watermarks and elapsed time
+        """
+        with self._refresh_lock:
+            start = time.perf_counter()
+            with self._lock:
+                watermarks = {k: {'created_at': v['created_at'], 'seen': dict(v['seen'])} for k, v in self._watermarks.items()}
+                sku_daily, metrics_daily = self._sku_daily, self._metrics_daily
+            if full:
+                watermarks = {k: _start_watermark() for k in watermarks}
+                sku_daily, metrics_daily = sku_daily.iloc[0:0], metrics_daily.iloc[0:0]
+
+            with self._connect() as conn:
+                line_batches, watermarks['order_lines'], line_rows = self._read(
+                    conn, _ORDER_LINES_SQL, watermarks['order_lines'], self._aggregate_lines
+                )
+                order_batches, watermarks['orders'], order_rows = self._read(
+                    conn, _ORDERS_SQL, watermarks['orders'], self._aggregate_orders
+                )
+
+            if line_rows:
+                sku_daily = (
+                    pd.concat([sku_daily, *line_batches], ignore_index=True)
+                    .groupby(['product_id', 'date'], as_index=False)['quantity'].sum()
+                    .sort_values(['product_id', 'date'], ignore_index=True)
+                )
+            if order_rows:
+                metrics_daily = (
+                    pd.concat([metrics_daily, *order_batches], ignore_index=True)
+                    .groupby('date', as_index=False)[['revenue', 'orders']].sum()
+                    .sort_values('date', ignore_index=True)
+                )
+
+            if line_rows or order_rows or full:
+                self._save_cache(sku_daily, metrics_daily, watermarks)
+            with self._lock:
+                self._sku_daily, self._metrics_daily = sku_daily, metrics_daily
+                self._watermarks = watermarks
+                self._offsets = self._index(sku_daily)
+
+            self._last_refresh = {
+                'order_lines_read': line_rows,
+                'orders_read': order_rows,
+                'full': full,
+                'seconds': round(time.perf_counter() - start, 3),
+                'at': datetime.now().isoformat(),
+            }
+            logger.info(f"Ingested {line_rows} order lines and {order_rows} orders in {self._last_refresh['seconds']}s")
+            return {**self._last_refresh, **self.stats()}
+
+    def sku_history(self, product_id: str, days: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Daily demand for one SKU, zero-filled up to the latest ingested day
+
+        Args:
+            product_id: Product ID
+            days: Keep only the last N days
+
+        Returns:
+            DataFrame with columns ['date', 'quantity'], or None if the SKU never sold
+        """
+        with self._lock:
+            span = self._offsets.get(str(product_id))
+            if span is None:
+                return None
+            rows = self._sku_daily.iloc[span[0]:span[1]]
+            end = self._last_day()
+
+        calendar = pd.date_range(rows['date'].iloc[0], end, freq='D')
+        if days is not None:
+            calendar = calendar[-days:]
+        quantity = rows.set_index('date')['quantity'].reindex(calendar, fill_value=0.0)
+        return pd.DataFrame({'date': calendar, 'quantity': quantity.to_numpy()})
+
+    def sku_histories(self, product_ids: Optional[Iterable[str]] = None, days: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Daily demand for many SKUs (all ingested SKUs by default); SKUs with no sales are skipped
+
+        Returns:
+            SKU ID -> DataFrame with columns ['date', 'quantity']
+        """
+        if product_ids is None:
+            with self._lock:
+                product_ids = list(self._offsets)
+        histories = {}
+        for product_id in product_ids:
+            history = self.sku_history(product_id, days)
+            if history is not None:
+                histories[str(product_id)] = history
+        return histories
+
+    def metrics(self, days: Optional[int] = None) -> pd.DataFrame:
+        """
+        Daily business metrics, zero-filled over days without orders
+
+        Args:
+            days: Keep only the last N days
+
+        Returns:
+            DataFrame with columns ['date', 'revenue', 'orders']
+        """
+        with self._lock:
+            metrics_daily = self._metrics_daily
+        if metrics_daily.empty:
+            return metrics_daily.copy()
+
+        calendar = pd.date_range(metrics_daily['date'].iloc[0], metrics_daily['date'].iloc[-1], freq='D')
+        if days is not None:
+            calendar = calendar[-days:]
+        filled = metrics_daily.set_index('date').reindex(calendar, fill_value=0.0)
+        return pd.DataFrame({
+            'date': calendar,
+            'revenue': filled['revenue'].to_numpy(),
+            'orders': filled['orders'].to_numpy(),
+        })
+
+    def stats(self) -> Dict:
+        """Cache size, date coverage and watermarks"""
+        with self._lock:
+            dates = self._metrics_daily['date']
+            return {
+                'skus': len(self._offsets),
+                'sku_days': len(self._sku_daily),
+                'metric_days': len(self._metrics_daily),
+                'first_date': dates.iloc[0].date().isoformat() if len(dates) else None,
+                'last_date': dates.iloc[-1].date().isoformat() if len(dates) else None,
+                'watermarks': {k: v['created_at'] for k, v in self._watermarks.items()},
+                'cache_version': self._version,
+                'cache_format': 'parquet' if PYARROW_AVAILABLE else 'npz',
+                'last_refresh': self._last_refresh,
+            }
+
+    def _read(self, conn, sql: str, watermark: Dict, aggregate) -> Tuple[List[pd.DataFrame], Dict, int]:
+        """
+        Stream rows from the overlap window onwards in fetchmany batches, aggregating each
+        batch as it arrives; rows already ingested are skipped by ID
+
+        Returns:
+            (aggregated batches, new watermark, rows ingested)
+        """
+        postgres = not isinstance(conn, sqlite3.Connection)
+        query = sql.format(
+            p='%s' if postgres else '?',
+            excluded=', '.join(f"'{status}'" for status in EXCLUDED_STATUSES)
+        )
+        if postgres:
+            # Named cursor keeps the result set on the server; only batch_size rows are in memory
+            cursor = conn.cursor(name=f"ml_ingest_{os.getpid()}_{threading.get_ident()}")
+            cursor.itersize = self.batch_size
+        else:
+            cursor = conn.cursor()
+
+        newest, seen = watermark['created_at'], watermark['seen']
+        bound = pd.Timestamp(newest) - self.overlap if newest else None
+        batches, num_rows = [], 0
+        try:
+            cursor.execute(query, (_format_like(bound, newest) if bound is not None else _START_TIME,))
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                newest = str(rows[-1][0])
+
+                ids = pd.Series([str(row[1]) for row in rows])
+                times = pd.to_datetime(pd.Series([row[0] for row in rows]), format='mixed')
+                fresh = ~ids.isin(seen.keys()).to_numpy()
+                if bound is not None:
+                    fresh &= (times >= bound).to_numpy()
+                if not fresh.any():
+                    continue
+
+                seen.update(zip(ids[fresh], times[fresh].map(pd.Timestamp.isoformat)))
+                num_rows += int(fresh.sum())
+                batches.append(aggregate([row for row, keep in zip(rows, fresh) if keep]))
+        finally:
+            cursor.close()
+
+        # Remember only the IDs the next refresh's overlap window can return again
+        if newest:
+            horizon = pd.Timestamp(newest) - self.overlap
+            seen = {row_id: at for row_id, at in seen.items() if pd.Timestamp(at) >= horizon}
+        return batches, {'created_at': newest, 'seen': seen}, num_rows
+
+    @staticmethod
+    def _aggregate_lines(rows: List[tuple]) -> pd.DataFrame:
+        created_at, _, product_id, quantity = zip(*rows)
+        batch = pd.DataFrame({
+            'product_id': np.asarray(product_id).astype(str),
+            'date': pd.to_datetime(pd.Series(created_at), format='mixed').dt.floor('D').to_numpy(),
+            'quantity': np.asarray(quantity, dtype=np.float64),
+        })
+        return batch.groupby(['product_id', 'date'], as_index=False)['quantity'].sum()
+
+    @staticmethod
+    def _aggregate_orders(rows: List[tuple]) -> pd.DataFrame:
+        created_at, _, total = zip(*rows)
+        batch = pd.DataFrame({
+            'date': pd.to_datetime(pd.Series(created_at), format='mixed').dt.floor('D').to_numpy(),
+            'revenue': np.asarray([float(t or 0) for t in total], dtype=np.float64),
+            'orders': np.ones(len(rows)),
+        })
+        return batch.groupby('date', as_index=False)[['revenue', 'orders']].sum()
+
+    @staticmethod
+    def _index(sku_daily: pd.DataFrame) -> Dict[str, Tuple[int, int]]:
+        """SKU -> row span in the sorted table, for O(1) history lookups"""
+        if sku_daily.empty:
+            return {}
+        product_ids = sku_daily['product_id'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]])
+        ends = np.r_[starts[1:], len(product_ids)]
+        return {product_ids[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+
+    def _last_day(self) -> pd.Timestamp:
+        """Latest ingested day across both tables, so slow SKUs get trailing zeros"""
+        candidates = [self._sku_daily['date'].iloc[-1:].max(), self._metrics_daily['date'].iloc[-1:].max()]
+        return max(d for d in candidates if pd.notna(d))
+
+    @contextmanager
+    def _connect(self) -> Iterator:
+        url = self.database_url
+        if url.startswith('sqlite:///'):
+            conn = sqlite3.connect(url[len('sqlite:///'):], timeout=30)
+        elif url.startswith(('postgresql://', 'postgres://')):
+            if not PSYCOPG2_AVAILABLE:
+                raise RuntimeError("psycopg2 is required for PostgreSQL sales ingestion")
+            conn = psycopg2.connect(url)
+            conn.set_session(readonly=True)
+        else:
+            raise ValueError(f"Unsupported database URL: {url.split(':', 1)[0]}")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _path(self, name: str, version: int) -> str:
+        extension = 'parquet' if PYARROW_AVAILABLE else 'npz'
+        return os.path.join(self.cache_dir, f"{name}-{version}.{extension}")
+
+    def _save_cache(self, sku_daily: pd.DataFrame, metrics_daily: pd.DataFrame, watermarks: Dict):
+        """Write versioned tables, then swap the manifest so readers never see a partial refresh"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        version = self._version + 1
+        for name, table in (('sku_daily', sku_daily), ('metrics_daily', metrics_daily)):
+            path = self._path(name, version)
+            if PYARROW_AVAILABLE:
+                table.to_parquet(path, index=False, compression='zstd')
+            else:
+                np.savez(path, **{c: _plain_array(table[c]) for c in table.columns})
+
+        manifest = os.path.join(self.cache_dir, 'manifest.json')
+        tmp_path = f"{manifest}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version, 'watermarks': watermarks, 'format': 'parquet' if PYARROW_AVAILABLE else 'npz'}, f)
+        os.replace(tmp_path, manifest)
+
+        for name in ('sku_daily', 'metrics_daily'):
+            old_path = self._path(name, self._version)
+            if self._version and os.path.exists(old_path):
+                os.remove(old_path)
+        self._version = version
+
+    def _load_cache(self):
+        manifest = os.path.join(self.cache_dir, 'manifest.json')
+        if not os.path.exists(manifest):
+            return
+        try:
+            with open(manifest) as f:
+                meta = json.load(f)
+            if meta['format'] != ('parquet' if PYARROW_AVAILABLE else 'npz'):
+                logger.warning(f"Sales cache was written as {meta['format']}; rebuilding on next refresh")
+                return
+
+            tables = {}
+            for name in ('sku_daily', 'metrics_daily'):
+                path = self._path(name, meta['version'])
+                if PYARROW_AVAILABLE:
+                    tables[name] = pd.read_parquet(path)
+                else:
+                    with np.load(path) as arrays:
+                        tables[name] = pd.DataFrame({c: arrays[c] for c in arrays.files})
+
+            if not all(isinstance(w, dict) for w in meta['watermarks'].values()):
+                logger.warning("Sales cache has keyset watermarks from an older release; rebuilding on next refresh")
+                return
+
+            self._version = meta['version']
+            self._watermarks = meta['watermarks']
+            self._sku_daily, self._metrics_daily = tables['sku_daily'], tables['metrics_daily']
+            self._offsets = self._index(self._sku_daily)
+            logger.info(f"Loaded sales cache v{self._version}: {len(self._offsets)} SKUs, {len(self._metrics_daily)} days")
+        except Exception as e:
+            logger.warning(f"Could not load sales cache from {self.cache_dir}: {e}")
+
+
+def _format_like(timestamp: pd.Timestamp, example: str) -> str:
+    """Timestamp as text in the same layout as a created_at read back, so text columns compare correctly"""
+    separator = example[10] if len(example) > 10 else ' '
+    return timestamp.isoformat(sep=separator)
+
+
+def _plain_array(column: pd.Series) -> np.ndarray:
+    """Column as a pickle-free numpy array (strings become fixed-width unicode)"""
+    if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column):
+        return column.to_numpy()
+    return column.astype(str).to_numpy(dtype=str)
@@ -0,0 +1,104 @@
+"""
+Inventory Planning
+Vectorized safety stock, reorder points and order quantities for the whole catalog
+"""
+
+from typing import Dict, Optional, Union
+import numpy as np
+from scipy.stats import norm
+import logging
+
+logger = logging.getLogger(__name__)
+
+ArrayLike = Union[float, np.ndarray]
+
+# Order quantity covers this many days of demand when no cost data is available
+DEFAULT_ORDER_CYCLE_DAYS = 30
+
+
+def plan_inventory(
+    mean_daily_demand: ArrayLike,
+    demand_std: ArrayLike,
+    lead_time_days: ArrayLike = 7,
+    lead_time_std_days: ArrayLike = 0.0,
+    service_level: ArrayLike = 0.95,
+    on_hand: ArrayLike = 0.0,
+    on_order: ArrayLike = 0.0,
+    unit_cost: Optional[ArrayLike] = None,
+    order_cost: Optional[ArrayLike] = None,
+    holding_cost_rate: Optional[ArrayLike] = None,
+    order_cycle_days: ArrayLike = DEFAULT_ORDER_CYCLE_DAYS,
+    min_order_qty: ArrayLike = 0,
+    pack_size: ArrayLike = 1
+) -> Dict[str, np.ndarray]:
+    """
+    Reorder point planning for every SKU in one array pass
+
+    Demand over the lead time is treated as normal with variance
+    L * sigma_d^2 + d^2 * sigma_L^2, so both demand noise and supplier
+    lead-time variability feed the safety stock. Every argument is a scalar
+    or an array with one entry per SKU.
+
+    Args:
+        mean_daily_demand: Forecast mean daily demand
+        demand_std: Standard deviation of daily demand (e.g. forecast residual sigma)
+        lead_time_days: Mean supplier lead time
+        lead_time_std_days: Standard deviation of the lead time
+        service_level: Target cycle service level (probability of no stock-out per cycle)
+        on_hand: Units in stock
+        on_order: Units already ordered but not received
+        unit_cost: Cost per unit (with order_cost and holding_cost_rate enables EOQ)
+        order_cost: Fixed cost per order
+        holding_cost_rate: Annual holding cost as a fraction of unit cost
+        order_cycle_days: Days of demand per order when EOQ is not possible
+        min_order_qty: Supplier minimum order quantity
+        pack_size: Orders are rounded up to whole packs
+
+    Returns:
+        Arrays per SKU: safety_stock, reorder_point, order_quantity, inventory_position,
+        needs_reorder, suggested_order, days_of_cover
+    """
+    d = np.maximum(np.asarray(mean_daily_demand, dtype=np.float64), 0)
+    sigma_d = np.maximum(np.asarray(demand_std, dtype=np.float64), 0)
+    lead_time = np.maximum(np.asarray(lead_time_days, dtype=np.float64), 0)
+    sigma_lead_time = np.maximum(np.asarray(lead_time_std_days, dtype=np.float64), 0)
+    z = norm.ppf(np.clip(np.asarray(service_level, dtype=np.float64), 0.5, 0.9999))
+
+    # Safety stock from the standard deviation of demand over a variable lead time
+    lead_time_sigma = np.sqrt(lead_time * sigma_d ** 2 + (d * sigma_lead_time) ** 2)
+    safety_stock = z * lead_time_sigma
+    reorder_point = d * lead_time + safety_stock
+
+    # Economic order quantity where costs are known, otherwise a fixed cycle of demand
+    cycle_quantity = d * np.asarray(order_cycle_days, dtype=np.float64)
+    if unit_cost is not None and order_cost is not None and holding_cost_rate is not None:
+        holding_cost = np.asarray(holding_cost_rate, dtype=np.float64) * np.asarray(unit_cost, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eoq = np.sqrt(2 * 365 * d * np.asarray(order_cost, dtype=np.float64) / holding_cost)
+        order_quantity = np.where(np.isfinite(eoq) & (holding_cost > 0), eoq, cycle_quantity)
+    else:
+        order_quantity = cycle_quantity
+
+    pack = np.maximum(np.asarray(pack_size, dtype=np.float64), 1)
+    order_quantity = np.maximum(order_quantity, np.asarray(min_order_qty, dtype=np.float64))
+    order_quantity = np.ceil(order_quantity / pack) * pack
+
+    # (s, Q) policy: order Q once the position hits s, more if already far below it
+    position = np.asarray(on_hand, dtype=np.float64) + np.asarray(on_order, dtype=np.float64)
+    needs_reorder = position <= reorder_point
+    shortfall = np.ceil(np.maximum(reorder_point - position, 0) / pack) * pack
+    suggested_order = np.where(needs_reorder, np.maximum(order_quantity, shortfall), 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(d > 0, position / d, np.inf)
+
+    shape = np.broadcast(d, sigma_d, lead_time, position).shape
+    return {
+        'safety_stock': np.broadcast_to(np.ceil(safety_stock), shape),
+        'reorder_point': np.broadcast_to(np.ceil(reorder_point), shape),
+        'order_quantity': np.broadcast_to(order_quantity, shape),
+        'inventory_position': np.broadcast_to(position, shape),
+        'needs_reorder': np.broadcast_to(needs_reorder, shape),
+        'suggested_order': np.broadcast_to(suggested_order, shape),
+        'days_of_cover': np.broadcast_to(days_of_cover, shape),
+    }
@@ -0,0 +1,284 @@
+"""
+Background Job Queue
+SQLite-backed job table with a bounded in-process worker pool
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+# Columns added after the first release; added to older job databases on open
+_MIGRATIONS = {'owner': 'TEXT', 'heartbeat_at': 'REAL'}
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds max_pending unfinished jobs"""
+
+
+class JobQueue:
+    """Durable job table drained by a fixed number of worker threads"""
+
+    def __init__(
+        self,
+        db_path: str,
+        handlers: Dict[str, Callable[[Dict], Dict]],
+        max_workers: int = 2,
+        max_pending: int = 1000,
+        result_ttl_seconds: float = 86400.0,
+        lease_seconds: float = 60.0
+    ):
+        """
+        Initialize queue
+
+        Args:
+            db_path: SQLite database file (':memory:' is not supported; use a temp file)
+            handlers: Job kind -> function taking the payload and returning a JSON-serializable result
+            max_workers: Jobs executed concurrently
+            max_pending: Unfinished jobs accepted before submit() raises QueueFullError
+            result_ttl_seconds: Finished jobs are purged after this long
+            lease_seconds: A running job whose owner has not heartbeated for this long
+                is assumed dead and re-queued; live owners renew every lease_seconds / 4
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self.lease_seconds = lease_seconds
+
+        # Several processes (e.g. gunicorn workers) may share one job database
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._submit_lock = threading.Lock()
+        self._local_lock = threading.Lock()
+        self._local = set()  # Job IDs queued or running in this process's pool
+        self._stop = threading.Event()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {r['name'] for r in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+        self._resume()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, kind: str, payload: Dict) -> Tuple[Dict, bool]:
+        """
+        Enqueue a job, or return the identical job already in flight
+
+        Args:
+            kind: Handler name
+            payload: JSON-serializable job arguments
+
+        Returns:
+            (job, deduplicated)
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        body = json.dumps(payload, sort_keys=True, default=str)
+        dedup_key = hashlib.sha256(f"{kind}:{body}".encode()).hexdigest()
+
+        # Check-then-insert in one write transaction: BEGIN IMMEDIATE takes SQLite's write
+        # lock up front, so identical requests in other processes sharing the database
+        # (e.g. gunicorn workers) wait and then see this job instead of inserting their own
+        with self._submit_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE dedup_key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (dedup_key, QUEUED, RUNNING)
+            ).fetchone()
+            if row is not None:
+                return self._to_dict(row), True
+
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs pending")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedup_key, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, dedup_key, QUEUED, body, time.time())
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.result_ttl_seconds,)
+            )
+
+        self._enqueue(job_id)
+        return self.get(job_id), False
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status, timings and (when done) result"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def stats(self) -> Dict:
+        """Job counts by status and pool size"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            'jobs_by_status': {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'owner': self.owner,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work; unfinished jobs are resumed once their lease expires"""
+        self._stop.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _enqueue(self, job_id: str):
+        with self._local_lock:
+            if job_id in self._local:
+                return
+            self._local.add(job_id)
+        self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        try:
+            self._execute(job_id)
+        finally:
+            with self._local_lock:
+                self._local.discard(job_id)
+
+    def _execute(self, job_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, self.owner, now, job_id, QUEUED)
+            ).rowcount
+            row = conn.execute("SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not claimed:
+            return
+
+        try:
+            result = self.handlers[row['kind']](json.loads(row['payload']))
+            update = (DONE, json.dumps(result, default=str), None)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            update = (FAILED, None, str(e))
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                (*update, time.time(), job_id, self.owner)
+            )
+
+    def _resume(self) -> int:
+        """
+        Requeue running jobs whose owner's lease expired, and pick up queued jobs
+
+        Jobs another live process is running keep their lease and are left alone.
+        Queued jobs may also sit in a live sibling's pool; whichever process
+        claims one first runs it, the others skip it.
+
+        Returns:
+            Jobs added to this process's pool
+        """
+        with self._connect() as conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                (QUEUED, RUNNING, time.time() - self.lease_seconds)
+            ).rowcount
+            job_ids = [r[0] for r in conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))]
+
+        with self._local_lock:
+            job_ids = [job_id for job_id in job_ids if job_id not in self._local]
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs with expired leases")
+        return len(job_ids)
+
+    def _heartbeat_loop(self):
+        """Renew leases on this process's running jobs and recover jobs from dead owners"""
+        interval = self.lease_seconds / 4
+        while not self._stop.wait(interval):
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+                        (time.time(), RUNNING, self.owner)
+                    )
+                self._resume()
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived connection per operation; commits on success"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = {
+            'job_id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+        }
+        if row['started_at'] and row['finished_at']:
+            job['run_seconds'] = round(row['finished_at'] - row['started_at'], 3)
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+        return job
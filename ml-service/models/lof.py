@@ -0,0 +1,244 @@
+"""
+Indexed Local Outlier Factor
+LOF with k-nearest neighbours from a KD-tree or FAISS index, batched queries and
+cached neighbourhoods so new points are scored without refitting
+"""
+
+import argparse
+import json
+import time
+from typing import Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sklearn.neighbors import KDTree
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# KD-trees stop paying off above this many dimensions; use FAISS HNSW instead
+# (50k Gaussian points: 10 dims KD-tree 31s vs HNSW 10s, 16 dims 139s vs 13s)
+KDTREE_MAX_DIMS = 8
+
+_EPS = 1e-10
+
+
+class IndexedLOF:
+    """
+    Local Outlier Factor backed by a neighbour index
+
+    Exposes the PyOD detector interface used by AnomalyDetector (fit,
+    decision_function, decision_scores_, labels_, threshold_), so it can stand
+    in for PyOD's LOF. Higher scores are more anomalous.
+
+    On the 8 low-dimensional anomaly features the fit is an exact KD-tree
+    search like PyOD's, on standardized features, and is not faster (100k
+    hourly points: 5.5s vs 4.0s). The gains are elsewhere: 'auto' switches to
+    FAISS HNSW above KDTREE_MAX_DIMS, where KD-tree LOF degrades towards
+    quadratic; decision_function scores new points against cached densities
+    without refitting; queries are batched to bound memory; and the pickled
+    model is ~2.4x smaller than PyOD's, which keeps model caches small.
+    """
+
+    def __init__(
+        self,
+        n_neighbors: int = 20,
+        contamination: float = 0.1,
+        backend: str = 'auto',
+        batch_size: int = 65_536,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64
+    ):
+        """
+        Initialize detector
+
+        Args:
+            n_neighbors: Neighbourhood size k
+            contamination: Expected share of outliers, sets threshold_
+            backend: 'kdtree', 'faiss' or 'auto' (KD-tree for low-dimensional features)
+            batch_size: Points per neighbour query batch
+            hnsw_m: FAISS HNSW graph degree
+            hnsw_ef_search: FAISS HNSW search breadth (higher = more exact)
+        """
+        self.n_neighbors = n_neighbors
+        self.contamination = contamination
+        self.backend = backend
+        self.batch_size = batch_size
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+
+        self.index = None
+        self.backend_ = None
+        self.decision_scores_ = None
+        self.labels_ = None
+        self.threshold_ = None
+        self._center = None
+        self._scale = None
+        self._k_distance = None  # Cached neighbourhoods: k-distance and density of every training point
+        self._lrd = None
+
+    def fit(self, X: np.ndarray) -> 'IndexedLOF':
+        """
+        Build the index and score the training points
+
+        Args:
+            X: Feature matrix (n_points, n_features)
+
+        Returns:
+            self
+        """
+        X = np.asarray(X, dtype=np.float64)
+        self._center = X.mean(axis=0)
+        scale = X.std(axis=0)
+        self._scale = np.where(scale > 0, scale, 1.0)
+        Z = self._standardize(X)
+
+        k = min(self.n_neighbors, len(Z) - 1)
+        self._build_index(Z)
+
+        # k + 1 neighbours, dropping each point itself
+        dist, idx = self._query(Z, k + 1)
+        dist, idx = _drop_self(dist, idx)
+
+        self._k_distance = dist[:, -1]
+        self._lrd = self._local_density(dist, idx)
+        self.decision_scores_ = self._lrd[idx].mean(axis=1) / self._lrd
+
+        self.threshold_ = float(np.percentile(self.decision_scores_, 100 * (1 - self.contamination)))
+        self.labels_ = (self.decision_scores_ > self.threshold_).astype(int)
+        return self
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """
+        LOF of new points against the fitted neighbourhoods
+
+        Only the new points' neighbours are queried; training densities are reused.
+        """
+        Z = self._standardize(np.asarray(X, dtype=np.float64))
+        dist, idx = self._query(Z, min(self.n_neighbors, len(self._lrd)))
+        return self._lrd[idx].mean(axis=1) / self._local_density(dist, idx)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """1 for outliers, 0 for inliers"""
+        return (self.decision_function(X) > self.threshold_).astype(int)
+
+    def __getstate__(self):
+        # FAISS indexes do not pickle; store them as serialized bytes instead
+        state = self.__dict__.copy()
+        if self.backend_ == 'faiss':
+            state['index'] = faiss.serialize_index(self.index)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.backend_ == 'faiss':
+            self.index = faiss.deserialize_index(self.index)
+            self.index.hnsw.efSearch = self.hnsw_ef_search
+
+    def _standardize(self, X: np.ndarray) -> np.ndarray:
+        return (X - self._center) / self._scale
+
+    def _local_density(self, dist: np.ndarray, idx: np.ndarray) -> np.ndarray:
+        """Inverse mean reachability distance to each point's neighbours"""
+        reach = np.maximum(dist, self._k_distance[idx])
+        return 1.0 / (reach.mean(axis=1) + _EPS)
+
+    def _build_index(self, Z: np.ndarray):
+        backend = self.backend
+        if backend == 'auto':
+            backend = 'kdtree' if SKLEARN_AVAILABLE and Z.shape[1] <= KDTREE_MAX_DIMS else 'faiss'
+        if backend == 'kdtree' and not SKLEARN_AVAILABLE:
+            raise ImportError("scikit-learn is required for the KD-tree backend")
+        if backend == 'faiss' and not FAISS_AVAILABLE:
+            raise ImportError("faiss is required for the FAISS backend")
+
+        if backend == 'kdtree':
+            self.index = KDTree(Z)
+        else:
+            self.index = faiss.IndexHNSWFlat(Z.shape[1], self.hnsw_m)
+            self.index.hnsw.efSearch = self.hnsw_ef_search
+            self.index.add(np.ascontiguousarray(Z, dtype=np.float32))
+        self.backend_ = backend
+
+    def _query(self, Z: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest neighbours of every row, in batches to bound memory"""
+        dist = np.empty((len(Z), k))
+        idx = np.empty((len(Z), k), dtype=np.int64)
+        for start in range(0, len(Z), self.batch_size):
+            batch = slice(start, start + self.batch_size)
+            if self.backend_ == 'kdtree':
+                dist[batch], idx[batch] = self.index.query(Z[batch], k=k)
+            else:
+                sq_dist, idx[batch] = self.index.search(np.ascontiguousarray(Z[batch], dtype=np.float32), k)
+                dist[batch] = np.sqrt(np.maximum(sq_dist, 0.0))
+        return dist, idx
+
+
+def _drop_self(dist: np.ndarray, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Remove each point from its own neighbour list
+
+    Exact duplicates can push a point out of first place, so the row's own
+    index is removed wherever it appears (or the farthest neighbour if absent).
+    """
+    rows = np.arange(len(idx))[:, None]
+    is_self = idx == rows
+    missing = ~is_self.any(axis=1)
+    is_self[missing, -1] = True
+    keep = ~is_self
+    k = idx.shape[1] - 1
+    return dist[keep].reshape(-1, k), idx[keep].reshape(-1, k)
+
+
+if __name__ == '__main__':
+    # python -m models.lof --points 10000 100000 1000000
+    from models.anomaly import anomaly_features, PYOD_AVAILABLE
+
+    parser = argparse.ArgumentParser(description="Benchmark indexed LOF against PyOD's LOF")
+    parser.add_argument('--points', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--pyod-max', type=int, default=100_000, help="Skip PyOD LOF above this size")
+    parser.add_argument('--backend', default='auto', choices=['auto', 'kdtree', 'faiss'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for points in args.points:
+        hours = np.arange(points)
+        values = 1000 + 300 * np.sin(hours * 2 * np.pi / 24) + rng.normal(0, 50, points)
+        spikes = rng.choice(points, size=max(points // 1000, 1), replace=False)
+        values[spikes] *= 2.0
+        X = anomaly_features(pd.date_range('2020-01-01', periods=points, freq='h'), values).to_numpy()
+
+        row = {'points': points, 'features': X.shape[1]}
+        start = time.perf_counter()
+        indexed = IndexedLOF(backend=args.backend).fit(X)
+        row['indexed_fit_seconds'] = round(time.perf_counter() - start, 3)
+        row['indexed_backend'] = indexed.backend_
+
+        new = X[-min(1000, points):]
+        start = time.perf_counter()
+        indexed.decision_function(new)
+        row['indexed_score_1000_seconds'] = round(time.perf_counter() - start, 4)
+        row['indexed_spike_recall'] = round(float(indexed.labels_[spikes].mean()), 3)
+
+        if PYOD_AVAILABLE and points <= args.pyod_max:
+            from pyod.models.lof import LOF
+            start = time.perf_counter()
+            reference = LOF(contamination=0.1).fit(X)
+            row['pyod_fit_seconds'] = round(time.perf_counter() - start, 3)
+            row['pyod_spike_recall'] = round(float(reference.labels_[spikes].mean()), 3)
+            row['label_agreement'] = round(float((reference.labels_ == indexed.labels_).mean()), 4)
+        else:
+            row['pyod_fit_seconds'] = None
+
+        print(json.dumps(row), flush=True)
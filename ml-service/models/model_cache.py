@@ -0,0 +1,192 @@
+"""
+Fitted Model Cache
+LRU cache of trained models keyed by series ID and training-data fingerprint
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(data, config: Optional[Dict] = None) -> str:
+    """
+    Stable fingerprint of training data and model configuration
+
+    Args:
+        data: DataFrame or array the model is fitted on
+        config: Model settings that change the fit
+
+    Returns:
+        Hex digest; any change to the data or config changes it
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, pd.DataFrame):
+        for column in data.columns:
+            digest.update(str(column).encode())
+            digest.update(np.ascontiguousarray(data[column].to_numpy()).tobytes())
+    else:
+        array = np.ascontiguousarray(data)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    digest.update(repr(sorted((config or {}).items())).encode())
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """Thread-safe LRU of fitted models, optionally persisted to disk"""
+
+    def __init__(self, capacity: int = 256, cache_dir: Optional[str] = None, rescan_interval: int = 1000):
+        """
+        Initialize cache
+
+        Args:
+            capacity: Models kept in memory
+            cache_dir: Directory for pickled models; None keeps the cache in memory only
+            rescan_interval: Writes between directory listings that pick up files from other workers
+        """
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self.rescan_interval = rescan_interval
+
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (fingerprint, model)
+        self._lock = threading.Lock()
+
+        # Pickles on disk per key hash, so a write prunes older fits without listing the directory
+        self._disk_files: Dict[str, Set[str]] = {}
+        self._disk_lock = threading.Lock()
+        self._writes_since_scan = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, data_fingerprint: str) -> Optional[Any]:
+        """
+        Look up a fitted model
+
+        Args:
+            key: Series identifier (e.g. product ID)
+            data_fingerprint: Fingerprint of the current training data
+
+        Returns:
+            The cached model, or None if missing or fitted on different data
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == data_fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        model = self._load(key, data_fingerprint)
+        with self._lock:
+            if model is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, data_fingerprint, model)
+        return model
+
+    def put(self, key: str, data_fingerprint: str, model: Any):
+        """Store a fitted model, replacing any fit on older data"""
+        with self._lock:
+            self._insert(key, data_fingerprint, model)
+        self._save(key, data_fingerprint, model)
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit rates and occupancy"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'cached_models': len(self._entries),
+            'cache_capacity': self.capacity,
+            'cache_hits': self.hits,
+            'cache_disk_hits': self.disk_hits,
+            'cache_misses': self.misses,
+            'cache_evictions': self.evictions,
+            'cache_hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            'cache_dir': self.cache_dir,
+        }
+
+    def _insert(self, key: str, data_fingerprint: str, model: Any):
+        self._entries[key] = (data_fingerprint, model)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key: str, data_fingerprint: str) -> str:
+        key_hash = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f"{key_hash}-{data_fingerprint}.pkl")
+
+    def _load(self, key: str, data_fingerprint: str) -> Optional[Any]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key, data_fingerprint)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load cached model {path}: {e}")
+            return None
+
+    def _save(self, key: str, data_fingerprint: str, model: Any):
+        if not self.cache_dir:
+            return
+        path = self._path(key, data_fingerprint)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)  # Atomic, so concurrent workers never read a partial file
+        except Exception as e:
+            logger.warning(f"Could not persist model for {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        # Fits on older data for the same key are never looked up again
+        name = os.path.basename(path)
+        prefix = name.split('-')[0]
+        with self._disk_lock:
+            self._writes_since_scan += 1
+            if self._writes_since_scan >= self.rescan_interval:
+                self._scan_disk()
+            stale = self._disk_files.get(prefix, set()) - {name}
+            self._disk_files[prefix] = {name}
+
+        for stale_name in stale:
+            try:
+                os.remove(os.path.join(self.cache_dir, stale_name))
+            except OSError:
+                pass
+
+    def _scan_disk(self):
+        """Rebuild the on-disk index, including pickles written by other workers"""
+        disk_files: Dict[str, Set[str]] = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                disk_files.setdefault(name.split('-')[0], set()).add(name)
+        self._disk_files = disk_files
+        self._writes_since_scan = 0
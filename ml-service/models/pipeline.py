@@ -0,0 +1,375 @@
+"""
+Recommendation Pipeline
+Cheap candidate generation followed by vectorized re-ranking of a small candidate set
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Above this many items an exhaustive index makes the neighbour table quadratic; use HNSW
+EXACT_NEIGHBOUR_MAX_ITEMS = 50_000
+
+
+class CandidateGenerator:
+    """Base class for pipeline candidate sources"""
+
+    name = 'candidates'
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        """
+        Produce candidate item rows for a request
+
+        Args:
+            context: Request context (seed_rows, dosha_type, health_goal, ...)
+            limit: Maximum number of rows to return
+
+        Returns:
+            Array of item rows (may contain duplicates)
+        """
+        raise NotImplementedError
+
+
+class NeighbourCandidates(CandidateGenerator):
+    """Precomputed nearest-neighbour table over normalized item embeddings, built from a FAISS index"""
+
+    name = 'neighbours'
+
+    def __init__(
+        self,
+        normalized_embeddings: np.ndarray,
+        num_neighbours: int = 50,
+        block_size: int = 1024,
+        index=None,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 128
+    ):
+        """
+        Args:
+            normalized_embeddings: L2-normalized item embeddings (n_items, dim)
+            num_neighbours: Neighbours kept per item
+            block_size: Rows queried per index search while building the table
+            index: Optional inner-product FAISS index over the same rows (e.g. the search engine's)
+            hnsw_m: HNSW graph degree when an approximate index has to be built
+            hnsw_ef_search: HNSW search breadth when an approximate index has to be built
+        """
+        self.embeddings = normalized_embeddings
+        self.num_neighbours = min(num_neighbours, max(len(normalized_embeddings) - 1, 0))
+        self.block_size = block_size
+        self.index = index
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.table = None
+
+    def _neighbour_index(self):
+        """
+        Index used to build the table
+
+        A supplied index is reused unless it is exhaustive and the catalog is
+        too large for an all-pairs search; in that case (and when no index is
+        given) an HNSW index is built, or a flat one for small catalogs.
+        """
+        n, dim = self.embeddings.shape
+        exhaustive = self.index is None or isinstance(self.index, faiss.IndexFlat)
+        if self.index is not None and (n <= EXACT_NEIGHBOUR_MAX_ITEMS or not exhaustive):
+            if self.index.ntotal != n:
+                raise ValueError(f"Index has {self.index.ntotal} vectors for {n} items")
+            return self.index
+
+        vectors = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        if n <= EXACT_NEIGHBOUR_MAX_ITEMS:
+            index = faiss.IndexFlatIP(dim)
+        else:
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = max(self.hnsw_ef_search, self.num_neighbours + 1)
+        index.add(vectors)
+        return index
+
+    def build(self):
+        """Build the neighbour table with batched index searches"""
+        if not FAISS_AVAILABLE:
+            raise ImportError("faiss is required to build the neighbour table")
+
+        n = len(self.embeddings)
+        k = self.num_neighbours
+        table = np.empty((n, k), dtype=np.int32)
+
+        start_time = time.perf_counter()
+        index = self._neighbour_index() if k > 0 else None
+        for start in range(0, n if k > 0 else 0, self.block_size):
+            stop = min(start + self.block_size, n)
+            block = np.ascontiguousarray(self.embeddings[start:stop], dtype=np.float32)
+            _, found = index.search(block, k + 1)
+
+            # Drop each row itself (and FAISS's -1 padding), keeping the k best in order
+            rows = np.arange(start, stop)[:, None]
+            keep = (found != rows) & (found >= 0)
+            order = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+            neighbours = np.take_along_axis(found, order, axis=1)
+            valid = np.take_along_axis(keep, order, axis=1)
+            table[start:stop] = np.where(valid, neighbours, rows)  # Pad short rows with the item itself
+
+        self.table = table
+        logger.info(f"Built {n}x{k} neighbour table in {(time.perf_counter() - start_time) * 1000:.0f}ms")
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        seed_rows = context.get('seed_rows')
+        if seed_rows is None or len(seed_rows) == 0:
+            return np.empty(0, dtype=np.int32)
+        if self.table is None:
+            self.build()
+
+        # Interleave neighbours so every seed contributes its closest items first
+        per_seed = max(1, min(self.num_neighbours, -(-limit // len(seed_rows))))
+        return self.table[np.asarray(seed_rows)][:, :per_seed].T.ravel()[:limit]
+
+
+class PopularityCandidates(CandidateGenerator):
+    """Most popular items overall"""
+
+    name = 'popularity'
+
+    def __init__(self, popularity: np.ndarray):
+        """
+        Args:
+            popularity: Popularity score per item row
+        """
+        self.update(popularity)
+
+    def update(self, popularity: np.ndarray):
+        """Replace popularity scores and recompute the ranking"""
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+        self.ranking = np.argsort(-self.popularity, kind='stable').astype(np.int32)
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        return self.ranking[:limit]
+
+
+class DoshaCandidates(CandidateGenerator):
+    """Items suited to a dosha, ranked by a static per-item prior"""
+
+    name = 'dosha'
+
+    def __init__(self, dosha_masks: Dict[str, np.ndarray], prior: np.ndarray):
+        """
+        Args:
+            dosha_masks: Dosha name -> boolean mask of matching items
+            prior: Static score used to order items within a dosha
+        """
+        self.table = {}
+        for dosha, mask in dosha_masks.items():
+            rows = np.flatnonzero(mask)
+            self.table[dosha] = rows[np.argsort(-prior[rows], kind='stable')].astype(np.int32)
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        dosha = (context.get('dosha_type') or '').upper()
+        return self.table.get(dosha, np.empty(0, dtype=np.int32))[:limit]
+
+
+class GoalCandidates(CandidateGenerator):
+    """Items whose benefits match the requested health goal, ranked by a static per-item prior"""
+
+    name = 'goal'
+
+    def __init__(self, goal_mask: Callable[[str], np.ndarray], prior: np.ndarray):
+        """
+        Args:
+            goal_mask: Health goal -> boolean mask of matching items
+            prior: Static score used to order items within a goal
+        """
+        self.goal_mask = goal_mask
+        self.prior = prior
+        self.table = {}
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        goal = (context.get('health_goal') or '').lower()
+        if not goal:
+            return np.empty(0, dtype=np.int32)
+
+        rows = self.table.get(goal)
+        if rows is None:
+            rows = np.flatnonzero(self.goal_mask(goal))
+            rows = rows[np.argsort(-self.prior[rows], kind='stable')].astype(np.int32)
+            self.table[goal] = rows
+        return rows[:limit]
+
+
+class CoPurchaseCandidates(CandidateGenerator):
+    """Items frequently bought together with the seed items"""
+
+    name = 'co_purchase'
+
+    def __init__(self, table: Optional[Dict[int, np.ndarray]] = None):
+        """
+        Args:
+            table: Item row -> rows of items bought together with it, best first
+        """
+        self.table = table or {}
+
+    def set_table(self, table: Dict[int, np.ndarray]):
+        """Swap in a new co-purchase table"""
+        self.table = table
+
+    def generate(self, context: Dict, limit: int) -> np.ndarray:
+        seed_rows = context.get('seed_rows')
+        if seed_rows is None or not self.table:
+            return np.empty(0, dtype=np.int32)
+
+        rows = [self.table[int(row)] for row in seed_rows if int(row) in self.table]
+        if not rows:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate(rows)[:limit]
+
+
+class StageTimings:
+    """Rolling latency samples for one pipeline stage"""
+
+    def __init__(self, window: int = 2048):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, elapsed_ms: float):
+        self.samples.append(elapsed_ms)
+        self.count += 1
+
+    def summary(self) -> Dict:
+        if not self.samples:
+            return {'count': 0}
+        samples = np.fromiter(self.samples, dtype=np.float64)
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {
+            'count': self.count,
+            'mean_ms': round(float(samples.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p99_ms': round(float(p99), 3),
+        }
+
+
+class RecommendationPipeline:
+    """Candidate generators feeding a vectorized re-ranker"""
+
+    def __init__(
+        self,
+        name: str,
+        generators: List[CandidateGenerator],
+        reranker: Callable[[np.ndarray, Dict], np.ndarray],
+        num_items: int,
+        max_candidates: int = 300
+    ):
+        """
+        Initialize pipeline
+
+        Args:
+            name: Pipeline name used in stats
+            generators: Candidate generators, queried in order
+            reranker: Function scoring candidate rows for a request context
+            num_items: Catalog size
+            max_candidates: Candidate budget; smaller catalogs are scored in full
+        """
+        self.name = name
+        self.generators = generators
+        self.reranker = reranker
+        self.num_items = num_items
+        self.max_candidates = max_candidates
+
+        self._lock = threading.Lock()
+        self._timings = {stage: StageTimings() for stage in [g.name for g in generators] + ['rerank', 'total']}
+        self._candidate_counts = deque(maxlen=2048)
+
+    def run(
+        self,
+        context: Dict,
+        n: int,
+        exclude_rows: Optional[np.ndarray] = None,
+        min_score: Optional[float] = None,
+        exclude: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generate candidates, score them and return the top N
+
+        Args:
+            context: Request context passed to generators and re-ranker
+            n: Number of results
+            exclude_rows: Item rows that must not be returned
+            min_score: Drop candidates scoring at or below this value
+            exclude: Function returning a boolean mask of candidate rows to drop
+
+        Returns:
+            (rows, scores) sorted by descending score
+        """
+        total_start = time.perf_counter()
+        timings = {}
+
+        if self.num_items <= self.max_candidates:
+            # Small catalog: scoring everything is cheaper than generating candidates
+            candidates = np.arange(self.num_items, dtype=np.int32)
+        else:
+            parts = []
+            for generator in self.generators:
+                start = time.perf_counter()
+                parts.append(generator.generate(context, self.max_candidates))
+                timings[generator.name] = (time.perf_counter() - start) * 1000
+            candidates = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+        if exclude_rows is not None and len(exclude_rows) > 0 and len(candidates) > 0:
+            candidates = candidates[~np.isin(candidates, exclude_rows)]
+        if exclude is not None and len(candidates) > 0:
+            candidates = candidates[~exclude(candidates)]
+
+        start = time.perf_counter()
+        scores = self.reranker(candidates, context) if len(candidates) else np.empty(0)
+        if min_score is not None:
+            keep = scores > min_score
+            candidates, scores = candidates[keep], scores[keep]
+
+        top = self.top_k(scores, n, candidates)
+        rows, scores = candidates[top], scores[top]
+        timings['rerank'] = (time.perf_counter() - start) * 1000
+        timings['total'] = (time.perf_counter() - total_start) * 1000
+
+        with self._lock:
+            for stage, elapsed_ms in timings.items():
+                self._timings[stage].add(elapsed_ms)
+            self._candidate_counts.append(len(candidates))
+
+        return rows, scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Indices of the k highest scores, best first, without a full sort
+
+        Equal scores are ordered by ascending row (by index without rows), and
+        every item tied with the k-th score competes for the last places, so the
+        same request always returns the same list.
+        """
+        if k <= 0 or len(scores) == 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            kth = np.partition(-scores, k - 1)[k - 1]
+            top = np.flatnonzero(-scores <= kth)
+        else:
+            top = np.arange(len(scores))
+        ties = top if rows is None else rows[top]
+        return top[np.lexsort((ties, -scores[top]))[:k]]
+
+    def stats(self) -> Dict:
+        """Per-stage latency percentiles and candidate counts"""
+        with self._lock:
+            counts = np.fromiter(self._candidate_counts, dtype=np.int64)
+            return {
+                'stages': {stage: timing.summary() for stage, timing in self._timings.items()},
+                'avg_candidates': round(float(counts.mean()), 1) if len(counts) else 0.0,
+                'max_candidates': self.max_candidates,
+            }
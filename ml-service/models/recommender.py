@@ -3,36 +3,87 @@ Product Recommendation Engine
 Combines collaborative filtering, content-based, and Ayurveda-specific recommendations
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Tuple, Optional
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 
+from models.pipeline import (
+    RecommendationPipeline,
+    NeighbourCandidates,
+    PopularityCandidates,
+    DoshaCandidates,
+    GoalCandidates,
+    CoPurchaseCandidates,
+)
+from models.user_profiles import UserProfileStore, EVENT_WEIGHTS
+from models.exclusions import ExclusionStore, EXCLUSION_EVENTS
+
 logger = logging.getLogger(__name__)
 
+# Weight applied when a strategy re-recommends a product already suggested by another
+STRATEGY_MERGE_WEIGHTS = {
+    'content': 0.3,
+    'collaborative': 0.4,
+    'ayurveda': 0.3,
+}
+
 
 class ProductRecommender:
     """Hybrid recommendation system combining multiple strategies"""
 
-    def __init__(self, embedding_service):
+    def __init__(
+        self,
+        embedding_service,
+        profile_store: Optional[UserProfileStore] = None,
+        exclusion_store: Optional[ExclusionStore] = None,
+        strategy_workers: int = 8,
+        deadline_ms: float = 250.0,
+        max_candidates: int = 300
+    ):
         """
         Initialize recommender
 
         Args:
             embedding_service: EmbeddingService instance
+            profile_store: Optional server-side store of user profiles
+            exclusion_store: Optional per-user filters of purchased/dismissed products
+            strategy_workers: Threads shared by all hybrid requests for running strategies
+            deadline_ms: Default time budget for a hybrid request
+            max_candidates: Candidate budget per pipeline before re-ranking
         """
         self.embedding_service = embedding_service
         self.product_embeddings = None
         self.product_index = None
+        self.product_rows = {}  # Product ID -> row in product_embeddings
         self.user_interactions = None
-
-    def load_products(self, products: List[Dict]):
+        self.profile_store = profile_store
+        self.exclusion_store = exclusion_store
+        self.exclusion_positions = None
+        self.max_candidates = max_candidates
+        self.pipelines = {}
+
+        self.deadline_ms = deadline_ms
+        self._executor = ThreadPoolExecutor(
+            max_workers=strategy_workers,
+            thread_name_prefix='recommender-strategy'
+        )
+        self._stats_lock = threading.Lock()
+        self._strategy_stats = {
+            name: {'calls': 0, 'completed': 0, 'timeouts': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            for name in STRATEGY_MERGE_WEIGHTS
+        }
+
+    def load_products(self, products: List[Dict], index=None):
         """
         Load product catalog and generate embeddings
 
         Args:
             products: List of product dictionaries
+            index: Optional inner-product FAISS index over the same products, reused for neighbour search
         """
         logger.info(f"Loading {len(products)} products")
 
@@ -41,14 +92,75 @@ class ProductRecommender:
 
         # Create product index
         self.product_index = {i: product for i, product in enumerate(products)}
+        self.product_rows = {product['id']: i for i, product in enumerate(products)}
+
+        self._build_pipelines(products, index)
 
         logger.info("Products loaded and indexed")
 
+    def _build_pipelines(self, products: List[Dict], index=None):
+        """Precompute per-item arrays and assemble the recommendation pipelines"""
+        num_items = len(products)
+
+        # Normalize once so cosine similarity is a plain dot product
+        norms = np.linalg.norm(self.product_embeddings, axis=1, keepdims=True)
+        self.normalized_embeddings = (self.product_embeddings / np.maximum(norms, 1e-12)).astype(np.float32)
+
+        categories = {}
+        self.category_codes = np.array(
+            [categories.setdefault(p.get('category'), len(categories)) if p.get('category') else -1 for p in products],
+            dtype=np.int32
+        )
+
+        # Ayurveda scoring inputs
+        self._dosha_strings = [str(p.get('dosha_type') or '').upper() for p in products]
+        self._benefit_strings = [
+            [b.lower() for b in p['benefits']] if isinstance(p.get('benefits'), list) else []
+            for p in products
+        ]
+        self.ingredient_bonus = np.array([
+            0.1 * min(len(p['ingredients']) / 5, 1) if isinstance(p.get('ingredients'), list) and p['ingredients'] else 0.0
+            for p in products
+        ])
+        self._dosha_masks = {}
+        self._goal_masks = {}
+
+        if self.exclusion_store is not None:
+            self.exclusion_positions = self.exclusion_store.item_positions([p['id'] for p in products])
+
+        # Until sales data is loaded, popularity follows catalog order
+        self.popularity = PopularityCandidates(-np.arange(num_items, dtype=np.float64))
+        self.neighbours = NeighbourCandidates(self.normalized_embeddings, index=index)
+        if num_items > self.max_candidates:
+            self.neighbours.build()
+        self.co_purchase = CoPurchaseCandidates()
+        dosha_table = DoshaCandidates(
+            {dosha: self._dosha_mask(dosha) for dosha in ('VATA', 'PITTA', 'KAPHA')},
+            self.ingredient_bonus
+        )
+        goal_table = GoalCandidates(self._goal_mask, self.ingredient_bonus)
+
+        self.pipelines = {
+            'content': RecommendationPipeline(
+                'content', [self.neighbours, self.co_purchase], self._rerank_similarity,
+                num_items, self.max_candidates
+            ),
+            'collaborative': RecommendationPipeline(
+                'collaborative', [self.neighbours, self.popularity], self._rerank_similarity,
+                num_items, self.max_candidates
+            ),
+            'ayurveda': RecommendationPipeline(
+                'ayurveda', [dosha_table, goal_table, self.popularity], self._rerank_ayurveda,
+                num_items, self.max_candidates
+            ),
+        }
+
     def content_based_recommendations(
         self,
         product_id: str,
         n: int = 10,
-        category_boost: float = 0.2
+        category_boost: float = 0.2,
+        user_id: Optional[str] = None
     ) -> List[Dict]:
         """
         Get similar products based on content (embeddings)
@@ -57,6 +169,7 @@ class ProductRecommender:
             product_id: Source product ID
             n: Number of recommendations
             category_boost: Boost for same-category products
+            user_id: Optional user whose purchased/dismissed products are excluded
 
         Returns:
             List of recommended products with scores
@@ -65,121 +178,82 @@ class ProductRecommender:
             raise ValueError("Products not loaded. Call load_products() first")
 
         # Find product index
-        product_idx = None
-        for idx, product in self.product_index.items():
-            if product['id'] == product_id:
-                product_idx = idx
-                break
+        product_idx = self.product_rows.get(product_id)
 
         if product_idx is None:
             raise ValueError(f"Product {product_id} not found")
 
-        # Get product embedding
-        query_embedding = self.product_embeddings[product_idx]
-
-        # Calculate similarities
-        similarities = cosine_similarity(
-            query_embedding.reshape(1, -1),
-            self.product_embeddings
-        )[0]
+        context = {
+            'seed_rows': np.array([product_idx]),
+            'query': self.normalized_embeddings[product_idx],
+            'category_code': self.category_codes[product_idx],
+            'category_boost': category_boost,
+        }
+        rows, scores = self.pipelines['content'].run(
+            context, n, exclude_rows=context['seed_rows'], exclude=self._exclusion_mask(user_id)
+        )
 
-        # Apply category boost
-        source_category = self.product_index[product_idx].get('category')
-        if source_category:
-            for idx, product in self.product_index.items():
-                if product.get('category') == source_category and idx != product_idx:
-                    similarities[idx] += category_boost
-
-        # Get top N (excluding self)
-        top_indices = np.argsort(similarities)[::-1]
-        recommendations = []
-
-        for idx in top_indices:
-            if idx == product_idx:
-                continue
-
-            product = self.product_index[idx]
-            recommendations.append({
-                'id': product['id'],
-                'name': product['name'],
-                'category': product.get('category'),
-                'price': product.get('price'),
-                'score': float(similarities[idx]),
-                'reason': 'Similar to your viewed product'
-            })
-
-            if len(recommendations) >= n:
-                break
-
-        return recommendations
+        return self._format_recommendations(rows, scores, 'Similar to your viewed product')
 
     def user_based_recommendations(
         self,
         user_id: str,
-        user_history: List[str],
+        user_history: Optional[List[str]] = None,
         n: int = 10
     ) -> List[Dict]:
         """
         Get recommendations based on user's interaction history
 
+        When no history is supplied, the user's stored profile is used instead.
+
         Args:
             user_id: User identifier
-            user_history: List of product IDs user interacted with
+            user_history: Optional list of product IDs user interacted with
             n: Number of recommendations
 
         Returns:
             List of recommended products
         """
-        if not user_history:
-            # Return popular products for cold start
-            return self._get_popular_products(n)
-
-        # Get embeddings of products user interacted with
-        user_product_indices = []
-        for product_id in user_history:
-            for idx, product in self.product_index.items():
-                if product['id'] == product_id:
-                    user_product_indices.append(idx)
-                    break
-
-        if not user_product_indices:
-            return self._get_popular_products(n)
-
-        # Average embeddings to create user profile
-        user_profile = self.product_embeddings[user_product_indices].mean(axis=0)
-
-        # Find similar products
-        similarities = cosine_similarity(
-            user_profile.reshape(1, -1),
-            self.product_embeddings
-        )[0]
+        if user_history:
+            # Get embeddings of products user interacted with
+            user_product_indices = np.array([
+                self.product_rows[product_id]
+                for product_id in user_history
+                if product_id in self.product_rows
+            ], dtype=np.int32)
+
+            if len(user_product_indices) == 0:
+                return self._get_popular_products(n, user_id)
+
+            # Average embeddings to create user profile
+            user_profile = self.product_embeddings[user_product_indices].mean(axis=0)
+        else:
+            profile = self.profile_store.get(user_id) if self.profile_store and user_id else None
+            if profile is None or profile.weight <= 0:
+                # Return popular products for cold start
+                return self._get_popular_products(n, user_id)
+
+            user_profile = profile.profile_vector()
+            user_product_indices = profile.recent_items()
+
+        context = {
+            'seed_rows': user_product_indices,
+            'query': user_profile / max(np.linalg.norm(user_profile), 1e-12),
+        }
 
         # Exclude products user already interacted with
-        for idx in user_product_indices:
-            similarities[idx] = -1
-
-        # Get top N
-        top_indices = np.argsort(similarities)[::-1][:n]
-
-        recommendations = []
-        for idx in top_indices:
-            product = self.product_index[idx]
-            recommendations.append({
-                'id': product['id'],
-                'name': product['name'],
-                'category': product.get('category'),
-                'price': product.get('price'),
-                'score': float(similarities[idx]),
-                'reason': 'Based on your browsing history'
-            })
+        rows, scores = self.pipelines['collaborative'].run(
+            context, n, exclude_rows=user_product_indices, exclude=self._exclusion_mask(user_id)
+        )
 
-        return recommendations
+        return self._format_recommendations(rows, scores, 'Based on your browsing history')
 
     def ayurveda_recommendations(
         self,
         dosha_type: str,
         health_goal: Optional[str] = None,
-        n: int = 10
+        n: int = 10,
+        user_id: Optional[str] = None
     ) -> List[Dict]:
         """
         Get Ayurveda-specific recommendations based on Dosha and health goals
@@ -188,51 +262,117 @@ class ProductRecommender:
             dosha_type: Primary dosha (VATA, PITTA, KAPHA)
             health_goal: Specific health goal (immunity, digestion, etc.)
             n: Number of recommendations
+            user_id: Optional user whose purchased/dismissed products are excluded
 
         Returns:
             List of recommended products
         """
-        recommendations = []
+        context = {'dosha_type': dosha_type, 'health_goal': health_goal}
 
-        # Filter products by dosha compatibility
-        for idx, product in self.product_index.items():
-            score = 0.5  # Base score
-
-            # Dosha matching
-            product_dosha = product.get('dosha_type', '')
-            if dosha_type.upper() in product_dosha.upper():
-                score += 0.3
-
-            # Health goal matching
-            if health_goal:
-                benefits = product.get('benefits', [])
-                if isinstance(benefits, list):
-                    for benefit in benefits:
-                        if health_goal.lower() in benefit.lower():
-                            score += 0.2
-                            break
-
-            # Ingredient quality
-            ingredients = product.get('ingredients', [])
-            if isinstance(ingredients, list) and len(ingredients) > 0:
-                score += 0.1 * min(len(ingredients) / 5, 1)  # Bonus for multiple ingredients
-
-            if score > 0.5:  # Only include relevant products
-                recommendations.append({
-                    'id': product['id'],
-                    'name': product['name'],
-                    'category': product.get('category'),
-                    'price': product.get('price'),
-                    'score': score,
-                    'reason': f'Recommended for {dosha_type} dosha',
-                    'dosha_type': product.get('dosha_type'),
-                    'benefits': product.get('benefits', [])
-                })
-
-        # Sort by score
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
+        # Only include relevant products (above the 0.5 base score)
+        rows, scores = self.pipelines['ayurveda'].run(
+            context, n, min_score=0.5, exclude=self._exclusion_mask(user_id)
+        )
 
-        return recommendations[:n]
+        recommendations = self._format_recommendations(rows, scores, f'Recommended for {dosha_type} dosha')
+        for rec, row in zip(recommendations, rows):
+            product = self.product_index[int(row)]
+            rec['dosha_type'] = product.get('dosha_type')
+            rec['benefits'] = product.get('benefits', [])
+
+        return recommendations
+
+    def get_pipeline_stats(self) -> Dict:
+        """Per-pipeline stage latencies and candidate counts"""
+        return {name: pipeline.stats() for name, pipeline in self.pipelines.items()}
+
+    def update_popularity(self, product_scores: Dict[str, float]):
+        """
+        Replace popularity scores used for cold start and candidate generation
+
+        Args:
+            product_scores: Product ID -> popularity (e.g. recent sales or views)
+        """
+        popularity = np.zeros(len(self.product_rows))
+        for product_id, score in product_scores.items():
+            if product_id in self.product_rows:
+                popularity[self.product_rows[product_id]] = score
+        self.popularity.update(popularity)
+
+    def set_co_purchase_table(self, table: Dict[str, List[str]]):
+        """
+        Replace the co-purchase candidate table
+
+        Args:
+            table: Product ID -> IDs of products bought together with it, best first
+        """
+        self.co_purchase.set_table({
+            self.product_rows[product_id]: np.array(
+                [self.product_rows[other] for other in others if other in self.product_rows],
+                dtype=np.int32
+            )
+            for product_id, others in table.items()
+            if product_id in self.product_rows
+        })
+
+    def _exclusion_mask(self, user_id: Optional[str]):
+        """Vectorized exclusion test for the user's purchased/dismissed products, if any"""
+        if self.exclusion_store is None or not user_id or user_id not in self.exclusion_store:
+            return None
+        return lambda rows: self.exclusion_store.excluded(user_id, self.exclusion_positions[rows])
+
+    def _rerank_similarity(self, candidates: np.ndarray, context: Dict) -> np.ndarray:
+        """Cosine similarity to the query vector, plus an optional same-category boost"""
+        scores = self.normalized_embeddings[candidates] @ context['query']
+
+        category_code = context.get('category_code', -1)
+        if category_code >= 0 and context.get('category_boost'):
+            scores = scores + context['category_boost'] * (self.category_codes[candidates] == category_code)
+
+        return scores
+
+    def _rerank_ayurveda(self, candidates: np.ndarray, context: Dict) -> np.ndarray:
+        """Rule-based dosha, health goal and ingredient score"""
+        scores = 0.5 + self.ingredient_bonus[candidates]  # Base score plus ingredient quality
+        scores = scores + 0.3 * self._dosha_mask(context['dosha_type'])[candidates]
+
+        if context.get('health_goal'):
+            scores = scores + 0.2 * self._goal_mask(context['health_goal'])[candidates]
+
+        return scores
+
+    def _dosha_mask(self, dosha_type: str) -> np.ndarray:
+        """Products whose dosha_type mentions the dosha (cached per dosha)"""
+        key = dosha_type.upper()
+        mask = self._dosha_masks.get(key)
+        if mask is None:
+            mask = np.array([key in dosha for dosha in self._dosha_strings], dtype=bool)
+            self._dosha_masks[key] = mask
+        return mask
+
+    def _goal_mask(self, health_goal: str) -> np.ndarray:
+        """Products with a benefit mentioning the health goal (cached per goal)"""
+        key = health_goal.lower()
+        mask = self._goal_masks.get(key)
+        if mask is None:
+            mask = np.array([any(key in b for b in benefits) for benefits in self._benefit_strings], dtype=bool)
+            self._goal_masks[key] = mask
+        return mask
+
+    def _format_recommendations(self, rows: np.ndarray, scores: np.ndarray, reason: str) -> List[Dict]:
+        """Build recommendation dicts for ranked item rows"""
+        recommendations = []
+        for idx, score in zip(rows, scores):
+            product = self.product_index[int(idx)]
+            recommendations.append({
+                'id': product['id'],
+                'name': product['name'],
+                'category': product.get('category'),
+                'price': product.get('price'),
+                'score': float(score),
+                'reason': reason
+            })
+        return recommendations
 
     def hybrid_recommendations(
         self,
@@ -241,11 +381,16 @@ class ProductRecommender:
         current_product_id: Optional[str] = None,
         dosha_type: Optional[str] = None,
         health_goal: Optional[str] = None,
-        n: int = 10
+        n: int = 10,
+        deadline_ms: Optional[float] = None
     ) -> List[Dict]:
         """
         Hybrid recommendations combining multiple strategies
 
+        Strategies run concurrently on the shared executor. Results from
+        strategies that miss the deadline are dropped and the response is
+        merged from whichever finished in time.
+
         Args:
             user_id: User identifier
             user_history: User's product interaction history
@@ -253,56 +398,58 @@ class ProductRecommender:
             dosha_type: User's primary dosha
             health_goal: User's health goal
             n: Number of recommendations
+            deadline_ms: Time budget for the request (defaults to self.deadline_ms)
 
         Returns:
             List of recommended products with combined scores
         """
-        all_recommendations = {}
+        strategies = []
 
         # Content-based (if viewing a product)
         if current_product_id:
-            try:
-                content_recs = self.content_based_recommendations(current_product_id, n=n)
-                for rec in content_recs:
-                    product_id = rec['id']
-                    if product_id not in all_recommendations:
-                        all_recommendations[product_id] = rec
-                        all_recommendations[product_id]['sources'] = ['content']
-                    else:
-                        all_recommendations[product_id]['score'] += rec['score'] * 0.3
-                        all_recommendations[product_id]['sources'].append('content')
-            except Exception as e:
-                logger.warning(f"Content-based recommendations failed: {e}")
+            strategies.append(('content', self.content_based_recommendations, (current_product_id, n, 0.2, user_id)))
 
-        # User-based (if have history)
-        if user_history and len(user_history) > 0:
-            try:
-                user_recs = self.user_based_recommendations(user_id, user_history, n=n)
-                for rec in user_recs:
-                    product_id = rec['id']
-                    if product_id not in all_recommendations:
-                        all_recommendations[product_id] = rec
-                        all_recommendations[product_id]['sources'] = ['collaborative']
-                    else:
-                        all_recommendations[product_id]['score'] += rec['score'] * 0.4
-                        all_recommendations[product_id]['sources'].append('collaborative')
-            except Exception as e:
-                logger.warning(f"User-based recommendations failed: {e}")
+        # User-based (if have history or a stored profile)
+        if user_history or self.has_profile(user_id):
+            strategies.append(('collaborative', self.user_based_recommendations, (user_id, user_history, n)))
 
         # Ayurveda-based (if have dosha)
         if dosha_type:
+            strategies.append(('ayurveda', self.ayurveda_recommendations, (dosha_type, health_goal, n, user_id)))
+
+        deadline_ms = self.deadline_ms if deadline_ms is None else deadline_ms
+        for name, _, _ in strategies:
+            self._record_strategy_stat(name, 'calls')
+
+        futures = [
+            (name, self._executor.submit(self._run_strategy, name, func, *args))
+            for name, func, args in strategies
+        ]
+        wait([future for _, future in futures], timeout=deadline_ms / 1000.0)
+
+        # Merge in a fixed strategy order so results don't depend on completion order
+        all_recommendations = {}
+        for name, future in futures:
+            if not future.done():
+                future.cancel()
+                self._record_strategy_stat(name, 'timeouts')
+                logger.warning(f"{name} recommendations missed the {deadline_ms:.0f}ms deadline")
+                continue
+
             try:
-                ayurveda_recs = self.ayurveda_recommendations(dosha_type, health_goal, n=n)
-                for rec in ayurveda_recs:
-                    product_id = rec['id']
-                    if product_id not in all_recommendations:
-                        all_recommendations[product_id] = rec
-                        all_recommendations[product_id]['sources'] = ['ayurveda']
-                    else:
-                        all_recommendations[product_id]['score'] += rec['score'] * 0.3
-                        all_recommendations[product_id]['sources'].append('ayurveda')
+                recs = future.result()
             except Exception as e:
-                logger.warning(f"Ayurveda recommendations failed: {e}")
+                logger.warning(f"{name} recommendations failed: {e}")
+                continue
+
+            for rec in recs:
+                product_id = rec['id']
+                if product_id not in all_recommendations:
+                    all_recommendations[product_id] = rec
+                    all_recommendations[product_id]['sources'] = [name]
+                else:
+                    all_recommendations[product_id]['score'] += rec['score'] * STRATEGY_MERGE_WEIGHTS[name]
+                    all_recommendations[product_id]['sources'].append(name)
 
         # Sort by combined score
         recommendations = list(all_recommendations.values())
@@ -310,19 +457,91 @@ class ProductRecommender:
 
         return recommendations[:n]
 
-    def _get_popular_products(self, n: int = 10) -> List[Dict]:
+    def get_strategy_stats(self) -> Dict:
+        """Per-strategy call, timeout and latency counters for hybrid requests"""
+        with self._stats_lock:
+            return {
+                name: {
+                    **stats,
+                    'total_ms': round(stats['total_ms'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'avg_ms': round(stats['total_ms'] / stats['completed'], 2) if stats['completed'] else 0.0,
+                }
+                for name, stats in self._strategy_stats.items()
+            }
+
+    def _run_strategy(self, name: str, func, *args) -> List[Dict]:
+        """Run one strategy on the executor and record its timing"""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            self._record_strategy_stat(name, 'errors')
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                stats = self._strategy_stats[name]
+                stats['completed'] += 1
+                stats['total_ms'] += elapsed_ms
+                stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def _record_strategy_stat(self, name: str, counter: str):
+        """Increment a per-strategy counter"""
+        with self._stats_lock:
+            self._strategy_stats[name][counter] += 1
+
+    def record_interaction(
+        self,
+        user_id: str,
+        product_id: str,
+        event_type: str = 'view',
+        timestamp: Optional[float] = None
+    ):
+        """
+        Update the user's stored profile and exclusions from an interaction event
+
+        Args:
+            user_id: User identifier
+            product_id: Product the user interacted with
+            event_type: Interaction type (view, wishlist, add_to_cart, purchase, dismiss)
+            timestamp: Unix timestamp of the event (defaults to now)
+        """
+        if event_type not in EVENT_WEIGHTS and event_type not in EXCLUSION_EVENTS:
+            raise ValueError(f"Invalid event type: {event_type}")
+
+        product_idx = self.product_rows.get(product_id)
+        if product_idx is None:
+            raise ValueError(f"Product {product_id} not found")
+
+        if event_type in EXCLUSION_EVENTS and self.exclusion_store is not None:
+            self.exclusion_store.add(user_id, self.exclusion_positions[product_idx])
+
+        if event_type not in EVENT_WEIGHTS:
+            return
+
+        if self.profile_store is None:
+            raise ValueError("No profile store configured")
+
+        self.profile_store.record_interaction(
+            user_id,
+            product_idx,
+            self.product_embeddings[product_idx],
+            weight=EVENT_WEIGHTS[event_type],
+            timestamp=timestamp
+        )
+
+    def has_profile(self, user_id: Optional[str]) -> bool:
+        """Check whether a stored profile exists for the user"""
+        return bool(user_id) and self.profile_store is not None and user_id in self.profile_store
+
+    def _get_popular_products(self, n: int = 10, user_id: Optional[str] = None) -> List[Dict]:
         """Get popular products (fallback for cold start)"""
-        # For now, return first N products
-        # In production, this would be based on sales/views data
-        recommendations = []
-        for idx in range(min(n, len(self.product_index))):
-            product = self.product_index[idx]
-            recommendations.append({
-                'id': product['id'],
-                'name': product['name'],
-                'category': product.get('category'),
-                'price': product.get('price'),
-                'score': 0.5,
-                'reason': 'Popular product'
-            })
-        return recommendations
+        exclude = self._exclusion_mask(user_id)
+        if exclude is None:
+            rows = self.popularity.generate({}, n)
+        else:
+            # Over-fetch so excluded products can be dropped
+            rows = self.popularity.generate({}, 4 * n + 64)
+            rows = rows[~exclude(rows)][:n]
+        return self._format_recommendations(rows, np.full(len(rows), 0.5), 'Popular product')
@@ -14,19 +14,22 @@ logger = logging.getLogger(__name__)
 class SemanticSearchEngine:
     """Vector-based semantic search using FAISS"""
 
-    def __init__(self, embedding_service, embedding_dim: int = 384):
+    def __init__(self, embedding_service, embedding_dim: int = 384, exclusion_store=None):
         """
         Initialize search engine
 
         Args:
             embedding_service: EmbeddingService instance
             embedding_dim: Dimension of embeddings
+            exclusion_store: Optional ExclusionStore of purchased/dismissed products
         """
         self.embedding_service = embedding_service
         self.embedding_dim = embedding_dim
         self.index = None
         self.product_index = None
         self.products = None
+        self.exclusion_store = exclusion_store
+        self.exclusion_positions = None
 
     def build_index(self, products: List[Dict], embeddings: np.ndarray):
         """
@@ -49,6 +52,9 @@ class SemanticSearchEngine:
         self.products = products
         self.product_index = {i: product for i, product in enumerate(products)}
 
+        if self.exclusion_store is not None:
+            self.exclusion_positions = self.exclusion_store.item_positions([p['id'] for p in products])
+
         logger.info(f"FAISS index built successfully with {self.index.ntotal} vectors")
 
     def search(
@@ -235,7 +241,8 @@ class SemanticSearchEngine:
         self,
         product_id: str,
         k: int = 10,
-        category_boost: float = 0.1
+        category_boost: float = 0.1,
+        user_id: Optional[str] = None
     ) -> List[Dict]:
         """
         Find products similar to a given product
@@ -244,6 +251,7 @@ class SemanticSearchEngine:
             product_id: Source product ID
             k: Number of similar products to return
             category_boost: Boost for same-category products
+            user_id: Optional user whose purchased/dismissed products are excluded
 
         Returns:
             List of similar products
@@ -262,15 +270,24 @@ class SemanticSearchEngine:
         product_embedding = self.index.reconstruct(source_idx)
         product_embedding = product_embedding.reshape(1, -1)
 
-        # Search for similar products
-        scores, indices = self.index.search(product_embedding, k + 1)  # +1 to exclude self
+        apply_exclusions = (
+            self.exclusion_store is not None and user_id is not None and user_id in self.exclusion_store
+        )
+
+        # Search for similar products (+1 to exclude self, more if some will be filtered)
+        scores, indices = self.index.search(product_embedding, 2 * k + 1 if apply_exclusions else k + 1)
+
+        if apply_exclusions:
+            found = indices[0] >= 0
+            keep = ~self.exclusion_store.excluded(user_id, self.exclusion_positions[indices[0][found]])
+            scores, indices = scores[:, found][:, keep], indices[:, found][:, keep]
 
         # Format results
         results = []
         source_category = self.product_index[source_idx].get('category')
 
         for score, idx in zip(scores[0], indices[0]):
-            if int(idx) == source_idx:  # Skip source product
+            if int(idx) == source_idx or idx == -1:  # Skip source product and empty results
                 continue
 
             product = self.product_index[int(idx)]
@@ -0,0 +1,271 @@
+"""
+User Profile Store
+Bounded in-memory store of incrementally updated, time-weighted user profiles
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each interaction type in the running profile
+EVENT_WEIGHTS = {
+    'view': 1.0,
+    'wishlist': 1.5,
+    'add_to_cart': 2.0,
+    'purchase': 3.0,
+}
+
+
+class UserProfile:
+    """Running profile vector and recent-history ring buffer for a single user"""
+
+    __slots__ = ('vector', 'weight', 'updated_at', 'history', 'history_pos', 'history_len')
+
+    def __init__(self, embedding_dim: int, history_size: int):
+        self.vector = np.zeros(embedding_dim, dtype=np.float32)  # Decayed weighted sum of embeddings
+        self.weight = 0.0  # Decayed sum of interaction weights
+        self.updated_at = 0.0  # Unix timestamp of the newest interaction
+        self.history = np.full(history_size, -1, dtype=np.int32)  # Item rows, ring buffer
+        self.history_pos = 0
+        self.history_len = 0
+
+    def profile_vector(self) -> np.ndarray:
+        """Time-weighted mean embedding of the user's interactions"""
+        if self.weight <= 0:
+            return self.vector
+        return self.vector / self.weight
+
+    def recent_items(self) -> np.ndarray:
+        """Item rows of the most recent interactions, newest first"""
+        size = len(self.history)
+        order = (self.history_pos - 1 - np.arange(self.history_len)) % size
+        return self.history[order]
+
+    def push_item(self, item_row: int):
+        """Append an item row to the ring buffer, overwriting the oldest entry"""
+        self.history[self.history_pos] = item_row
+        self.history_pos = (self.history_pos + 1) % len(self.history)
+        self.history_len = min(self.history_len + 1, len(self.history))
+
+
+class UserProfileStore:
+    """LRU-bounded store of user profiles updated from interaction events"""
+
+    def __init__(
+        self,
+        embedding_dim: int,
+        capacity: int = 100_000,
+        history_size: int = 20,
+        half_life_days: float = 30.0,
+        snapshot_path: Optional[str] = None
+    ):
+        """
+        Initialize profile store
+
+        Args:
+            embedding_dim: Dimension of the product embeddings
+            capacity: Maximum number of profiles kept in memory
+            history_size: Length of each user's recent-history ring buffer
+            half_life_days: Half-life of an interaction's weight in the profile
+            snapshot_path: Optional .npz file used by save_snapshot/load_snapshot
+        """
+        self.embedding_dim = embedding_dim
+        self.capacity = capacity
+        self.history_size = history_size
+        self.half_life_seconds = half_life_days * 86400.0
+        self.snapshot_path = snapshot_path
+
+        self._profiles: 'OrderedDict[str, UserProfile]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._profiles
+
+    def record_interaction(
+        self,
+        user_id: str,
+        item_row: int,
+        embedding: np.ndarray,
+        weight: float = 1.0,
+        timestamp: Optional[float] = None
+    ):
+        """
+        Fold a single interaction into the user's profile
+
+        Args:
+            user_id: User identifier
+            item_row: Catalog row of the product interacted with
+            embedding: Embedding of that product
+            weight: Interaction weight (see EVENT_WEIGHTS)
+            timestamp: Unix timestamp of the interaction (defaults to now)
+        """
+        timestamp = time.time() if timestamp is None else float(timestamp)
+
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                profile = UserProfile(self.embedding_dim, self.history_size)
+                self._profiles[user_id] = profile
+                if len(self._profiles) > self.capacity:
+                    self._profiles.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._profiles.move_to_end(user_id)
+
+            if timestamp >= profile.updated_at:
+                # Decay the existing profile up to the new event
+                decay = self._decay(timestamp - profile.updated_at) if profile.weight > 0 else 1.0
+                profile.vector *= decay
+                profile.weight *= decay
+                profile.updated_at = timestamp
+            else:
+                # Late event: discount it instead of the profile
+                weight *= self._decay(profile.updated_at - timestamp)
+
+            profile.vector += weight * np.asarray(embedding, dtype=np.float32)
+            profile.weight += weight
+            profile.push_item(item_row)
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        """Get a user's profile, marking it as recently used"""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None:
+                self._profiles.move_to_end(user_id)
+            return profile
+
+    def user_ids(self) -> List[str]:
+        """IDs of all stored users, least recently used first"""
+        with self._lock:
+            return list(self._profiles.keys())
+
+    def remove(self, user_id: str):
+        """Drop a user's profile"""
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        """Store size and memory statistics"""
+        bytes_per_profile = self.embedding_dim * 4 + self.history_size * 4
+        return {
+            'profiles': len(self._profiles),
+            'capacity': self.capacity,
+            'evictions': self.evictions,
+            'history_size': self.history_size,
+            'half_life_days': self.half_life_seconds / 86400.0,
+            'approx_memory_mb': round(len(self._profiles) * bytes_per_profile / 1e6, 2),
+        }
+
+    def save_snapshot(self, path: Optional[str] = None):
+        """
+        Write all profiles to a compressed .npz snapshot
+
+        History rows refer to the catalog order at the time of writing, so a
+        snapshot should only be loaded against the same catalog.
+        """
+        path = path or self.snapshot_path
+        if not path:
+            raise ValueError("No snapshot path configured")
+
+        with self._lock:
+            user_ids = list(self._profiles.keys())
+            profiles = list(self._profiles.values())
+
+        n = len(profiles)
+        vectors = np.zeros((n, self.embedding_dim), dtype=np.float32)
+        histories = np.full((n, self.history_size), -1, dtype=np.int32)
+        weights = np.zeros(n, dtype=np.float64)
+        updated_at = np.zeros(n, dtype=np.float64)
+        history_pos = np.zeros(n, dtype=np.int32)
+        history_len = np.zeros(n, dtype=np.int32)
+
+        for i, profile in enumerate(profiles):
+            vectors[i] = profile.vector
+            histories[i] = profile.history
+            weights[i] = profile.weight
+            updated_at[i] = profile.updated_at
+            history_pos[i] = profile.history_pos
+            history_len[i] = profile.history_len
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and swap it in so readers never see a partial snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                user_ids=np.array(user_ids, dtype=str),
+                vectors=vectors,
+                histories=histories,
+                weights=weights,
+                updated_at=updated_at,
+                history_pos=history_pos,
+                history_len=history_len,
+            )
+        os.replace(tmp_path, path)
+
+        logger.info(f"Saved {n} user profiles to {path}")
+
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        """
+        Load profiles from a snapshot written by save_snapshot
+
+        Returns:
+            Number of profiles loaded
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        vectors = arrays['vectors']
+        if vectors.shape[1] != self.embedding_dim:
+            raise ValueError(
+                f"Snapshot embedding dim {vectors.shape[1]} != {self.embedding_dim}"
+            )
+
+        user_ids = arrays['user_ids']
+        histories = arrays['histories']
+        history_size = min(self.history_size, histories.shape[1])
+        profiles = OrderedDict()
+
+        # Snapshots are written in LRU order, so keep the most recent users
+        for i in range(max(0, len(user_ids) - self.capacity), len(user_ids)):
+            profile = UserProfile(self.embedding_dim, self.history_size)
+            profile.vector[:] = vectors[i]
+            profile.weight = float(arrays['weights'][i])
+            profile.updated_at = float(arrays['updated_at'][i])
+
+            # Replay oldest to newest so the ring buffer keeps the newest rows
+            length = int(arrays['history_len'][i])
+            order = (int(arrays['history_pos'][i]) - 1 - np.arange(length)) % histories.shape[1]
+            for row in histories[i][order][:history_size][::-1]:
+                profile.push_item(int(row))
+
+            profiles[str(user_ids[i])] = profile
+
+        with self._lock:
+            self._profiles = profiles
+
+        logger.info(f"Loaded {len(profiles)} user profiles from {path}")
+        return len(profiles)
+
+    def _decay(self, elapsed_seconds: float) -> float:
+        """Exponential decay factor for the given elapsed time"""
+        if self.half_life_seconds <= 0:
+            return 1.0
+        return 0.5 ** (max(elapsed_seconds, 0.0) / self.half_life_seconds)
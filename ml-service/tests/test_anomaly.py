@@ -0,0 +1,39 @@
+"""Statistical anomaly detection: prior-window baseline and warmup"""
+
+import numpy as np
+import pandas as pd
+
+from models.anomaly import AnomalyDetector
+
+
+def metric_frame(values):
+    return pd.DataFrame({'date': pd.date_range('2024-01-01', periods=len(values)), 'value': values})
+
+
+def flagged_days(values, threshold=2.5):
+    anomalies = AnomalyDetector()._statistical_detection(metric_frame(values), 'value', threshold)
+    return [(pd.Timestamp(a['date']) - pd.Timestamp('2024-01-01')).days for a in anomalies]
+
+
+def test_spikes_pass_the_default_threshold():
+    rng = np.random.default_rng(0)
+    values = 100 + rng.normal(0, 5, 200)
+    values[[50, 120]] = [300, 20]
+
+    # A window containing the spike itself would cap |z| at 2.27 and flag nothing
+    assert {50, 120} <= set(flagged_days(values))
+
+
+def test_spike_in_the_first_window_is_flagged():
+    rng = np.random.default_rng(1)
+    values = 100 + rng.normal(0, 5, 90)
+    values[3] = 250
+
+    assert 3 in flagged_days(values)
+
+
+def test_quiet_series_has_few_flags():
+    rng = np.random.default_rng(2)
+    values = 100 + rng.normal(0, 5, 365)
+
+    assert len(flagged_days(values, threshold=4.0)) <= 3
@@ -0,0 +1,68 @@
+"""Streaming detector behaviour on steady, seasonal and outage traffic"""
+
+import numpy as np
+import pandas as pd
+
+from models.anomaly_stream import StreamingAnomalyDetector
+
+
+def feed(detector, values, start='2024-01-01', metric='checkouts'):
+    timestamps = pd.date_range(start, periods=len(values), freq='h')
+    return [detector.observe(metric, value, ts) for value, ts in zip(values, timestamps)]
+
+
+def steady(hours, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 + 10 * np.sin(np.arange(hours) * 2 * np.pi / 24) + rng.normal(0, 2, hours)
+
+
+def test_steady_traffic_raises_few_false_alarms():
+    detector = StreamingAnomalyDetector()
+    results = feed(detector, steady(24 * 28))
+
+    assert sum(r is not None for r in results) <= 10
+
+
+def test_sustained_outage_stays_flagged_until_recovery():
+    detector = StreamingAnomalyDetector()
+    history = steady(24 * 14)
+    outage = np.zeros(12)
+    recovery = steady(24, seed=1)
+    results = feed(detector, np.concatenate([history, outage, recovery]))
+
+    during = results[len(history):len(history) + len(outage)]
+    after = results[len(history) + len(outage):]
+    assert all(r is not None for r in during)
+    assert min(r['anomaly_score'] for r in during) > 10
+    assert sum(r is not None for r in after) <= 1
+    assert detector.state('checkouts')['anomaly_run'] == 0
+
+
+def test_outage_does_not_pull_the_baseline_down():
+    detector = StreamingAnomalyDetector()
+    feed(detector, steady(24 * 14))
+    before = detector.state('checkouts')
+    feed(detector, np.zeros(6), start='2024-01-15')
+    after = detector.state('checkouts')
+
+    assert after['ewma'] == before['ewma']
+    assert after['error_std'] == before['error_std']
+    assert after['anomaly_run'] == 6
+
+
+def test_permanent_shift_is_relearned():
+    detector = StreamingAnomalyDetector(relearn_after=24)
+    history = steady(24 * 14)
+    shifted = steady(24 * 4, seed=2) + 200
+    results = feed(detector, np.concatenate([history, shifted]))
+
+    tail = results[len(history) + 24 + detector.warmup + 24:]
+    assert all(r is not None for r in results[len(history):len(history) + 24])
+    assert sum(r is not None for r in tail) <= 2
+
+
+def test_flat_metric_dropping_to_zero_is_flagged():
+    detector = StreamingAnomalyDetector()
+    results = feed(detector, np.concatenate([np.ones(48), [0.0, 0.0]]), metric='success_rate')
+
+    assert results[-2] is not None and results[-1] is not None
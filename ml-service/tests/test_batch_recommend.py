@@ -0,0 +1,54 @@
+"""Bulk recommendation input files: block-wise reading and content-addressed uploads"""
+
+import json
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from models.batch_recommend import read_users, save_user_input
+
+
+USERS = [
+    {'user_id': 'u1', 'history': ['p1', 'p2']},
+    {'user_id': 'u2', 'history': []},
+    {'user_id': 'u3', 'history': ['p3']},
+]
+
+
+def test_read_users_streams_ndjson(tmp_path):
+    path = tmp_path / 'users.ndjson'
+    path.write_text('\n'.join(json.dumps(user) for user in USERS) + '\n\n')
+
+    assert list(read_users(str(path))) == USERS
+
+
+def test_read_users_reads_parquet_in_batches(tmp_path):
+    path = tmp_path / 'users.parquet'
+    pq.write_table(pa.Table.from_pylist(USERS), path, row_group_size=1)
+
+    users = read_users(str(path), block_size=2)
+    assert next(users) == USERS[0]
+    assert list(users) == USERS[1:]
+
+
+def test_read_users_rejects_missing_user_id_and_unknown_formats(tmp_path):
+    path = tmp_path / 'users.ndjson'
+    path.write_text(json.dumps({'history': ['p1']}) + '\n')
+    with pytest.raises(ValueError, match='line 1'):
+        list(read_users(str(path)))
+
+    with pytest.raises(ValueError):
+        list(read_users(str(tmp_path / 'users.csv')))
+
+
+def test_save_user_input_is_content_addressed(tmp_path):
+    lines = [json.dumps(user).encode() + b'\n' for user in USERS]
+
+    first = save_user_input(iter(lines), str(tmp_path))
+    second = save_user_input(iter(lines), str(tmp_path))
+    other = save_user_input(iter(lines[:1]), str(tmp_path))
+
+    assert first == second != other
+    assert sorted(os.listdir(tmp_path)) == sorted({first, other})
+    assert list(read_users(str(tmp_path / first))) == USERS
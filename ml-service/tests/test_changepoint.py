@@ -0,0 +1,80 @@
+"""PELT changepoints on trended, shifted, spiky and long series"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.anomaly import AnomalyDetector, generate_mock_metrics_data
+from models.changepoint import describe_changepoints, pelt
+
+
+def daily_frame(values):
+    return pd.DataFrame({'date': pd.date_range('2024-01-01', periods=len(values), freq='D'), 'value': values})
+
+
+def trended(days=90, seed=0, slope=50.0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    return 25000 + slope * t + 3000 * np.sin(t * 2 * np.pi / 7) + rng.normal(0, 1000, days)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_trend_without_shifts_has_no_changepoints(seed):
+    assert AnomalyDetector().detect_changepoints(daily_frame(trended(seed=seed))) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_mock_metrics_with_trend_and_spikes_have_no_changepoints(seed):
+    np.random.seed(seed)
+    data = generate_mock_metrics_data(90).rename(columns={'revenue': 'value'})[['date', 'value']]
+
+    assert AnomalyDetector().detect_changepoints(data) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_level_shift_on_a_trend_is_found(seed):
+    values = trended(seed=seed)
+    values[45:] += 6000
+    shifts = AnomalyDetector().detect_changepoints(daily_frame(values))
+
+    assert len(shifts) == 1
+    assert abs(shifts[0]['index'] - 45) <= 2
+    assert shifts[0]['direction'] == 'up'
+    assert 4000 < shifts[0]['level_after'] - shifts[0]['level_before'] < 8000
+
+
+def test_change_of_slope_is_not_reported_as_a_shift():
+    t = np.arange(120)
+    values = 1000 + np.where(t < 60, 5 * t, 300 + 20 * (t - 60)) + np.random.default_rng(0).normal(0, 20, 120)
+    changepoints = pelt(values, min_size=7)
+    shifts = describe_changepoints(daily_frame(values)['date'], values, changepoints, min_shift=1.0)
+
+    assert all(abs(s['shift_sigmas']) < 3 for s in shifts)
+
+
+def test_hourly_series_with_daily_cycle_and_trend():
+    rng = np.random.default_rng(0)
+    hours = np.arange(24 * 120)
+    values = 1000 + 0.5 * hours + 300 * np.sin(hours * 2 * np.pi / 24) + rng.normal(0, 30, len(hours))
+    values[24 * 60:] -= 400
+    changepoints = pelt(values, min_size=24, season_length=24)
+
+    assert len(changepoints) == 1
+    assert abs(changepoints[0] - 24 * 60) <= 24
+
+
+def test_capped_search_matches_exact_on_stationary_data():
+    rng = np.random.default_rng(1)
+    values = 100 + rng.normal(0, 5, 3000)
+    values[1500:] += 20
+
+    capped = pelt(values, min_size=24, max_candidates=64)
+    exact = pelt(values, min_size=24, max_candidates=None)
+    assert np.array_equal(capped, exact)
+    assert len(capped) == 1
+
+
+def test_mean_cost_still_available():
+    values = np.concatenate([np.full(50, 10.0), np.full(50, 20.0)]) + np.random.default_rng(2).normal(0, 1, 100)
+
+    assert pelt(values, trend=False).tolist() == [50]
@@ -0,0 +1,88 @@
+"""Exclusion filters: membership, eviction to the snapshot and reload on lookup"""
+
+import logging
+
+import numpy as np
+
+from models.exclusions import ExclusionStore
+
+
+PRODUCTS = [f"P{i:04d}" for i in range(200)]
+
+
+def make_store(tmp_path=None, max_memory_mb=None):
+    # Two 128-byte first layers fit under the cap, a third does not
+    return ExclusionStore(
+        bits_per_user=1024,
+        max_memory_mb=max_memory_mb,
+        snapshot_path=str(tmp_path / 'exclusions.npz') if tmp_path else None,
+    )
+
+
+def test_added_products_are_excluded():
+    store = make_store()
+    positions = store.item_positions(PRODUCTS)
+    store.add('u1', positions[:5])
+
+    mask = store.excluded('u1', positions)
+    assert mask[:5].all()
+    assert mask.sum() < 10
+    assert not store.excluded('u2', positions).any()
+
+
+def test_evicted_users_are_reloaded_from_the_snapshot(tmp_path):
+    store = make_store(tmp_path, max_memory_mb=300e-6)
+    positions = store.item_positions(PRODUCTS)
+    for i in range(3):
+        store.add(f"u{i}", positions[10 * i:10 * i + 5])
+
+    report = store.memory_report()
+    assert report['users'] < 3 and report['spilled_users'] >= 1
+    assert report['dropped_users'] == 0
+    assert (tmp_path / 'exclusions.npz').exists()
+    assert len(store) == 3 and 'u0' in store
+
+    # Every user's exclusions still hold, evicted or not
+    for i in range(3):
+        assert store.excluded(f"u{i}", positions)[10 * i:10 * i + 5].all()
+    matrix = store.excluded_matrix(['u0', 'u1', 'u2'], positions)
+    for i in range(3):
+        assert matrix[i, 10 * i:10 * i + 5].all()
+
+
+def test_adding_to_an_evicted_user_keeps_earlier_exclusions(tmp_path):
+    store = make_store(tmp_path, max_memory_mb=300e-6)
+    positions = store.item_positions(PRODUCTS)
+    store.add('u0', positions[:5])
+    store.add('u1', positions[10:15])
+    store.add('u2', positions[20:25])
+    assert 'u0' not in store._users
+
+    store.add('u0', positions[5:8])
+    assert store.excluded('u0', positions)[:8].all()
+
+
+def test_eviction_without_snapshot_is_reported(caplog):
+    store = make_store(max_memory_mb=300e-6)
+    positions = store.item_positions(PRODUCTS)
+    with caplog.at_level(logging.WARNING, logger='models.exclusions'):
+        for i in range(3):
+            store.add(f"u{i}", positions[10 * i:10 * i + 5])
+
+    assert store.memory_report()['dropped_users'] == 1
+    assert 'may be recommended again' in caplog.text
+
+
+def test_snapshot_round_trip_merges_with_disk(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    positions = first.item_positions(PRODUCTS)
+    first.add('u1', positions[:3])
+    second.add('u1', positions[3:6])
+    second.add('u2', positions[6:9])
+    first.save_snapshot()
+    second.save_snapshot()
+
+    restored = make_store(tmp_path)
+    assert restored.load_snapshot() == 2
+    assert restored.excluded('u1', positions)[:6].all()
+    assert np.flatnonzero(restored.excluded('u2', positions))[:3].tolist() == [6, 7, 8]
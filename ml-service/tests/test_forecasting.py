@@ -0,0 +1,87 @@
+"""Forecast alignment and routing for series that end on different days"""
+
+import numpy as np
+import pandas as pd
+
+from models.forecast_router import CROSTON, HOLT_WINTERS, SIMPLE
+from models.forecasting import DemandForecaster, align_ends, series_matrix
+
+
+def daily(start, days, quantity):
+    dates = pd.date_range(start, periods=days, freq='D')
+    return pd.DataFrame({'date': dates, 'quantity': np.broadcast_to(quantity, days).astype(float)})
+
+
+def regular(start, days, seed=0):
+    rng = np.random.default_rng(seed)
+    return daily(start, days, 50 + 10 * np.sin(np.arange(days) * 2 * np.pi / 7) + rng.normal(0, 2, days))
+
+
+def test_series_matrix_leaves_days_after_last_record_missing():
+    product_ids, Y, calendar = series_matrix({
+        'early': daily('2024-01-01', 10, 5.0),
+        'late': daily('2024-01-01', 20, 5.0),
+    })
+
+    assert np.isnan(Y[0, 10:]).all()
+    assert not np.isnan(Y[0, :10]).any()
+    assert not np.isnan(Y[1]).any()
+
+
+def test_align_ends_returns_each_series_last_day():
+    _, Y, calendar = series_matrix({
+        'early': daily('2024-01-01', 10, 5.0),
+        'late': daily('2024-01-05', 20, 7.0),
+    })
+    aligned, last_dates = align_ends(Y, calendar)
+
+    assert list(last_dates.astype(str)) == ['2024-01-10', '2024-01-24']
+    assert (aligned[:, -1] == [5.0, 7.0]).all()
+    assert (~np.isnan(aligned)).sum(axis=1).tolist() == [10, 20]
+
+
+def test_short_series_routes_to_simple_average_in_a_long_batch():
+    forecaster = DemandForecaster()
+    results = forecaster.forecast_many({
+        'short': daily('2024-03-01', 5, 4.0),
+        'long': regular('2024-01-01', 90),
+    }, forecast_days=7)
+
+    assert results['short']['model'] == SIMPLE
+    assert results['long']['model'] == HOLT_WINTERS
+
+
+def test_series_ending_early_is_not_padded_into_intermittent_demand():
+    forecaster = DemandForecaster()
+    results = forecaster.forecast_many({
+        'ends_early': regular('2024-01-01', 60, seed=1),
+        'ends_late': regular('2024-01-01', 120, seed=2),
+    }, forecast_days=7)
+
+    early = results['ends_early']
+    assert early['model'] == HOLT_WINTERS
+    assert early['forecasts'][0]['date'].startswith('2024-03-01')
+    assert early['summary']['forecast_avg'] > 30
+    assert results['ends_late']['forecasts'][0]['date'].startswith('2024-04-30')
+
+
+def test_intermittent_series_still_routes_to_croston():
+    quantity = np.zeros(60)
+    quantity[::5] = 3.0
+    forecaster = DemandForecaster()
+    results = forecaster.forecast_many({
+        'sparse': daily('2024-01-01', 60, quantity),
+        'regular': regular('2024-01-01', 90),
+    }, forecast_days=7)
+
+    assert results['sparse']['model'] == CROSTON
+    assert results['sparse']['forecasts'][0]['date'].startswith('2024-03-01')
+
+
+def test_single_product_forecast_matches_batch():
+    history = regular('2024-01-01', 60, seed=3)
+    single = DemandForecaster().forecast_product_demand('p', history, forecast_days=7)
+    batch = DemandForecaster().forecast_many({'p': history, 'other': regular('2024-01-01', 120)}, forecast_days=7)['p']
+
+    assert [f['date'] for f in single['forecasts']] == [f['date'] for f in batch['forecasts']]
+    assert np.allclose([f['predicted'] for f in single['forecasts']], [f['predicted'] for f in batch['forecasts']])
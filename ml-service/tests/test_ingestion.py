@@ -0,0 +1,89 @@
+"""Incremental sales ingestion: overlap window and deduplication by ID"""
+
+import sqlite3
+
+import pytest
+
+from models.ingestion import SalesIngestor
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'shop.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT, total REAL, created_at TEXT);
+        CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER, product_id TEXT,
+                                  quantity INTEGER, created_at TEXT);
+    """)
+    conn.commit()
+    yield conn, f"sqlite:///{path}"
+    conn.close()
+
+
+def add_order(conn, order_id, created_at, quantity, product_id='SKU-1', status='PAID'):
+    conn.execute("INSERT INTO orders VALUES (?, ?, ?, ?)", (order_id, status, 10.0 * quantity, created_at))
+    conn.execute("INSERT INTO order_items VALUES (?, ?, ?, ?, ?)", (order_id, order_id, product_id, quantity, created_at))
+    conn.commit()
+
+
+def totals(ingestor):
+    history = ingestor.sku_history('SKU-1')
+    metrics = ingestor.metrics()
+    return history['quantity'].sum(), metrics['orders'].sum(), metrics['revenue'].sum()
+
+
+def test_late_commits_behind_the_watermark_are_ingested_once(database, tmp_path):
+    conn, url = database
+    ingestor = SalesIngestor(url, str(tmp_path / 'cache'), overlap_seconds=600)
+
+    add_order(conn, 1, '2024-03-01 10:00:00', 1)
+    add_order(conn, 3, '2024-03-01 10:05:00', 2)
+    ingestor.refresh()
+    assert totals(ingestor) == (3, 2, 30.0)
+
+    # Order 2 was created at 10:02 but its checkout committed after the refresh
+    add_order(conn, 2, '2024-03-01 10:02:00', 4)
+    result = ingestor.refresh()
+    assert result['order_lines_read'] == 1 and result['orders_read'] == 1
+    assert totals(ingestor) == (7, 3, 70.0)
+
+    # Nothing new: the overlap is re-read but every row is already ingested
+    result = ingestor.refresh()
+    assert result['order_lines_read'] == 0
+    assert totals(ingestor) == (7, 3, 70.0)
+
+
+def test_seen_ids_survive_a_restart(database, tmp_path):
+    conn, url = database
+    add_order(conn, 1, '2024-03-01 10:00:00', 1)
+    SalesIngestor(url, str(tmp_path / 'cache')).refresh()
+
+    restarted = SalesIngestor(url, str(tmp_path / 'cache'))
+    add_order(conn, 2, '2024-03-01 10:01:00', 5)
+    restarted.refresh()
+    assert totals(restarted) == (6, 2, 60.0)
+
+
+def test_seen_ids_are_pruned_outside_the_overlap(database, tmp_path):
+    conn, url = database
+    ingestor = SalesIngestor(url, str(tmp_path / 'cache'), overlap_seconds=60)
+    add_order(conn, 1, '2024-03-01 10:00:00', 1)
+    add_order(conn, 2, '2024-03-01 12:00:00', 1)
+    ingestor.refresh()
+
+    assert set(ingestor._watermarks['order_lines']['seen']) == {'2'}
+    assert ingestor.stats()['watermarks']['order_lines'] == '2024-03-01 12:00:00'
+
+
+def test_full_refresh_rebuilds_from_scratch(database, tmp_path):
+    conn, url = database
+    ingestor = SalesIngestor(url, str(tmp_path / 'cache'))
+    add_order(conn, 1, '2024-03-01 10:00:00', 1)
+    add_order(conn, 2, '2024-03-02 10:00:00', 2)
+    ingestor.refresh()
+    conn.execute("UPDATE orders SET status = 'CANCELLED' WHERE id = 2")
+    conn.commit()
+
+    ingestor.refresh(full=True)
+    assert totals(ingestor) == (1, 1, 10.0)
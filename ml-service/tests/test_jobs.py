@@ -0,0 +1,101 @@
+"""Job queue deduplication, limits and lease recovery"""
+
+import multiprocessing
+import time
+
+import pytest
+
+from models.jobs import DONE, JobQueue, QueueFullError
+
+
+def echo(payload):
+    return {'echo': payload}
+
+
+def slow(payload):
+    time.sleep(payload.get('seconds', 0.5))
+    return {'slept': payload.get('seconds', 0.5)}
+
+
+def wait_for(queue, job_id, status=DONE, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not reach {status}: {queue.get(job_id)}")
+
+
+def test_identical_submissions_share_one_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), {'slow': slow})
+    first, first_dedup = queue.submit('slow', {'seconds': 0.3})
+    second, second_dedup = queue.submit('slow', {'seconds': 0.3})
+
+    assert not first_dedup and second_dedup
+    assert first['job_id'] == second['job_id']
+    assert wait_for(queue, first['job_id'])['result'] == {'slept': 0.3}
+    queue.shutdown()
+
+
+def test_finished_job_is_not_reused(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), {'echo': echo})
+    first, _ = queue.submit('echo', {'x': 1})
+    wait_for(queue, first['job_id'])
+    second, deduplicated = queue.submit('echo', {'x': 1})
+
+    assert not deduplicated and second['job_id'] != first['job_id']
+    queue.shutdown()
+
+
+def test_queue_full(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), {'slow': slow}, max_workers=1, max_pending=2)
+    queue.submit('slow', {'seconds': 0.5, 'n': 1})
+    queue.submit('slow', {'seconds': 0.5, 'n': 2})
+
+    with pytest.raises(QueueFullError):
+        queue.submit('slow', {'seconds': 0.5, 'n': 3})
+    queue.shutdown()
+
+
+def _submit_from_process(db_path, barrier, results):
+    queue = JobQueue(db_path, {'slow': slow}, max_workers=1)
+    barrier.wait()
+    job, _ = queue.submit('slow', {'seconds': 1.0})
+    results.put(job['job_id'])
+    time.sleep(0.2)
+    queue.shutdown()
+
+
+def test_processes_sharing_a_database_deduplicate(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    JobQueue(db_path, {'slow': slow}).shutdown()  # Create the schema before the race
+
+    context = multiprocessing.get_context('fork')
+    processes = 6
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=_submit_from_process, args=(db_path, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    job_ids = {results.get(timeout=30) for _ in workers}
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert len(job_ids) == 1
+
+
+def test_expired_lease_is_recovered(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    dead = JobQueue(db_path, {'echo': echo}, lease_seconds=0.4)
+    dead.shutdown()
+    with dead._connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, dedup_key, status, payload, created_at, started_at, owner, heartbeat_at) "
+            "VALUES ('orphan', 'echo', 'k', 'running', '{\"x\": 1}', ?, ?, 'gone', ?)",
+            (time.time(), time.time(), time.time())
+        )
+
+    live = JobQueue(db_path, {'echo': echo}, lease_seconds=0.4)
+    assert wait_for(live, 'orphan')['result'] == {'echo': {'x': 1}}
+    live.shutdown()
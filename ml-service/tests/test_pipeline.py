@@ -0,0 +1,36 @@
+"""Recommendation pipeline top-k: deterministic order under tied scores"""
+
+import numpy as np
+
+from models.pipeline import RecommendationPipeline
+
+
+def test_top_k_orders_ties_by_index():
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.7, 0.5])
+
+    assert RecommendationPipeline.top_k(scores, 3).tolist() == [1, 4, 0]
+    assert RecommendationPipeline.top_k(scores, 10).tolist() == [1, 4, 0, 2, 3, 5]
+
+
+def test_top_k_orders_ties_by_row():
+    scores = np.array([0.5, 0.5, 0.5])
+    rows = np.array([30, 10, 20])
+
+    assert RecommendationPipeline.top_k(scores, 2, rows).tolist() == [1, 2]
+
+
+def test_top_k_matches_a_full_sort_on_many_ties():
+    rng = np.random.default_rng(0)
+    scores = np.where(rng.random(5000) < 0.8, 0.5, rng.random(5000))
+    expected = np.lexsort((np.arange(len(scores)), -scores))[:50]
+
+    for _ in range(3):
+        assert RecommendationPipeline.top_k(scores, 50).tolist() == expected.tolist()
+
+
+def test_run_returns_the_same_list_for_tied_scores():
+    pipeline = RecommendationPipeline('ties', [], lambda rows, context: np.full(len(rows), 0.5), num_items=200)
+
+    rows, scores = pipeline.run({}, 10, exclude_rows=np.array([0, 2]))
+    assert rows.tolist() == [1, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+    assert (scores == 0.5).all()